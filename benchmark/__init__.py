@@ -0,0 +1,19 @@
+"""
+Benchmarks de la API de la cafetería. Se ejecutan como módulos:
+
+    python -m benchmark.datos --url sqlite:///bench.db --escala 100k   # catálogo sintético
+    python -m benchmark.carga --url sqlite:///bench.db --salida v1.json  # carga y reporte p50/p99
+    python -m benchmark.serializacion                                     # ORM+pydantic vs. columnas+orjson
+
+Todo corre en el mismo proceso (la API se llama como aplicación ASGI), así que basta con
+SQLite o un MySQL local y no se usa la red.
+"""
+
+import os
+
+
+def usar_base(url: str):
+    """
+    Configura DATABASE_URL antes de importar main (main crea el engine al importarse).
+    """
+    os.environ["DATABASE_URL"] = url
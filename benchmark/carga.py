@@ -0,0 +1,346 @@
+"""
+Generador de carga para todas las rutas de la API, con reporte p50/p99/throughput.
+
+La API se ejecuta en este mismo proceso y las peticiones se envían directamente a la
+aplicación ASGI, sin sockets: mide la API y la base de datos, no la red. Los ids se
+eligen al azar dentro del catálogo (ver benchmark.datos), con una semilla fija.
+
+    python -m benchmark.carga --url sqlite:///bench.db --peticiones 5000 --concurrencia 16
+    python -m benchmark.carga --url sqlite:///bench.db --salida v2.json --comparar v1.json
+
+Con --rafaga N cada petición del plan se envía N veces seguidas, como varios kioscos
+pidiendo lo mismo a la vez; con --sin-cache y --sin-coalescencia se ve cuántas consultas
+ahorra agrupar las lecturas idénticas (columna "consultas").
+
+Los escenarios de borrado eliminan filas que se crean antes de medir (ver PREPARACION).
+Quedan fuera /eventos (una conexión SSE abierta no tiene latencia por petición) y las
+rutas /admin.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+from benchmark import usar_base
+from benchmark.datos import SABORES, PRODUCTOS, POSTRES
+
+
+class Archivo(NamedTuple):
+    """
+    Cuerpo multipart/form-data con un solo archivo en el campo `archivo` (para /import).
+    """
+    nombre: str
+    contenido: bytes
+
+
+# Escenario: (peso relativo, función que recibe el azar y el catálogo y devuelve (método, ruta, cuerpo)).
+# El cuerpo es un objeto que se envía como JSON o un Archivo.
+Peticion = Tuple[str, str, Optional[object]]
+
+
+def _id(azar: random.Random, catalogo: dict, tabla: str) -> int:
+    return azar.randint(1, catalogo[tabla])
+
+
+def _postre(azar: random.Random, catalogo: dict) -> dict:
+    rebanadas = azar.choice([8, 10, 12])
+    precio_rebanada = round(azar.uniform(25, 60), 2)
+    return {
+        "nombre": f"{azar.choice(POSTRES)} de {azar.choice(SABORES)} de benchmark",
+        "categoria_id": _id(azar, catalogo, "categorias"), "descripcion": "Creado por benchmark.carga", "rebanadas": rebanadas,
+        "precio_rebanada": precio_rebanada, "precio_total": round(precio_rebanada * rebanadas, 2),
+    }
+
+
+def _importacion_postres(azar: random.Random, catalogo: dict, filas: int = 20) -> Archivo:
+    # Upsert por id de postres existentes: mide el import sin hacer crecer el catálogo
+    lineas = []
+    for _ in range(filas):
+        postre = _postre(azar, catalogo)
+        del postre["precio_total"]
+        lineas.append(json.dumps({"id": _id(azar, catalogo, "postres"), **postre}, ensure_ascii=False))
+    return Archivo("postres.ndjson", ("\n".join(lineas) + "\n").encode())
+
+
+ESCENARIOS: Dict[str, Tuple[int, Callable[[random.Random, dict], Peticion]]] = {
+    "listar_productos": (10, lambda a, c: ("GET", f"/productos/?skip={a.randint(0, max(0, c['productos'] - 100))}&limit=100", None)),
+    "listar_productos_campos": (5, lambda a, c: (
+        "GET", f"/productos/?skip={a.randint(0, max(0, c['productos'] - 100))}&limit=100&fields=nombre,precio,disponible", None
+    )),
+    "listar_productos_cursor": (5, lambda a, c: ("GET", "/productos/?cursor=&limit=100", None)),
+    "listar_postres": (5, lambda a, c: ("GET", "/postres/?limit=100", None)),
+    "categorias": (5, lambda a, c: ("GET", "/categorias/", None)),
+    "producto_por_id": (20, lambda a, c: ("GET", f"/productos/{_id(a, c, 'productos')}", None)),
+    "postre_por_id": (10, lambda a, c: ("GET", f"/postres/{_id(a, c, 'postres')}", None)),
+    "productos_por_categoria": (10, lambda a, c: ("GET", f"/productos/categoria/{_id(a, c, 'categorias')}", None)),
+    "postres_por_categoria": (5, lambda a, c: ("GET", f"/postres/categoria/{_id(a, c, 'categorias')}", None)),
+    "postres_de_producto": (5, lambda a, c: ("GET", f"/productos/{_id(a, c, 'productos')}/postres", None)),
+    "productos_de_postre": (5, lambda a, c: ("GET", f"/postres/{_id(a, c, 'postres')}/productos", None)),
+    "buscar": (10, lambda a, c: ("GET", f"/buscar/{a.choice(SABORES + PRODUCTOS)}", None)),
+    "buscar_filtrado": (5, lambda a, c: (
+        "GET", f"/buscar/{a.choice(SABORES)}?categoria_id={_id(a, c, 'categorias')}&precio_max=60&orden=-precio&limit=20", None
+    )),
+    "actualizar_producto": (3, lambda a, c: (
+        "PUT", f"/productos/{_id(a, c, 'productos')}", {"precio": round(a.uniform(15, 120), 2)}
+    )),
+    "crear_producto": (2, lambda a, c: ("POST", "/productos/", {
+        "nombre": f"{a.choice(PRODUCTOS)} de benchmark", "categoria_id": _id(a, c, "categorias"),
+        "descripcion": "Creado por benchmark.carga", "precio": 50.0,
+    })),
+    "borrar_producto": (1, lambda a, c: ("DELETE", "/productos/{id}", None)),
+    "actualizar_postre": (2, lambda a, c: (
+        "PUT", f"/postres/{_id(a, c, 'postres')}", {"precio_rebanada": round(a.uniform(25, 60), 2)}
+    )),
+    "crear_postre": (1, lambda a, c: ("POST", "/postres/", _postre(a, c))),
+    "borrar_postre": (1, lambda a, c: ("DELETE", "/postres/{id}", None)),
+    "actualizar_disponibilidad": (2, lambda a, c: ("PATCH", "/disponibilidad", [
+        {"tipo": tipo, "id": _id(a, c, f"{tipo}s"), "disponible": a.randint(0, 1)}
+        for tipo in a.choices(["producto", "postre"], k=10)
+    ])),
+    "sugerir": (5, lambda a, c: ("GET", f"/sugerir?q={quote(a.choice(SABORES + PRODUCTOS)[:a.randint(2, 4)])}", None)),
+    "sync": (2, lambda a, c: ("GET", f"/sync?since={c['token_sync']}", None)),
+    "exportar_postres": (1, lambda a, c: ("GET", "/export/postres", None)),
+    "importar_postres": (1, lambda a, c: ("POST", "/import?tipo=postres", _importacion_postres(a, c))),
+}
+
+# Los borrados eliminan filas que se crean (sin medir) antes de cada corrida: escenario -> petición
+# de creación; el id creado reemplaza {id} en la ruta
+PREPARACION: Dict[str, Callable[[random.Random, dict], Peticion]] = {
+    "borrar_producto": lambda a, c: ESCENARIOS["crear_producto"][1](a, c),
+    "borrar_postre": lambda a, c: ESCENARIOS["crear_postre"][1](a, c),
+}
+
+ESCRITURAS = ("actualizar", "crear", "borrar", "importar")
+
+
+def _codificar(cuerpo) -> Tuple[bytes, bytes]:
+    """
+    Devuelve (cuerpo, content-type) de la petición.
+    """
+    if isinstance(cuerpo, Archivo):
+        frontera = "benchmark-carga"
+        datos = (
+            f'--{frontera}\r\nContent-Disposition: form-data; name="archivo"; filename="{cuerpo.nombre}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode() + cuerpo.contenido + f"\r\n--{frontera}--\r\n".encode()
+        return datos, f"multipart/form-data; boundary={frontera}".encode()
+    return (json.dumps(cuerpo).encode() if cuerpo is not None else b""), b"application/json"
+
+
+async def llamar(app, metodo: str, ruta: str, cuerpo=None, respuesta: Optional[bytearray] = None) -> Tuple[int, int, int]:
+    """
+    Envía una petición a la aplicación ASGI y devuelve (estado, bytes del cuerpo, consultas SQL).
+    Si se pasa `respuesta`, le agrega el cuerpo de la respuesta.
+    """
+    datos, tipo = _codificar(cuerpo)
+    path, _, query = ruta.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": metodo,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "client": ("127.0.0.1", 0), "server": ("benchmark", 80),
+        "headers": [(b"host", b"benchmark"), (b"content-type", tipo),
+                    (b"content-length", str(len(datos)).encode())],
+    }
+    terminado = asyncio.Event()
+    pendiente = [{"type": "http.request", "body": datos, "more_body": False}]
+    resultado = {"estado": 0, "bytes": 0, "consultas": 0}
+
+    async def receive():
+        if pendiente:
+            return pendiente.pop()
+        await terminado.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(mensaje):
+        if mensaje["type"] == "http.response.start":
+            resultado["estado"] = mensaje["status"]
+            for nombre, valor in mensaje.get("headers", []):
+                if nombre.lower() == b"x-query-count":
+                    resultado["consultas"] = int(valor)
+        elif mensaje["type"] == "http.response.body":
+            resultado["bytes"] += len(mensaje.get("body", b""))
+            if respuesta is not None:
+                respuesta.extend(mensaje.get("body", b""))
+            if not mensaje.get("more_body"):
+                terminado.set()
+
+    await app(scope, receive, send)
+    return resultado["estado"], resultado["bytes"], resultado["consultas"]
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """
+    Percentil por rango más cercano sobre una lista ordenada.
+    """
+    if not valores:
+        return 0.0
+    indice = max(0, min(len(valores) - 1, int(round(p / 100 * len(valores) + 0.5)) - 1))
+    return valores[indice]
+
+
+def resumir(mediciones: Dict[str, list], segundos: float) -> dict:
+    escenarios = {}
+    for nombre, datos in sorted(mediciones.items()):
+        latencias = sorted(d[0] for d in datos)
+        errores = sum(1 for d in datos if d[1] >= 400)
+        escenarios[nombre] = {
+            "peticiones": len(datos),
+            "errores": errores,
+            "p50_ms": round(percentil(latencias, 50), 3),
+            "p99_ms": round(percentil(latencias, 99), 3),
+            "media_ms": round(sum(latencias) / len(latencias), 3),
+            "rps": round(len(datos) / segundos, 1),
+            "consultas_por_peticion": round(sum(d[2] for d in datos) / len(datos), 2),
+            "consultas": sum(d[2] for d in datos),
+            "bytes_por_peticion": round(sum(d[3] for d in datos) / len(datos)),
+        }
+    total = sum(len(d) for d in mediciones.values())
+    todas = sorted(m[0] for datos in mediciones.values() for m in datos)
+    return {
+        "segundos": round(segundos, 3),
+        "peticiones": total,
+        "rps": round(total / segundos, 1),
+        "p50_ms": round(percentil(todas, 50), 3),
+        "p99_ms": round(percentil(todas, 99), 3),
+        "consultas": sum(e["consultas"] for e in escenarios.values()),
+        "escenarios": escenarios,
+    }
+
+
+def imprimir(reporte: dict, anterior: Optional[dict] = None):
+    def variacion(nombre, campo):
+        if not anterior:
+            return ""
+        base = (anterior["escenarios"].get(nombre) or {}).get(campo) if nombre else anterior.get(campo)
+        if not base:
+            return "       "
+        actual = reporte["escenarios"][nombre][campo] if nombre else reporte[campo]
+        return f" {(actual - base) / base * 100:+6.1f}%"
+
+    print(f"{'escenario':<26}{'n':>7}{'err':>5}{'p50 ms':>9}{'':>8}{'p99 ms':>9}{'':>8}{'rps':>9}{'consultas':>10}")
+    for nombre, r in reporte["escenarios"].items():
+        print(f"{nombre:<26}{r['peticiones']:>7}{r['errores']:>5}{r['p50_ms']:>9.2f}{variacion(nombre, 'p50_ms'):>8}"
+              f"{r['p99_ms']:>9.2f}{variacion(nombre, 'p99_ms'):>8}{r['rps']:>9.1f}{r['consultas_por_peticion']:>10.2f}")
+    print(f"{'total':<26}{reporte['peticiones']:>7}{'':>5}{reporte['p50_ms']:>9.2f}{variacion(None, 'p50_ms'):>8}"
+          f"{reporte['p99_ms']:>9.2f}{variacion(None, 'p99_ms'):>8}{reporte['rps']:>9.1f}"
+          f"{reporte['consultas'] / reporte['peticiones']:>10.2f}")
+    if reporte.get("coalescencia") and any(reporte["coalescencia"].values()):
+        print(f"coalescidas: {reporte['coalescencia']['coalescidas']} de "
+              f"{reporte['coalescencia']['coalescidas'] + reporte['coalescencia']['ejecutadas']} lecturas agrupables")
+
+
+async def _preparar(app, azar: random.Random, catalogo: dict, nombre: str, peticion: Peticion) -> Peticion:
+    """
+    Crea la fila que borrará la petición (si el escenario está en PREPARACION) y pone su id en la ruta.
+    """
+    if nombre not in PREPARACION:
+        return peticion
+    respuesta = bytearray()
+    estado, _, _ = await llamar(app, *PREPARACION[nombre](azar, catalogo), respuesta=respuesta)
+    if estado != 200:
+        raise RuntimeError(f"No se pudo preparar {nombre}: {estado} {bytes(respuesta[:200])!r}")
+    metodo, ruta, cuerpo = peticion
+    return metodo, ruta.format(id=json.loads(respuesta)["id"]), cuerpo
+
+
+async def ejecutar(app, catalogo: dict, escenarios: List[str], peticiones: int, concurrencia: int,
+                   semilla: int, rafaga: int = 1) -> dict:
+    azar = random.Random(semilla)
+    pesos = [ESCENARIOS[n][0] for n in escenarios]
+    plan = [(n, ESCENARIOS[n][1](azar, catalogo)) for n in azar.choices(escenarios, weights=pesos, k=-(-peticiones // rafaga))]
+    plan = [peticion for peticion in plan for _ in range(rafaga)][:peticiones]
+    plan = [(n, await _preparar(app, azar, catalogo, n, peticion)) for n, peticion in plan]
+    mediciones: Dict[str, list] = {n: [] for n in escenarios}
+    cola = iter(plan)
+
+    async def trabajador():
+        for nombre, (metodo, ruta, cuerpo) in cola:
+            inicio = time.perf_counter()
+            estado, tamano, consultas = await llamar(app, metodo, ruta, cuerpo)
+            mediciones[nombre].append(((time.perf_counter() - inicio) * 1000, estado, consultas, tamano))
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*[trabajador() for _ in range(concurrencia)])
+    return resumir({n: m for n, m in mediciones.items() if m}, time.perf_counter() - inicio)
+
+
+async def principal(args) -> dict:
+    from sqlalchemy import func, select
+    import main as api
+
+    with api.SessionLocal() as db:
+        catalogo = {
+            "categorias": db.execute(select(func.max(api.Categoria.id))).scalar() or 0,
+            "productos": db.execute(select(func.max(api.Producto.id))).scalar() or 0,
+            "postres": db.execute(select(func.max(api.Postre.id))).scalar() or 0,
+        }
+        version = db.execute(select(api.CatalogoVersion.epoca, api.CatalogoVersion.version)).first()
+    if not all(catalogo.values()):
+        raise SystemExit("El catálogo está vacío; genera datos con `python -m benchmark.datos`")
+    # /sync pide los cambios desde el inicio de la corrida (los que hacen los escenarios de escritura)
+    catalogo["token_sync"] = f"{version.epoca}-{version.version}" if version else ""
+
+    await api.app.router.startup()
+    try:
+        escenarios = args.escenarios or list(ESCENARIOS)
+        if args.solo_lectura:
+            escenarios = [n for n in escenarios if not n.startswith(ESCRITURAS)]
+        # Calentamiento: caché, índice y conexiones del pool
+        await ejecutar(api.app, catalogo, escenarios, min(200, args.peticiones), args.concurrencia, args.semilla + 1)
+        antes = api.coalescencia_lecturas.estadisticas()
+        reporte = await ejecutar(api.app, catalogo, escenarios, args.peticiones, args.concurrencia, args.semilla, args.rafaga)
+        despues = api.coalescencia_lecturas.estadisticas()
+    finally:
+        await api.app.router.shutdown()
+    reporte["configuracion"] = {
+        "url": args.url.split("@")[-1], "catalogo": catalogo, "concurrencia": args.concurrencia,
+        "db_modo": api.DB_MODO, "cache": api.cache_catalogo.habilitado, "busqueda": api.BUSQUEDA_MODO,
+        "coalescencia": api.coalescencia_lecturas.habilitado, "rafaga": args.rafaga,
+    }
+    if api.coalescencia_lecturas.habilitado:
+        reporte["coalescencia"] = {campo: despues[campo] - antes[campo] for campo in ("ejecutadas", "coalescidas")}
+    return reporte
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="URL de SQLAlchemy de la base de datos")
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--escenarios", nargs="+", choices=list(ESCENARIOS), help="por defecto, todos")
+    parser.add_argument("--solo-lectura", action="store_true", help="omitir los escenarios de escritura")
+    parser.add_argument("--sin-cache", action="store_true", help="desactivar la caché del catálogo")
+    parser.add_argument("--sin-coalescencia", action="store_true", help="no agrupar las lecturas idénticas simultáneas")
+    parser.add_argument("--rafaga", type=int, default=1, help="veces seguidas que se envía cada petición del plan")
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--salida", help="guardar el reporte en JSON")
+    parser.add_argument("--comparar", help="reporte JSON anterior para mostrar la variación")
+    args = parser.parse_args(argv)
+
+    usar_base(args.url)
+    if args.sin_cache:
+        os.environ["CACHE_HABILITADO"] = "false"
+    if args.sin_coalescencia:
+        os.environ["COALESCENCIA_HABILITADA"] = "false"
+    # El sondeo entre procesos no aplica a un solo proceso de benchmark
+    os.environ.setdefault("COHERENCIA_INTERVALO", "0")
+
+    reporte = asyncio.run(principal(args))
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            anterior = json.load(archivo)
+    imprimir(reporte, anterior)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(reporte, archivo, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Compara la serialización de listas de productos:
+
+- orm+pydantic: objetos ORM con joinedload -> ProductoResponse.model_validate por fila ->
+  validación de response_model de FastAPI -> json (la ruta anterior de /productos/).
+- columnas+orjson: select() de columnas -> dicts ya formados -> orjson (la ruta actual).
+
+Usa una base SQLite en memoria, así que mide sobre todo el costo en Python.
+
+    python -m benchmark.serializacion --filas 10000 --limites 100 1000 10000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.pool import StaticPool
+
+from main import Base, Categoria, Producto, ProductoResponse, consulta_respuesta, filas_a_respuesta
+
+CAMPO_RESPUESTA = create_response_field(name="respuesta", type_=List[ProductoResponse], mode="serialization")
+
+
+def crear_base(filas: int):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Categoria), [
+            {"id": i, "nombre": f"categoria {i}", "descripcion": f"Descripción de la categoría {i}"}
+            for i in range(1, 11)
+        ])
+        conn.execute(insert(Producto), [
+            {"nombre": f"Producto {i}", "categoria_id": i % 10 + 1, "descripcion": f"Descripción del producto {i}",
+             "precio": round(10 + i % 90 + 0.5, 2), "disponible": 1}
+            for i in range(filas)
+        ])
+    return engine
+
+
+def orm_pydantic(db: Session, limite: int) -> bytes:
+    productos = db.query(Producto).options(joinedload(Producto.categoria_rel)).limit(limite).all()
+    contenido = [ProductoResponse.model_validate(p) for p in productos]
+    serializado = asyncio.run(serialize_response(field=CAMPO_RESPUESTA, response_content=contenido))
+    return JSONResponse(serializado).body
+
+
+def columnas_orjson(db: Session, limite: int) -> bytes:
+    contenido = filas_a_respuesta("producto", db.execute(consulta_respuesta("producto").limit(limite)).all())
+    return ORJSONResponse(contenido).body
+
+
+def medir(funcion, engine, limite: int, repeticiones: int) -> List[float]:
+    tiempos = []
+    for _ in range(repeticiones):
+        with Session(engine) as db:
+            inicio = time.perf_counter()
+            funcion(db, limite)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=10000, help="productos en la base de prueba")
+    parser.add_argument("--limites", type=int, nargs="+", default=[100, 1000, 10000], help="tamaños de página")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    engine = crear_base(args.filas)
+    with Session(engine) as db:
+        # Las dos rutas deben producir el mismo JSON
+        assert json.loads(orm_pydantic(db, 50)) == json.loads(columnas_orjson(db, 50))
+
+    print(f"{'limite':>8} {'orm+pydantic ms':>16} {'columnas+orjson ms':>19} {'mejora':>8}")
+    for limite in args.limites:
+        for funcion in (orm_pydantic, columnas_orjson):
+            medir(funcion, engine, limite, 2)  # calentamiento
+        antes = statistics.median(medir(orm_pydantic, engine, limite, args.repeticiones))
+        despues = statistics.median(medir(columnas_orjson, engine, limite, args.repeticiones))
+        print(f"{limite:>8} {antes:>16.2f} {despues:>19.2f} {antes / despues:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Creación del esquema y carga de datos iniciales, separada del arranque de la API.
+
+Uso:
+    python bootstrap.py               # aplica las versiones pendientes del esquema
+    python bootstrap.py --sin-datos   # igual, pero sin cargar los datos de ejemplo
+
+Cada versión se registra en la tabla esquema_version; la API sólo comprueba al arrancar
+que la versión registrada sea la que necesita (ver verificar_esquema en main.py).
+Es idempotente y seguro de ejecutar desde varios contenedores a la vez: en MySQL se toma
+un bloqueo con GET_LOCK antes de migrar.
+"""
+import argparse
+import sys
+import uuid
+
+from sqlalchemy import func, insert, inspect, select, text
+from sqlalchemy.orm import Session
+
+from main import (
+    ESQUEMA_VERSION, Base, CambioCatalogo, CatalogoBorrado, CatalogoVersion, Categoria, EsquemaVersion, Postre, Producto, engine,
+    insertar_en_bloque, productos_postres
+)
+
+# Nombre del bloqueo de MySQL que serializa ejecuciones concurrentes y segundos que se espera
+NOMBRE_BLOQUEO = "cafeteria_bootstrap"
+ESPERA_BLOQUEO = 60
+
+# ==================== DATOS DE EJEMPLO ====================
+
+CATEGORIAS_INICIALES = [
+    {"nombre": "torta", "descripcion": "Tortas tradicionales mexicanas"},
+    {"nombre": "cuernito", "descripcion": "Cuernitos y croissants horneados"},
+    {"nombre": "quesadilla", "descripcion": "Quesadillas de tortilla de maíz"},
+    {"nombre": "taco", "descripcion": "Tacos variados"},
+    {"nombre": "baguette", "descripcion": "Baguettes gourmet"},
+    {"nombre": "bebida", "descripcion": "Bebidas frías y calientes"},
+    {"nombre": "postre", "descripcion": "Postres y dulces"},
+    {"nombre": "pastel", "descripcion": "Pasteles completos y por rebanada"},
+    {"nombre": "postre_frio", "descripcion": "Postres fríos y helados"},
+]
+
+PRODUCTOS_INICIALES = [
+    # Tortas
+    {"nombre": "Torta de Jamón", "categoria": "torta", "precio": 45.0,
+     "descripcion": "Torta con jamón, queso, aguacate, jitomate y lechuga en pan telera"},
+    {"nombre": "Torta de Milanesa", "categoria": "torta", "precio": 60.0,
+     "descripcion": "Torta con milanesa de res empanizada, aguacate, jitomate, lechuga y frijoles"},
+    {"nombre": "Torta Cubana", "categoria": "torta", "precio": 85.0,
+     "descripcion": "Torta con jamón, queso, milanesa, salchicha, chorizo, huevo, aguacate y frijoles"},
+
+    # Cuernitos
+    {"nombre": "Cuernito de Jamón y Queso", "categoria": "cuernito", "precio": 38.0,
+     "descripcion": "Croissant horneado relleno de jamón y queso gouda derretido"},
+    {"nombre": "Cuernito 3 Quesos", "categoria": "cuernito", "precio": 42.0,
+     "descripcion": "Croissant horneado relleno de queso manchego, gouda y philadelphia"},
+
+    # Quesadillas
+    {"nombre": "Quesadilla de Queso", "categoria": "quesadilla", "precio": 25.0,
+     "descripcion": "Tortilla de maíz hecha a mano rellena de queso Oaxaca"},
+    {"nombre": "Quesadilla de Hongos", "categoria": "quesadilla", "precio": 30.0,
+     "descripcion": "Tortilla de maíz hecha a mano rellena de hongos guisados y queso"},
+    {"nombre": "Quesadilla de Tinga", "categoria": "quesadilla", "precio": 35.0,
+     "descripcion": "Tortilla de maíz hecha a mano rellena de tinga de pollo y queso"},
+
+    # Tacos
+    {"nombre": "Taco de Pastor", "categoria": "taco", "precio": 18.0,
+     "descripcion": "Tortilla de maíz con carne de cerdo marinada en adobo y piña"},
+    {"nombre": "Taco de Suadero", "categoria": "taco", "precio": 20.0,
+     "descripcion": "Tortilla de maíz con carne de res suadero, cilantro y cebolla"},
+    {"nombre": "Taco de Barbacoa", "categoria": "taco", "precio": 25.0,
+     "descripcion": "Tortilla de maíz con carne de barbacoa de borrego, cilantro y cebolla"},
+
+    # Baguettes
+    {"nombre": "Baguette Italiano", "categoria": "baguette", "precio": 65.0,
+     "descripcion": "Pan baguette con jamón serrano, queso provolone, tomate y pesto"},
+    {"nombre": "Baguette de Pollo", "categoria": "baguette", "precio": 60.0,
+     "descripcion": "Pan baguette con pollo a la plancha, queso manchego, lechuga y jitomate"},
+
+    # Bebidas
+    {"nombre": "Café Americano", "categoria": "bebida", "precio": 30.0,
+     "descripcion": "Café de grano recién molido, 12 oz"},
+    {"nombre": "Agua de Horchata", "categoria": "bebida", "precio": 25.0,
+     "descripcion": "Agua fresca de arroz con canela y vainilla, 16 oz"},
+    {"nombre": "Limonada", "categoria": "bebida", "precio": 28.0,
+     "descripcion": "Limonada natural con un toque de menta, 16 oz"},
+
+    # Postres individuales en productos
+    {"nombre": "Rebanada de Pastel de Chocolate", "categoria": "postre", "precio": 45.0,
+     "descripcion": "Rebanada individual de pastel de chocolate"},
+    {"nombre": "Flan Individual", "categoria": "postre", "precio": 35.0,
+     "descripcion": "Porción individual de flan napolitano"},
+]
+
+POSTRES_INICIALES = [
+    {"nombre": "Pastel de Chocolate", "categoria": "pastel", "rebanadas": 12, "precio_rebanada": 45.0, "precio_total": 540.0,
+     "descripcion": "Delicioso pastel de chocolate con ganache de chocolate oscuro y decorado con fresas"},
+    {"nombre": "Cheesecake de Fresa", "categoria": "pastel", "rebanadas": 10, "precio_rebanada": 50.0, "precio_total": 500.0,
+     "descripcion": "Tarta de queso cremosa con base de galleta y cobertura de fresas naturales"},
+    {"nombre": "Pastel Tres Leches", "categoria": "pastel", "rebanadas": 16, "precio_rebanada": 35.0, "precio_total": 560.0,
+     "descripcion": "Esponjoso pastel bañado en tres tipos de leche con crema chantilly y canela"},
+    {"nombre": "Tarta de Manzana", "categoria": "pastel", "rebanadas": 8, "precio_rebanada": 40.0, "precio_total": 320.0,
+     "descripcion": "Clásica tarta de manzana con masa crujiente y manzanas caramelizadas"},
+    {"nombre": "Pastel de Zanahoria", "categoria": "pastel", "rebanadas": 12, "precio_rebanada": 42.0, "precio_total": 504.0,
+     "descripcion": "Húmedo pastel de zanahoria con nueces y betún de queso crema"},
+    {"nombre": "Tiramisú", "categoria": "postre_frio", "rebanadas": 9, "precio_rebanada": 55.0, "precio_total": 495.0,
+     "descripcion": "Postre italiano con capas de bizcocho bañado en café, mascarpone y cacao"},
+    {"nombre": "Pastel Red Velvet", "categoria": "pastel", "rebanadas": 14, "precio_rebanada": 48.0, "precio_total": 672.0,
+     "descripcion": "Suave pastel de terciopelo rojo con betún de queso crema"},
+    {"nombre": "Flan Napolitano Familiar", "categoria": "postre_frio", "rebanadas": 10, "precio_rebanada": 25.0, "precio_total": 250.0,
+     "descripcion": "Flan casero de tamaño familiar con caramelo y vainilla"},
+]
+
+# Relacionar las rebanadas individuales con los pasteles completos: (producto, postre)
+RELACIONES_INICIALES = [
+    ("Rebanada de Pastel de Chocolate", "Pastel de Chocolate"),
+]
+
+def sembrar_datos(db: Session):
+    """
+    Carga los datos de ejemplo con INSERTs multi-fila dentro de la transacción en curso.
+    No hace nada si ya hay categorías (por ejemplo, en una base creada por versiones anteriores).
+    """
+    if db.execute(select(func.count()).select_from(Categoria)).scalar():
+        return
+    
+    ids_categorias = insertar_en_bloque(db, Categoria, CATEGORIAS_INICIALES)
+    cat_dict = {c["nombre"]: id_ for c, id_ in zip(CATEGORIAS_INICIALES, ids_categorias)}
+    
+    def con_categoria(filas):
+        return [{**{k: v for k, v in fila.items() if k != "categoria"}, "categoria_id": cat_dict[fila["categoria"]]}
+                for fila in filas]
+    
+    ids_productos = insertar_en_bloque(db, Producto, con_categoria(PRODUCTOS_INICIALES))
+    ids_postres = insertar_en_bloque(db, Postre, con_categoria(POSTRES_INICIALES))
+    
+    productos = {p["nombre"]: id_ for p, id_ in zip(PRODUCTOS_INICIALES, ids_productos)}
+    postres = {p["nombre"]: id_ for p, id_ in zip(POSTRES_INICIALES, ids_postres)}
+    db.execute(productos_postres.insert(), [
+        {"producto_id": productos[producto], "postre_id": postres[postre]}
+        for producto, postre in RELACIONES_INICIALES
+    ])
+
+# ==================== VERSIONES DEL ESQUEMA ====================
+
+def _version_1(db: Session, con_datos: bool):
+    # Tablas iniciales (categorias, productos, postres, productos_postres) y datos de ejemplo
+    Base.metadata.create_all(bind=db.connection(), tables=[
+        Categoria.__table__, Producto.__table__, Postre.__table__, productos_postres
+    ])
+    if con_datos:
+        sembrar_datos(db)
+
+def _version_2(db: Session, con_datos: bool):
+    # Secuencia y registro de cambios del catálogo para la coherencia entre procesos
+    Base.metadata.create_all(bind=db.connection(), tables=[CatalogoVersion.__table__, CambioCatalogo.__table__])
+    db.execute(insert(CatalogoVersion).values(id=1, version=0, epoca=uuid.uuid4().hex[:16]))
+
+def _version_3(db: Session, con_datos: bool):
+    # Sincronización incremental (/sync): versión del último cambio y fecha de modificación
+    # de cada fila, y registro de borrados. Las bases creadas desde cero ya tienen las columnas
+    # (_version_1 usa los modelos actuales), así que sólo se agrega lo que falta.
+    conexion = db.connection()
+    inspector = inspect(conexion)
+    for modelo in (Categoria, Producto, Postre):
+        tabla = modelo.__tablename__
+        columnas = {columna["name"] for columna in inspector.get_columns(tabla)}
+        if "version_cambio" not in columnas:
+            conexion.execute(text(f"ALTER TABLE {tabla} ADD COLUMN version_cambio INTEGER NOT NULL DEFAULT 0"))
+        if "actualizado_en" not in columnas:
+            # SQLite no admite DEFAULT CURRENT_TIMESTAMP en ADD COLUMN: se rellena aparte
+            conexion.execute(text(f"ALTER TABLE {tabla} ADD COLUMN actualizado_en DATETIME"))
+            conexion.execute(text(f"UPDATE {tabla} SET actualizado_en = CURRENT_TIMESTAMP"))
+        indices = {indice["name"] for indice in inspector.get_indexes(tabla)}
+        for indice in modelo.__table__.indexes:
+            if indice.name not in indices and "version_cambio" in indice.columns:
+                indice.create(bind=conexion)
+    Base.metadata.create_all(bind=conexion, tables=[CatalogoBorrado.__table__])
+
+def _version_4(db: Session, con_datos: bool):
+    # Eventos del catálogo (/eventos): acción de cada cambio y vínculos producto-postre que cambió.
+    # Los cambios anteriores quedan sin acción y se publican como "actualizado".
+    conexion = db.connection()
+    columnas = {columna["name"] for columna in inspect(conexion).get_columns(CambioCatalogo.__tablename__)}
+    if "accion" not in columnas:
+        conexion.execute(text(f"ALTER TABLE {CambioCatalogo.__tablename__} ADD COLUMN accion VARCHAR(20)"))
+    if "vinculos" not in columnas:
+        conexion.execute(text(f"ALTER TABLE {CambioCatalogo.__tablename__} ADD COLUMN vinculos TEXT"))
+
+# version -> función que la aplica; las nuevas versiones se agregan al final
+MIGRACIONES = {
+    1: _version_1,
+    2: _version_2,
+    3: _version_3,
+    4: _version_4,
+}
+
+def version_actual(db: Session) -> int:
+    return db.execute(select(func.max(EsquemaVersion.version))).scalar() or 0
+
+def ejecutar_bootstrap(con_datos: bool = True, motor=engine) -> int:
+    """
+    Aplica en orden las versiones pendientes y devuelve la versión final del esquema.
+    
+    En MySQL, GET_LOCK pertenece a la conexión: el bloqueo, las migraciones y RELEASE_LOCK
+    usan la misma conexión (los commits de la sesión no la devuelven al pool). Si no se
+    obtiene el bloqueo a tiempo se aborta en lugar de migrar sin él.
+    """
+    with motor.connect() as conexion, Session(bind=conexion) as db:
+        es_mysql = conexion.dialect.name == "mysql"
+        if es_mysql:
+            obtenido = db.execute(
+                text("SELECT GET_LOCK(:nombre, :espera)"), {"nombre": NOMBRE_BLOQUEO, "espera": ESPERA_BLOQUEO}
+            ).scalar()
+            db.commit()
+            if obtenido != 1:
+                raise RuntimeError(
+                    f"No se obtuvo el bloqueo {NOMBRE_BLOQUEO} en {ESPERA_BLOQUEO} s; "
+                    "otra ejecución de bootstrap sigue en curso"
+                )
+        try:
+            EsquemaVersion.__table__.create(bind=db.connection(), checkfirst=True)
+            actual = version_actual(db)
+            for version in sorted(MIGRACIONES):
+                if version <= actual:
+                    continue
+                MIGRACIONES[version](db, con_datos)
+                db.execute(insert(EsquemaVersion).values(version=version))
+                db.commit()
+                print(f"Esquema actualizado a la versión {version}")
+                actual = version
+            return actual
+        finally:
+            if es_mysql:
+                db.rollback()
+                db.execute(text("SELECT RELEASE_LOCK(:nombre)"), {"nombre": NOMBRE_BLOQUEO})
+                db.commit()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crea o actualiza el esquema de la base de datos de la cafetería")
+    parser.add_argument("--sin-datos", action="store_true", help="no cargar los datos de ejemplo")
+    args = parser.parse_args(argv)
+    
+    version = ejecutar_bootstrap(con_datos=not args.sin_datos)
+    if version != ESQUEMA_VERSION:
+        print(f"El esquema quedó en la versión {version}, se esperaba la {ESQUEMA_VERSION}", file=sys.stderr)
+        return 1
+    print(f"Esquema en la versión {version}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
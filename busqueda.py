@@ -0,0 +1,242 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Hashable, Iterable, List, Set
+
+# Palabras formadas por letras y dígitos; "_" separa palabras ("postre_frio")
+_PATRON_TOKEN = re.compile(r"[^\W_]+")
+
+
+def normalizar(texto: str) -> str:
+    """
+    Convierte el texto a minúsculas y elimina acentos ("Café" -> "cafe").
+    """
+    if not texto:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    sin_acentos = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return sin_acentos.casefold()
+
+
+def tokenizar(texto: str) -> List[str]:
+    """
+    Divide el texto normalizado en palabras.
+    """
+    return _PATRON_TOKEN.findall(normalizar(texto))
+
+
+class IndiceInvertido:
+    """
+    Índice invertido en memoria: palabra -> claves de los documentos que la contienen.
+
+    Las claves son arbitrarias (por ejemplo ("producto", 3)). Cada término de la
+    consulta se compara como prefijo contra el vocabulario y todos los términos
+    deben coincidir (AND), de modo que "cafe amer" encuentra "Café Americano".
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Set[Hashable]] = {}
+        self._tokens_por_doc: Dict[Hashable, Set[str]] = {}
+        self._vocabulario: List[str] = []
+        # Indica si el índice ya se cargó completo desde la base de datos
+        self.listo = False
+
+    def __len__(self):
+        return len(self._tokens_por_doc)
+
+    def _quitar(self, clave: Hashable):
+        for token in self._tokens_por_doc.pop(clave, ()):
+            docs = self._postings.get(token)
+            if docs is None:
+                continue
+            docs.discard(clave)
+            if not docs:
+                del self._postings[token]
+                posicion = bisect_left(self._vocabulario, token)
+                del self._vocabulario[posicion]
+
+    def agregar(self, clave: Hashable, textos: Iterable[str]):
+        """
+        Indexa (o reindexa) un documento a partir de sus campos de texto.
+        """
+        tokens = set()
+        for texto in textos:
+            tokens.update(tokenizar(texto or ""))
+        with self._lock:
+            self._quitar(clave)
+            self._tokens_por_doc[clave] = tokens
+            for token in tokens:
+                docs = self._postings.get(token)
+                if docs is None:
+                    self._postings[token] = docs = set()
+                    insort(self._vocabulario, token)
+                docs.add(clave)
+
+    def eliminar(self, clave: Hashable):
+        """
+        Quita un documento del índice (no falla si no existe).
+        """
+        with self._lock:
+            self._quitar(clave)
+
+    def limpiar(self):
+        with self._lock:
+            self._postings.clear()
+            self._tokens_por_doc.clear()
+            self._vocabulario.clear()
+            self.listo = False
+
+    def reconstruir(self, documentos: Iterable):
+        """
+        Vacía el índice y lo carga con pares (clave, textos).
+        """
+        self.limpiar()
+        for clave, textos in documentos:
+            self.agregar(clave, textos)
+        self.listo = True
+
+    def _coincidencias_prefijo(self, prefijo: str) -> Set[Hashable]:
+        resultado: Set[Hashable] = set()
+        posicion = bisect_left(self._vocabulario, prefijo)
+        while posicion < len(self._vocabulario) and self._vocabulario[posicion].startswith(prefijo):
+            resultado |= self._postings[self._vocabulario[posicion]]
+            posicion += 1
+        return resultado
+
+    def buscar(self, consulta: str) -> Set[Hashable]:
+        """
+        Devuelve las claves de los documentos que contienen todos los términos.
+        """
+        terminos = tokenizar(consulta)
+        if not terminos:
+            return set()
+        with self._lock:
+            resultado = None
+            # Empezar por los términos más largos, que suelen ser los más selectivos
+            for termino in sorted(set(terminos), key=len, reverse=True):
+                coincidencias = self._coincidencias_prefijo(termino)
+                resultado = coincidencias if resultado is None else resultado & coincidencias
+                if not resultado:
+                    return set()
+            return resultado
+
+
+class IndiceSugerencias:
+    """
+    Índice de prefijos para autocompletar nombres de productos, postres y categorías.
+
+    Guarda cada nombre distinto (por tipo) en arreglos ordenados de texto normalizado:
+    uno con el nombre completo y otro con el resto del nombre desde cada palabra, así
+    "amer" sugiere "Café Americano". Las coincidencias al inicio del nombre van primero.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # clave del documento (tipo, id) -> nombre indexado
+        self._nombres: Dict[Hashable, str] = {}
+        # (tipo, nombre) -> ids de los documentos con ese nombre
+        self._documentos: Dict[tuple, Set[Hashable]] = {}
+        # Tuplas (texto normalizado, tipo, nombre) ordenadas
+        self._inicios: List[tuple] = []
+        self._palabras: List[tuple] = []
+
+    def __len__(self):
+        return len(self._documentos)
+
+    @staticmethod
+    def _entradas(tipo: str, nombre: str):
+        tokens = tokenizar(nombre)
+        inicio = (" ".join(tokens), tipo, nombre) if tokens else None
+        palabras = [(" ".join(tokens[i:]), tipo, nombre) for i in range(1, len(tokens))]
+        return inicio, palabras
+
+    def _sumar(self, tipo: str, nombre: str, clave: Hashable):
+        ids = self._documentos.get((tipo, nombre))
+        if ids is None:
+            self._documentos[(tipo, nombre)] = ids = set()
+            inicio, palabras = self._entradas(tipo, nombre)
+            if inicio is not None:
+                insort(self._inicios, inicio)
+            for entrada in palabras:
+                insort(self._palabras, entrada)
+        ids.add(clave)
+
+    def _restar(self, clave: Hashable):
+        tipo = clave[0]
+        nombre = self._nombres.pop(clave, None)
+        if nombre is None:
+            return
+        ids = self._documentos[(tipo, nombre)]
+        ids.discard(clave)
+        if ids:
+            return
+        del self._documentos[(tipo, nombre)]
+        inicio, palabras = self._entradas(tipo, nombre)
+        for arreglo, entradas in ((self._inicios, [inicio] if inicio else []), (self._palabras, palabras)):
+            for entrada in entradas:
+                posicion = bisect_left(arreglo, entrada)
+                if posicion < len(arreglo) and arreglo[posicion] == entrada:
+                    del arreglo[posicion]
+
+    def agregar(self, clave: Hashable, nombre: str):
+        """
+        Indexa (o renombra) el documento `clave` = (tipo, id).
+        """
+        nombre = (nombre or "").strip()
+        with self._lock:
+            if self._nombres.get(clave) == nombre:
+                return
+            self._restar(clave)
+            if nombre:
+                self._nombres[clave] = nombre
+                self._sumar(clave[0], nombre, clave)
+
+    def eliminar(self, clave: Hashable):
+        with self._lock:
+            self._restar(clave)
+
+    def reconstruir(self, documentos: Iterable):
+        """
+        Vacía el índice y lo carga con pares (clave, nombre); ordena una sola vez al final.
+        """
+        nombres, agrupados = {}, {}
+        for clave, nombre in documentos:
+            nombre = (nombre or "").strip()
+            if nombre:
+                nombres[clave] = nombre
+                agrupados.setdefault((clave[0], nombre), set()).add(clave)
+        inicios, palabras = [], []
+        for tipo, nombre in agrupados:
+            inicio, resto = self._entradas(tipo, nombre)
+            if inicio is not None:
+                inicios.append(inicio)
+            palabras.extend(resto)
+        inicios.sort()
+        palabras.sort()
+        with self._lock:
+            self._nombres, self._documentos = nombres, agrupados
+            self._inicios, self._palabras = inicios, palabras
+
+    def sugerir(self, prefijo: str, limite: int = 10) -> List[dict]:
+        """
+        Hasta `limite` nombres distintos que empiezan con `prefijo` (o que tienen una palabra
+        que empieza con él), sin distinguir mayúsculas ni acentos.
+        """
+        texto = " ".join(tokenizar(prefijo))
+        if not texto or limite <= 0:
+            return []
+        sugerencias, vistos = [], set()
+        with self._lock:
+            for arreglo in (self._inicios, self._palabras):
+                posicion = bisect_left(arreglo, (texto,))
+                while posicion < len(arreglo) and arreglo[posicion][0].startswith(texto):
+                    _, tipo, nombre = arreglo[posicion]
+                    if (tipo, nombre) not in vistos:
+                        vistos.add((tipo, nombre))
+                        sugerencias.append({"tipo": tipo, "nombre": nombre, "total": len(self._documentos[(tipo, nombre)])})
+                        if len(sugerencias) >= limite:
+                            return sugerencias
+                    posicion += 1
+        return sugerencias
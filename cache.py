@@ -0,0 +1,194 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, Optional
+
+
+class CacheCatalogo:
+    """
+    Caché LRU en memoria con expiración (TTL) e invalidación por etiquetas.
+
+    Cada entrada se guarda con un conjunto de etiquetas (por ejemplo ("producto", 3) o
+    ("categoria", 2)); los endpoints de escritura invalidan sólo las etiquetas que tocan.
+    """
+
+    def __init__(self, max_entradas: int = 1024, ttl: float = 60.0, habilitado: bool = True):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.habilitado = habilitado
+        self._lock = threading.Lock()
+        # clave -> (valor, expira_en, etiquetas)
+        self._entradas: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._por_etiqueta = {}
+        # Se incrementa en cada invalidación; una lectura iniciada antes no guarda su resultado
+        self._generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.expiraciones = 0
+        self.invalidaciones = 0
+
+    def _quitar(self, clave: Hashable):
+        _, _, etiquetas = self._entradas.pop(clave)
+        for etiqueta in etiquetas:
+            claves = self._por_etiqueta.get(etiqueta)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_etiqueta[etiqueta]
+
+    def generacion(self) -> int:
+        return self._generacion
+
+    def obtener(self, clave: Hashable):
+        """
+        Devuelve (encontrado, valor).
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return False, None
+            if entrada[1] <= time.monotonic():
+                self._quitar(clave)
+                self.expiraciones += 1
+                self.fallos += 1
+                return False, None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return True, entrada[0]
+
+    def guardar(self, clave: Hashable, valor, etiquetas: Iterable[Hashable], generacion: int):
+        """
+        Guarda el valor si no hubo invalidaciones desde `generacion` (cuando empezó la lectura).
+        """
+        etiquetas = frozenset(etiquetas) | {clave}
+        with self._lock:
+            if generacion != self._generacion:
+                return
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = (valor, time.monotonic() + self.ttl, etiquetas)
+            for etiqueta in etiquetas:
+                self._por_etiqueta.setdefault(etiqueta, set()).add(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._quitar(next(iter(self._entradas)))
+                self.desalojos += 1
+
+    def invalidar(self, *etiquetas: Hashable):
+        with self._lock:
+            self._generacion += 1
+            for etiqueta in etiquetas:
+                for clave in list(self._por_etiqueta.get(etiqueta, ())):
+                    self._quitar(clave)
+                    self.invalidaciones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._generacion += 1
+            self._entradas.clear()
+            self._por_etiqueta.clear()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "habilitado": self.habilitado,
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "desalojos": self.desalojos,
+                "expiraciones": self.expiraciones,
+                "invalidaciones": self.invalidaciones,
+            }
+
+
+def cacheado(cache: CacheCatalogo, clave: Callable[..., Hashable],
+             etiquetas: Optional[Callable[..., Iterable[Hashable]]] = None):
+    """
+    Decorador para endpoints async de lectura: devuelve el resultado guardado sin tocar
+    la base de datos. `clave` recibe los argumentos del endpoint; `etiquetas` recibe
+    además el resultado (resultado=...) y devuelve las etiquetas que lo invalidan.
+    """
+    def decorador(endpoint):
+        @functools.wraps(endpoint)
+        async def envoltura(**kwargs):
+            if not cache.habilitado:
+                return await endpoint(**kwargs)
+            clave_entrada = clave(**kwargs)
+            encontrado, valor = cache.obtener(clave_entrada)
+            if encontrado:
+                return valor
+            generacion = cache.generacion()
+            valor = await endpoint(**kwargs)
+            cache.guardar(clave_entrada, valor, etiquetas(resultado=valor, **kwargs) if etiquetas else (), generacion)
+            return valor
+        return envoltura
+    return decorador
+
+
+class VersionCatalogo:
+    """
+    Posición de este proceso en la secuencia de cambios del catálogo.
+
+    `aplicada` es el último cambio ya reflejado en la caché y el índice de este proceso;
+    `conocida`, el último del que se tiene noticia (propio o leído de la base de datos).
+    Los cambios se aplican en orden, así que mientras `conocida` > `aplicada` el estado
+    local está incompleto y no se emite ETag.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Identifica la base de datos (cambia si se recrea) para que los ETag no se repitan
+        self.epoca = ""
+        self.aplicada = 0
+        self.conocida = 0
+
+    def iniciar(self, epoca: str, version: int):
+        with self._lock:
+            self.epoca = epoca
+            self.aplicada = self.conocida = version
+
+    def anunciar(self, version: int):
+        with self._lock:
+            self.conocida = max(self.conocida, version)
+
+    def avanzar(self, version: int) -> bool:
+        """
+        Marca `version` como aplicada si es la siguiente de la secuencia.
+        """
+        with self._lock:
+            self.conocida = max(self.conocida, version)
+            if version != self.aplicada + 1:
+                return False
+            self.aplicada = version
+            return True
+
+    def etag(self) -> Optional[str]:
+        """
+        ETag de la versión aplicada, o None si hay cambios conocidos sin aplicar.
+        """
+        with self._lock:
+            if not self.epoca or self.aplicada != self.conocida:
+                return None
+            return f'"{self.epoca}-{self.aplicada}"'
+
+
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Compara la cabecera If-None-Match con un ETag (comparación débil, RFC 9110).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etiqueta = etag[2:] if etag.startswith("W/") else etag
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato.startswith("W/"):
+            candidato = candidato[2:]
+        if candidato == etiqueta:
+            return True
+    return False
@@ -0,0 +1,93 @@
+import asyncio
+import functools
+from typing import Callable, Dict, Hashable, Optional
+
+
+class CoalescenciaLecturas:
+    """
+    Agrupa lecturas idénticas simultáneas ("single flight"): la primera petición con una
+    clave ejecuta la consulta y las que llegan mientras está en curso esperan y reciben el
+    mismo resultado (o la misma excepción), sin ir a la base de datos.
+
+    La clave incluye `version()` (la versión del catálogo aplicada en este proceso): una
+    petición que llega después de aplicarse un cambio no se une a una consulta anterior.
+    Todo ocurre en el event loop, así que no hace falta lock.
+    """
+
+    def __init__(self, version: Optional[Callable[[], Hashable]] = None, habilitado: bool = True):
+        self.version = version
+        self.habilitado = habilitado
+        self._en_curso: Dict[Hashable, asyncio.Future] = {}
+        # grupo -> [ejecutadas, coalescidas]
+        self._contadores: Dict[str, list] = {}
+
+    async def ejecutar(self, grupo: str, clave: Hashable, funcion: Callable, **kwargs):
+        """
+        Ejecuta `funcion(**kwargs)` o espera a la ejecución en curso con la misma clave.
+        """
+        if self.version is not None:
+            clave = (grupo, clave, self.version())
+        else:
+            clave = (grupo, clave)
+        contadores = self._contadores.setdefault(grupo, [0, 0])
+        while True:
+            compartida = self._en_curso.get(clave)
+            if compartida is None:
+                break
+            contadores[1] += 1
+            try:
+                # shield: si se cancela esta petición, la ejecución compartida sigue para las demás
+                return await asyncio.shield(compartida)
+            except asyncio.CancelledError:
+                if compartida.cancelled():
+                    # Se canceló la petición que ejecutaba la consulta: otra toma su lugar
+                    contadores[1] -= 1
+                    continue
+                raise
+
+        compartida = asyncio.get_running_loop().create_future()
+        self._en_curso[clave] = compartida
+        contadores[0] += 1
+        try:
+            resultado = await funcion(**kwargs)
+        except asyncio.CancelledError:
+            compartida.cancel()
+            raise
+        except BaseException as e:
+            compartida.set_exception(e)
+            # Evita el aviso "exception was never retrieved" si nadie más esperaba
+            compartida.exception()
+            raise
+        else:
+            compartida.set_result(resultado)
+            return resultado
+        finally:
+            del self._en_curso[clave]
+
+    def estadisticas(self) -> dict:
+        grupos = {
+            grupo: {"ejecutadas": ejecutadas, "coalescidas": coalescidas}
+            for grupo, (ejecutadas, coalescidas) in sorted(self._contadores.items())
+        }
+        return {
+            "habilitado": self.habilitado,
+            "en_curso": len(self._en_curso),
+            "ejecutadas": sum(g["ejecutadas"] for g in grupos.values()),
+            "coalescidas": sum(g["coalescidas"] for g in grupos.values()),
+            "grupos": grupos,
+        }
+
+
+def coalescido(coalescencia: CoalescenciaLecturas, grupo: str, clave: Callable[..., Hashable]):
+    """
+    Decorador para endpoints async de lectura: las peticiones simultáneas con la misma
+    `clave` (recibe los argumentos del endpoint, sin la sesión) comparten una ejecución.
+    """
+    def decorador(endpoint):
+        @functools.wraps(endpoint)
+        async def envoltura(**kwargs):
+            if not coalescencia.habilitado:
+                return await endpoint(**kwargs)
+            return await coalescencia.ejecutar(grupo, clave(**kwargs), endpoint, **kwargs)
+        return envoltura
+    return decorador
@@ -0,0 +1,60 @@
+import threading
+import time
+from typing import Callable, Optional
+
+
+class SondeoCambios:
+    """
+    Hilo que cada `intervalo` segundos llama a `sondear` para aplicar en este proceso los
+    cambios del catálogo hechos por otros procesos (ver sondear_cambios en main.py).
+
+    Con varios workers, cada uno tiene su propio hilo; un cambio se ve en todos como
+    mucho `intervalo` segundos (más lo que tarde la consulta) después del commit.
+    """
+
+    def __init__(self, sondear: Callable[[], int], intervalo: float):
+        self.sondear = sondear
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self.sondeos = 0
+        self.errores = 0
+        self.cambios_aplicados = 0
+        self.ultimo_sondeo: Optional[float] = None
+        self.ultimo_error: Optional[str] = None
+
+    def iniciar(self):
+        if self._hilo is not None or self.intervalo <= 0:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ejecutar, name="sondeo-cambios", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=self.intervalo + 5)
+            self._hilo = None
+
+    def _ejecutar(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.cambios_aplicados += self.sondear()
+                self.ultimo_sondeo = time.time()
+            except Exception as e:
+                # Un error (p. ej. MySQL reiniciando) no detiene el hilo; se reintenta en el siguiente ciclo
+                self.errores += 1
+                self.ultimo_error = str(e)[:200]
+            self.sondeos += 1
+
+    def estadisticas(self) -> dict:
+        return {
+            "activo": self._hilo is not None,
+            "intervalo_segundos": self.intervalo,
+            "sondeos": self.sondeos,
+            "errores": self.errores,
+            "cambios_aplicados": self.cambios_aplicados,
+            "segundos_desde_ultimo_sondeo": round(time.time() - self.ultimo_sondeo, 3)
+            if self.ultimo_sondeo else None,
+            "ultimo_error": self.ultimo_error,
+        }
@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import List, Optional
+
+from metricas import contador_actual
+
+# Prefijo para obtener el plan de ejecución en cada dialecto
+PREFIJOS_EXPLAIN = {
+    "mysql": "EXPLAIN ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+
+# Longitud máxima de los parámetros guardados (los executemany pueden ser enormes)
+MAX_PARAMETROS = 500
+
+
+def _resumir(parametros) -> str:
+    texto = repr(parametros)
+    return texto if len(texto) <= MAX_PARAMETROS else texto[:MAX_PARAMETROS] + "..."
+
+
+def _escaneo_completo(dialecto: str, plan: List[dict]) -> bool:
+    """
+    Indica si el plan recorre una tabla completa (type=ALL en MySQL, "SCAN tabla" en SQLite).
+    """
+    if dialecto == "mysql":
+        return any(paso.get("type") == "ALL" for paso in plan)
+    if dialecto == "sqlite":
+        return any(str(paso.get("detail", "")).startswith("SCAN ") and "USING" not in str(paso.get("detail", ""))
+                   for paso in plan)
+    return False
+
+
+class RegistroConsultasLentas:
+    """
+    Observador de consultas (ver metricas.observar_consultas) que registra las sentencias
+    que superan `umbral_ms`: SQL, parámetros, ruta que la emitió, duración y, con `explain`,
+    el plan de ejecución obtenido en la misma conexión.
+
+    Cada entrada se escribe como una línea JSON en un archivo con rotación y las últimas
+    `max_recientes` se guardan en memoria para /admin/consultas-lentas.
+    """
+
+    def __init__(self, umbral_ms: float, explain: bool = True, archivo: Optional[str] = None,
+                 max_bytes: int = 5 * 1024 * 1024, respaldos: int = 5, max_recientes: int = 200):
+        self.umbral_ms = umbral_ms
+        self.explain = explain
+        self.archivo = archivo
+        self.max_bytes = max_bytes
+        self.respaldos = respaldos
+        self.recientes = deque(maxlen=max_recientes)
+        self.total = 0
+        self._lock = threading.Lock()
+        self._logger: Optional[logging.Logger] = None
+
+    def _log(self) -> logging.Logger:
+        # El archivo se crea con la primera consulta lenta, no al importar
+        if self._logger is None:
+            logger = logging.getLogger("cafeteria.consultas_lentas")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            if self.archivo:
+                os.makedirs(os.path.dirname(self.archivo) or ".", exist_ok=True)
+                manejador = RotatingFileHandler(
+                    self.archivo, maxBytes=self.max_bytes, backupCount=self.respaldos, encoding="utf-8"
+                )
+                manejador.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(manejador)
+            self._logger = logger
+        return self._logger
+
+    def _plan(self, conn, statement: str, parameters, context) -> Optional[dict]:
+        prefijo = PREFIJOS_EXPLAIN.get(conn.dialect.name)
+        if prefijo is None or not statement.lstrip()[:6].upper() == "SELECT":
+            return None
+        # Con stream_results el cursor original no tiene buffer y la conexión sigue ocupada
+        if context is not None and context.execution_options.get("stream_results"):
+            return None
+        try:
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(prefijo + statement, parameters)
+                columnas = [d[0] for d in cursor.description]
+                pasos = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+            finally:
+                cursor.close()
+        except Exception as e:
+            return {"error": str(e)[:200]}
+        return {"pasos": pasos, "escaneo_completo": _escaneo_completo(conn.dialect.name, pasos)}
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany, segundos):
+        if self.umbral_ms < 0 or segundos * 1000 < self.umbral_ms:
+            return
+        contador = contador_actual()
+        entrada = {
+            "fecha": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "ms": round(segundos * 1000, 3),
+            "ruta": contador.ruta() if contador is not None else None,
+            "sentencia": statement,
+            "parametros": _resumir(parameters),
+            "executemany": executemany,
+            "plan": self._plan(conn, statement, parameters, context) if self.explain and not executemany else None,
+        }
+        with self._lock:
+            self.total += 1
+            self.recientes.append(entrada)
+        self._log().info(json.dumps(entrada, ensure_ascii=False, default=str))
+
+    def ultimas(self, limite: int) -> List[dict]:
+        with self._lock:
+            return list(self.recientes)[::-1][:limite]
@@ -0,0 +1,126 @@
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+
+class EscrituraDiferida:
+    """
+    Escritura diferida ("write-behind"): acumula valores por clave y un hilo propio los
+    aplica juntos con `aplicar(cambios)` cada `ventana` segundos. Si una clave recibe varios
+    valores dentro de la ventana se fusionan y sólo se escribe el último.
+
+    Durabilidad: lo aceptado vive sólo en la memoria del proceso hasta que `aplicar` confirma
+    la transacción (como mucho `ventana` segundos más lo que tarde la escritura). Un apagado
+    ordenado (`detener`) escribe lo pendiente; si el proceso muere antes, se pierde. Si la
+    escritura falla, los cambios vuelven a la cola (sin pisar valores más nuevos de la misma
+    clave) y se reintenta cada `reintento` segundos.
+    """
+
+    def __init__(self, aplicar: Callable[[Dict[Hashable, object]], None], ventana: float, reintento: float = 1.0):
+        self.aplicar = aplicar
+        self.ventana = ventana
+        self.reintento = reintento
+        self._lock = threading.Lock()
+        # Una sola escritura a la vez (hilo propio o `vaciar` al apagar), para respetar el orden
+        self._escribiendo = threading.Lock()
+        self._pendientes: Dict[Hashable, object] = {}
+        self._hay_pendientes = threading.Event()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self.recibidas = 0
+        self.fusionadas = 0
+        self.escritas = 0
+        self.escrituras = 0
+        self.errores = 0
+        self.ultima_escritura: Optional[float] = None
+        self.ultimo_error: Optional[str] = None
+
+    @property
+    def activa(self) -> bool:
+        return self._hilo is not None
+
+    def iniciar(self):
+        if self._hilo is not None or self.ventana <= 0:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ejecutar, name="escritura-diferida", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """
+        Detiene el hilo y escribe lo pendiente.
+        """
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._hay_pendientes.set()
+        self._hilo.join()
+        self._hilo = None
+        try:
+            self.vaciar()
+        except Exception:
+            # Ya quedó en ultimo_error; al apagar no hay a quién devolverlo
+            pass
+
+    def agregar(self, cambios: Dict[Hashable, object]):
+        with self._lock:
+            for clave, valor in cambios.items():
+                if clave in self._pendientes:
+                    self.fusionadas += 1
+                self._pendientes[clave] = valor
+            self.recibidas += len(cambios)
+        self._hay_pendientes.set()
+
+    def vaciar(self) -> int:
+        """
+        Aplica ahora lo pendiente y devuelve cuántas claves escribió.
+        """
+        with self._escribiendo:
+            with self._lock:
+                cambios, self._pendientes = self._pendientes, {}
+                self._hay_pendientes.clear()
+            if not cambios:
+                return 0
+            try:
+                self.aplicar(cambios)
+            except Exception as e:
+                with self._lock:
+                    for clave, valor in cambios.items():
+                        self._pendientes.setdefault(clave, valor)
+                    self._hay_pendientes.set()
+                self.errores += 1
+                self.ultimo_error = str(e)[:200]
+                raise
+            self.escritas += len(cambios)
+            self.escrituras += 1
+            self.ultima_escritura = time.time()
+            return len(cambios)
+
+    def _ejecutar(self):
+        while not self._detener.is_set():
+            self._hay_pendientes.wait()
+            # Esperar la ventana para fusionar los cambios que sigan llegando
+            if self._detener.wait(self.ventana):
+                break
+            try:
+                self.vaciar()
+            except Exception:
+                # Un error (p. ej. MySQL reiniciando) no detiene el hilo; se reintenta
+                self._detener.wait(self.reintento)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            pendientes = len(self._pendientes)
+        return {
+            "activa": self.activa,
+            "ventana_ms": round(self.ventana * 1000, 3),
+            "pendientes": pendientes,
+            "recibidas": self.recibidas,
+            "fusionadas": self.fusionadas,
+            "escritas": self.escritas,
+            "escrituras": self.escrituras,
+            "errores": self.errores,
+            "segundos_desde_ultima_escritura": round(time.time() - self.ultima_escritura, 3)
+            if self.ultima_escritura else None,
+            "ultimo_error": self.ultimo_error,
+        }
@@ -0,0 +1,100 @@
+import asyncio
+import json
+from typing import List, Optional, Set, Tuple
+
+
+def formatear_evento(nombre: str, datos, id_evento: Optional[str] = None) -> str:
+    """
+    Texto de un evento en formato Server-Sent Events.
+    """
+    lineas = [f"event: {nombre}"]
+    if id_evento is not None:
+        lineas.append(f"id: {id_evento}")
+    lineas.append("data: " + json.dumps(datos, ensure_ascii=False, separators=(",", ":")))
+    return "\n".join(lineas) + "\n\n"
+
+
+class Suscripcion:
+    """
+    Cola acotada de un cliente de /eventos. Los elementos son (version, texto SSE con los
+    eventos de esa versión); None indica que el canal descartó la suscripción.
+    """
+
+    __slots__ = ("cola", "descartada")
+
+    def __init__(self, max_cola: int):
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=max_cola)
+        self.descartada = False
+
+
+class CanalEventos:
+    """
+    Reparte los eventos del catálogo a los suscriptores de /eventos.
+
+    `publicar` se puede llamar desde cualquier hilo (los commits ocurren en el threadpool y
+    en el hilo de sondeo): el reparto se agenda en el event loop, así que los suscriptores
+    sólo usan colas de asyncio y un cliente inactivo no ocupa ningún hilo. Si la cola de un
+    cliente se llena, se descarta: su stream termina y el cliente se reconecta con
+    Last-Event-ID para recuperar lo que le faltó.
+    """
+
+    def __init__(self, max_cola: int = 100):
+        self.max_cola = max_cola
+        self._suscripciones: Set[Suscripcion] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.publicados = 0
+        self.descartados = 0
+        self.suscripciones_totales = 0
+
+    def suscribir(self) -> Suscripcion:
+        """
+        Crea una suscripción; se llama desde el event loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        suscripcion = Suscripcion(self.max_cola)
+        self._suscripciones.add(suscripcion)
+        self.suscripciones_totales += 1
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion):
+        self._suscripciones.discard(suscripcion)
+
+    def publicar(self, eventos: List[Tuple[int, str]]):
+        """
+        Agenda el reparto de (version, texto SSE), en orden, a todos los suscriptores.
+        """
+        loop = self._loop
+        if loop is None or not eventos:
+            return
+        try:
+            loop.call_soon_threadsafe(self._repartir, eventos)
+        except RuntimeError:
+            # El event loop ya se cerró (apagado del proceso)
+            pass
+
+    def _repartir(self, eventos: List[Tuple[int, str]]):
+        self.publicados += len(eventos)
+        for suscripcion in list(self._suscripciones):
+            try:
+                for evento in eventos:
+                    suscripcion.cola.put_nowait(evento)
+            except asyncio.QueueFull:
+                self._descartar(suscripcion)
+
+    def _descartar(self, suscripcion: Suscripcion):
+        # Vaciar la cola para que el cliente lento reciba el aviso sin procesar eventos viejos
+        self._suscripciones.discard(suscripcion)
+        suscripcion.descartada = True
+        while not suscripcion.cola.empty():
+            suscripcion.cola.get_nowait()
+        suscripcion.cola.put_nowait(None)
+        self.descartados += 1
+
+    def estadisticas(self) -> dict:
+        return {
+            "suscriptores": len(self._suscripciones),
+            "suscripciones_totales": self.suscripciones_totales,
+            "eventos_publicados": self.publicados,
+            "suscriptores_descartados": self.descartados,
+            "max_cola": self.max_cola,
+        }
@@ -1,21 +1,106 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, File, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, ForeignKey, Table, or_, func
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, Text, DateTime, ForeignKey, Table, case, literal_column, or_, func, insert, delete, select, text, tuple_, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
-from pydantic import BaseModel
-from typing import List, Optional
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.orm import sessionmaker, Session, relationship, joinedload, contains_eager
+from pydantic import BaseModel, ConfigDict, ValidationError
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+import asyncio
+import base64
+import binascii
+import csv
 import enum
+import functools
+import io
+import itertools
+import json
 import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from busqueda import IndiceInvertido, IndiceSugerencias
+from coherencia import SondeoCambios
+from cache import CacheCatalogo, VersionCatalogo, cacheado, etag_coincide
+from coalescencia import CoalescenciaLecturas, coalescido
+from escritura_diferida import EscrituraDiferida
+from consultas_lentas import RegistroConsultasLentas
+from eventos import CanalEventos, formatear_evento
+from metricas import (
+    ContadorConsultasMiddleware, EstadisticasPool, MetricasHTTP, configuracion_pool, observar_consultas, pool_con_metricas
+)
+from perfilado import PerfiladorMiddleware, listar_perfiles, perfil_actual, resumen_pstats
+from serializacion import respuesta_rapida
 
 # Configuración de la base de datos
-DATABASE_URL = "mysql+pymysql://user:password@db:3306/fastapi_db"
-engine = create_engine(DATABASE_URL)
+DATABASE_URL = os.getenv("DATABASE_URL", "mysql+pymysql://user:password@db:3306/fastapi_db")
+
+# Configuración del pool de conexiones
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Reciclar conexiones antes de que MySQL las cierre por wait_timeout (8 h por defecto)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "si", "yes")
+
+def opciones_pool(url: str, clase_pool, estadisticas: EstadisticasPool) -> dict:
+    """
+    Argumentos de create_engine para el pool; SQLite usa el pool por defecto de SQLAlchemy.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": pool_con_metricas(clase_pool, estadisticas, DB_MAX_OVERFLOW),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+estadisticas_pool = EstadisticasPool()
+# Se guardan para /admin/pool: es lo que recibió cada engine
+opciones_pool_sync = opciones_pool(DATABASE_URL, QueuePool, estadisticas_pool)
+engine = create_engine(DATABASE_URL, **opciones_pool_sync)
+estadisticas_pool.instalar_eventos(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Modo de acceso a la base de datos en los endpoints: "sync" (threadpool) o "async" (asyncio)
+DB_MODO = os.getenv("DB_MODO", "sync").lower()
+
+# Drivers asíncronos equivalentes a los síncronos
+DRIVERS_ASYNC = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
+
+def url_async(url: str) -> str:
+    """
+    Cambia el driver de la URL por su equivalente asíncrono (pymysql -> aiomysql).
+    """
+    url = make_url(url)
+    driver = DRIVERS_ASYNC.get(url.get_backend_name(), url.drivername)
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or url_async(DATABASE_URL)
+async_engine = None
+AsyncSessionLocal = None
+estadisticas_pool_async = EstadisticasPool()
+opciones_pool_async: dict = {}
+if DB_MODO == "async":
+    opciones_pool_async = opciones_pool(ASYNC_DATABASE_URL, AsyncAdaptedQueuePool, estadisticas_pool_async)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **opciones_pool_async)
+    estadisticas_pool_async.instalar_eventos(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+
+# Modo de búsqueda: "indice" (índice invertido en memoria) o "like" (consulta LIKE original)
+BUSQUEDA_MODO = os.getenv("BUSQUEDA_MODO", "indice").lower()
+
 # Tabla intermedia para la relación muchos a muchos entre productos y postres
 productos_postres = Table(
     'productos_postres',
@@ -31,6 +116,9 @@ class Categoria(Base):
     id = Column(Integer, primary_key=True, index=True)
     nombre = Column(String(50), unique=True, index=True)
     descripcion = Column(Text)
+    # Último cambio del catálogo que modificó la fila y cuándo (ver /sync)
+    version_cambio = Column(Integer, nullable=False, default=0, index=True)
+    actualizado_en = Column(DateTime, server_default=func.now())
     
     # Relaciones
     productos = relationship("Producto", back_populates="categoria_rel")
@@ -46,6 +134,8 @@ class Producto(Base):
     descripcion = Column(Text)
     precio = Column(Float)
     disponible = Column(Integer, default=1)
+    version_cambio = Column(Integer, nullable=False, default=0, index=True)
+    actualizado_en = Column(DateTime, server_default=func.now())
     
     # Relación con categoría
     categoria_rel = relationship("Categoria", back_populates="productos")
@@ -65,6 +155,8 @@ class Postre(Base):
     precio_rebanada = Column(Float)
     precio_total = Column(Float)
     disponible = Column(Integer, default=1)
+    version_cambio = Column(Integer, nullable=False, default=0, index=True)
+    actualizado_en = Column(DateTime, server_default=func.now())
     
     # Relación con categoría
     categoria_rel = relationship("Categoria", back_populates="postres")
@@ -72,6 +164,48 @@ class Postre(Base):
     # Relación muchos a muchos con productos
     productos_relacionados = relationship("Producto", secondary=productos_postres, back_populates="postres_relacionados")
 
+# Versiones del esquema aplicadas por bootstrap.py
+class EsquemaVersion(Base):
+    __tablename__ = "esquema_version"
+    
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    aplicada_en = Column(DateTime, server_default=func.now())
+
+# Secuencia de cambios del catálogo (una sola fila, id=1); la incrementa cada escritura
+class CatalogoVersion(Base):
+    __tablename__ = "catalogo_version"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(Integer, nullable=False, default=0)
+    epoca = Column(String(32), nullable=False)
+
+# Cambios del catálogo, para que los demás procesos invaliden su caché e índice
+class CambioCatalogo(Base):
+    __tablename__ = "catalogo_cambios"
+    
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    tipo = Column(String(20), nullable=False)
+    ids = Column(Text)  # lista JSON de ids afectados
+    categorias = Column(Text)  # lista JSON de categorías afectadas
+    accion = Column(String(20))  # creado, actualizado o borrado
+    vinculos = Column(Text)  # JSON {"creado": [[producto_id, postre_id], ...], "borrado": [...]}
+    creado_en = Column(DateTime, server_default=func.now())
+
+# Filas borradas del catálogo (tombstones) para /sync; no se podan
+class CatalogoBorrado(Base):
+    __tablename__ = "catalogo_borrados"
+    
+    tipo = Column(String(20), primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(Integer, nullable=False, index=True)
+    borrado_en = Column(DateTime, server_default=func.now())
+
+# Modelo de cada tipo de cambio del catálogo
+MODELOS_CATALOGO = {"categoria": Categoria, "producto": Producto, "postre": Postre}
+
+# Versión del esquema que necesita esta versión de la API
+ESQUEMA_VERSION = 4
+
 # Esquemas Pydantic para Categorías
 class CategoriaBase(BaseModel):
     nombre: str
@@ -83,8 +217,7 @@ class CategoriaCreate(CategoriaBase):
 class CategoriaResponse(CategoriaBase):
     id: int
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Esquemas Pydantic para Productos
 class ProductoBase(BaseModel):
@@ -106,8 +239,7 @@ class ProductoResponse(BaseModel):
     disponible: int
     categoria_rel: Optional[CategoriaResponse] = None
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ProductoUpdate(BaseModel):
     nombre: Optional[str] = None
@@ -141,8 +273,7 @@ class PostreResponse(BaseModel):
     disponible: int
     categoria_rel: Optional[CategoriaResponse] = None
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class PostreUpdate(BaseModel):
     nombre: Optional[str] = None
@@ -154,253 +285,61 @@ class PostreUpdate(BaseModel):
     disponible: Optional[int] = None
     productos_ids: Optional[List[int]] = None
 
-# Función para inicializar la base de datos con datos de ejemplo
-def init_db():
-    # Crear todas las tablas
-    Base.metadata.create_all(bind=engine)
-    
-    db = SessionLocal()
-    
-    try:
-        # Crear categorías si no existen
-        if db.query(Categoria).count() == 0:
-            categorias = [
-                Categoria(nombre="torta", descripcion="Tortas tradicionales mexicanas"),
-                Categoria(nombre="cuernito", descripcion="Cuernitos y croissants horneados"),
-                Categoria(nombre="quesadilla", descripcion="Quesadillas de tortilla de maíz"),
-                Categoria(nombre="taco", descripcion="Tacos variados"),
-                Categoria(nombre="baguette", descripcion="Baguettes gourmet"),
-                Categoria(nombre="bebida", descripcion="Bebidas frías y calientes"),
-                Categoria(nombre="postre", descripcion="Postres y dulces"),
-                Categoria(nombre="pastel", descripcion="Pasteles completos y por rebanada"),
-                Categoria(nombre="postre_frio", descripcion="Postres fríos y helados")
-            ]
-            for cat in categorias:
-                db.add(cat)
-            db.commit()
-        
-        # Obtener IDs de categorías
-        cat_dict = {cat.nombre: cat.id for cat in db.query(Categoria).all()}
-        
-        # Verificar si ya existen productos para evitar duplicados
-        if db.query(Producto).count() == 0:
-            productos_iniciales = [
-                # Tortas
-                Producto(
-                    nombre="Torta de Jamón", 
-                    categoria_id=cat_dict["torta"],
-                    descripcion="Torta con jamón, queso, aguacate, jitomate y lechuga en pan telera", 
-                    precio=45.0
-                ),
-                Producto(
-                    nombre="Torta de Milanesa", 
-                    categoria_id=cat_dict["torta"],
-                    descripcion="Torta con milanesa de res empanizada, aguacate, jitomate, lechuga y frijoles", 
-                    precio=60.0
-                ),
-                Producto(
-                    nombre="Torta Cubana", 
-                    categoria_id=cat_dict["torta"],
-                    descripcion="Torta con jamón, queso, milanesa, salchicha, chorizo, huevo, aguacate y frijoles", 
-                    precio=85.0
-                ),
-                
-                # Cuernitos
-                Producto(
-                    nombre="Cuernito de Jamón y Queso", 
-                    categoria_id=cat_dict["cuernito"],
-                    descripcion="Croissant horneado relleno de jamón y queso gouda derretido", 
-                    precio=38.0
-                ),
-                Producto(
-                    nombre="Cuernito 3 Quesos", 
-                    categoria_id=cat_dict["cuernito"],
-                    descripcion="Croissant horneado relleno de queso manchego, gouda y philadelphia", 
-                    precio=42.0
-                ),
-                
-                # Quesadillas
-                Producto(
-                    nombre="Quesadilla de Queso", 
-                    categoria_id=cat_dict["quesadilla"],
-                    descripcion="Tortilla de maíz hecha a mano rellena de queso Oaxaca", 
-                    precio=25.0
-                ),
-                Producto(
-                    nombre="Quesadilla de Hongos", 
-                    categoria_id=cat_dict["quesadilla"],
-                    descripcion="Tortilla de maíz hecha a mano rellena de hongos guisados y queso", 
-                    precio=30.0
-                ),
-                Producto(
-                    nombre="Quesadilla de Tinga", 
-                    categoria_id=cat_dict["quesadilla"],
-                    descripcion="Tortilla de maíz hecha a mano rellena de tinga de pollo y queso", 
-                    precio=35.0
-                ),
-                
-                # Tacos
-                Producto(
-                    nombre="Taco de Pastor", 
-                    categoria_id=cat_dict["taco"],
-                    descripcion="Tortilla de maíz con carne de cerdo marinada en adobo y piña", 
-                    precio=18.0
-                ),
-                Producto(
-                    nombre="Taco de Suadero", 
-                    categoria_id=cat_dict["taco"],
-                    descripcion="Tortilla de maíz con carne de res suadero, cilantro y cebolla", 
-                    precio=20.0
-                ),
-                Producto(
-                    nombre="Taco de Barbacoa", 
-                    categoria_id=cat_dict["taco"],
-                    descripcion="Tortilla de maíz con carne de barbacoa de borrego, cilantro y cebolla", 
-                    precio=25.0
-                ),
-                
-                # Baguettes
-                Producto(
-                    nombre="Baguette Italiano", 
-                    categoria_id=cat_dict["baguette"],
-                    descripcion="Pan baguette con jamón serrano, queso provolone, tomate y pesto", 
-                    precio=65.0
-                ),
-                Producto(
-                    nombre="Baguette de Pollo", 
-                    categoria_id=cat_dict["baguette"],
-                    descripcion="Pan baguette con pollo a la plancha, queso manchego, lechuga y jitomate", 
-                    precio=60.0
-                ),
-                
-                # Bebidas
-                Producto(
-                    nombre="Café Americano", 
-                    categoria_id=cat_dict["bebida"],
-                    descripcion="Café de grano recién molido, 12 oz", 
-                    precio=30.0
-                ),
-                Producto(
-                    nombre="Agua de Horchata", 
-                    categoria_id=cat_dict["bebida"],
-                    descripcion="Agua fresca de arroz con canela y vainilla, 16 oz", 
-                    precio=25.0
-                ),
-                Producto(
-                    nombre="Limonada", 
-                    categoria_id=cat_dict["bebida"],
-                    descripcion="Limonada natural con un toque de menta, 16 oz", 
-                    precio=28.0
-                ),
-                
-                # Postres individuales en productos
-                Producto(
-                    nombre="Rebanada de Pastel de Chocolate", 
-                    categoria_id=cat_dict["postre"],
-                    descripcion="Rebanada individual de pastel de chocolate", 
-                    precio=45.0
-                ),
-                Producto(
-                    nombre="Flan Individual", 
-                    categoria_id=cat_dict["postre"],
-                    descripcion="Porción individual de flan napolitano", 
-                    precio=35.0
-                )
-            ]
-            
-            for producto in productos_iniciales:
-                db.add(producto)
-            
-            db.commit()
-        
-        # Verificar si ya existen postres para evitar duplicados
-        if db.query(Postre).count() == 0:
-            postres_iniciales = [
-                Postre(
-                    nombre="Pastel de Chocolate",
-                    descripcion="Delicioso pastel de chocolate con ganache de chocolate oscuro y decorado con fresas",
-                    categoria_id=cat_dict["pastel"],
-                    rebanadas=12,
-                    precio_rebanada=45.0,
-                    precio_total=540.0
-                ),
-                Postre(
-                    nombre="Cheesecake de Fresa",
-                    descripcion="Tarta de queso cremosa con base de galleta y cobertura de fresas naturales",
-                    categoria_id=cat_dict["pastel"],
-                    rebanadas=10,
-                    precio_rebanada=50.0,
-                    precio_total=500.0
-                ),
-                Postre(
-                    nombre="Pastel Tres Leches",
-                    descripcion="Esponjoso pastel bañado en tres tipos de leche con crema chantilly y canela",
-                    categoria_id=cat_dict["pastel"],
-                    rebanadas=16,
-                    precio_rebanada=35.0,
-                    precio_total=560.0
-                ),
-                Postre(
-                    nombre="Tarta de Manzana",
-                    descripcion="Clásica tarta de manzana con masa crujiente y manzanas caramelizadas",
-                    categoria_id=cat_dict["pastel"],
-                    rebanadas=8,
-                    precio_rebanada=40.0,
-                    precio_total=320.0
-                ),
-                Postre(
-                    nombre="Pastel de Zanahoria",
-                    descripcion="Húmedo pastel de zanahoria con nueces y betún de queso crema",
-                    categoria_id=cat_dict["pastel"],
-                    rebanadas=12,
-                    precio_rebanada=42.0,
-                    precio_total=504.0
-                ),
-                Postre(
-                    nombre="Tiramisú",
-                    descripcion="Postre italiano con capas de bizcocho bañado en café, mascarpone y cacao",
-                    categoria_id=cat_dict["postre_frio"],
-                    rebanadas=9,
-                    precio_rebanada=55.0,
-                    precio_total=495.0
-                ),
-                Postre(
-                    nombre="Pastel Red Velvet",
-                    descripcion="Suave pastel de terciopelo rojo con betún de queso crema",
-                    categoria_id=cat_dict["pastel"],
-                    rebanadas=14,
-                    precio_rebanada=48.0,
-                    precio_total=672.0
-                ),
-                Postre(
-                    nombre="Flan Napolitano Familiar",
-                    descripcion="Flan casero de tamaño familiar con caramelo y vainilla",
-                    categoria_id=cat_dict["postre_frio"],
-                    rebanadas=10,
-                    precio_rebanada=25.0,
-                    precio_total=250.0
-                )
-            ]
-            
-            for postre in postres_iniciales:
-                db.add(postre)
-            
-            db.commit()
-            
-            # Crear algunas relaciones entre productos y postres
-            # Por ejemplo, relacionar las rebanadas individuales con los pasteles completos
-            pastel_chocolate = db.query(Postre).filter(Postre.nombre == "Pastel de Chocolate").first()
-            rebanada_chocolate = db.query(Producto).filter(Producto.nombre == "Rebanada de Pastel de Chocolate").first()
-            
-            if pastel_chocolate and rebanada_chocolate:
-                pastel_chocolate.productos_relacionados.append(rebanada_chocolate)
-                db.commit()
-    
-    except Exception as e:
-        print(f"Error al inicializar la base de datos: {str(e)}")
-        db.rollback()
-    finally:
-        db.close()
+# Esquemas Pydantic para la paginación por cursor
+class PaginaProductos(BaseModel):
+    items: List[ProductoResponse]
+    next_cursor: Optional[str] = None
+
+class PaginaPostres(BaseModel):
+    items: List[PostreResponse]
+    next_cursor: Optional[str] = None
+
+# Esquemas Pydantic para las operaciones en lote
+class ProductoLoteUpdate(ProductoUpdate):
+    id: int
+
+class PostreLoteUpdate(PostreUpdate):
+    id: int
+
+class ResultadoLote(BaseModel):
+    indice: int
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class RespuestaLote(BaseModel):
+    procesados: int
+    errores: int
+    resultados: List[ResultadoLote]
+
+# Esquema Pydantic para los cambios de disponibilidad
+class CambioDisponibilidad(BaseModel):
+    tipo: str
+    id: int
+    disponible: int
+
+# Esquemas Pydantic para la importación de archivos (una fila por registro)
+class CategoriaImport(BaseModel):
+    nombre: str
+    descripcion: str = ""
+
+class ProductoImport(BaseModel):
+    id: Optional[int] = None
+    nombre: str
+    categoria_id: Optional[int] = None
+    categoria: Optional[str] = None
+    descripcion: str = ""
+    precio: float
+    disponible: int = 1
+
+class PostreImport(BaseModel):
+    id: Optional[int] = None
+    nombre: str
+    categoria_id: Optional[int] = None
+    categoria: Optional[str] = None
+    descripcion: str = ""
+    rebanadas: int
+    precio_rebanada: float
+    disponible: int = 1
 
 # Crear la app FastAPI
 app = FastAPI(
@@ -418,6 +357,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Cuenta las consultas SQL de cada petición (cabecera X-Query-Count) y registra las métricas de /metrics
+metricas_http = MetricasHTTP()
+app.add_middleware(ContadorConsultasMiddleware, metricas=metricas_http)
+
+# Perfilado bajo demanda (cabecera X-Perfil o muestreo); sin PERFIL_HABILITADO el middleware no se instala
+PERFIL_HABILITADO = os.getenv("PERFIL_HABILITADO", "false").lower() in ("1", "true", "si", "yes")
+PERFIL_DIRECTORIO = os.getenv("PERFIL_DIRECTORIO", "logs/perfiles")
+if PERFIL_HABILITADO:
+    app.add_middleware(
+        PerfiladorMiddleware,
+        directorio=PERFIL_DIRECTORIO,
+        token=os.getenv("PERFIL_TOKEN", ""),
+        muestreo=float(os.getenv("PERFIL_MUESTREO", "0")),
+        intervalo=float(os.getenv("PERFIL_INTERVALO_MS", "1")) / 1000,
+        max_perfiles=int(os.getenv("PERFIL_MAX_ARCHIVOS", "100"))
+    )
+
 # Obtener la conexión a la base de datos
 def get_db():
     db = SessionLocal()
@@ -426,10 +382,136 @@ def get_db():
     finally:
         db.close()
 
-# Inicializar la base de datos al iniciar la aplicación
+# Obtener una sesión asíncrona (DB_MODO=async)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Dependencia de sesión que usan los endpoints según el modo configurado
+get_sesion = get_async_db if DB_MODO == "async" else get_db
+
+def con_bd(endpoint):
+    """
+    Convierte un endpoint síncrono que recibe `db` en uno asíncrono.
+    
+    Con una AsyncSession el cuerpo se ejecuta con AsyncSession.run_sync, en el event loop
+    y sobre el driver asíncrono; con una Session síncrona se ejecuta en el threadpool como antes.
+    El endpoint debe devolver datos ya serializados (esquemas o dicts), nunca objetos ORM
+    con relaciones sin cargar.
+    """
+    @functools.wraps(endpoint)
+    async def envoltura(**kwargs):
+        db = kwargs["db"]
+        if isinstance(db, AsyncSession):
+            return await db.run_sync(lambda sesion: endpoint(**{**kwargs, "db": sesion}))
+        perfil = perfil_actual()
+        if perfil is not None:
+            # Petición perfilada: el cuerpo corre en otro hilo y hay que perfilarlo allí
+            return await run_in_threadpool(perfil.ejecutar, endpoint, **kwargs)
+        return await run_in_threadpool(endpoint, **kwargs)
+    return envoltura
+
+# ==================== ÍNDICE DE BÚSQUEDA ====================
+
+# Índice invertido con claves ("producto", id) / ("postre", id)
+indice_busqueda = IndiceInvertido()
+# Índice de prefijos de nombres para /sugerir (también con claves ("categoria", id))
+indice_sugerencias = IndiceSugerencias()
+
+def _textos_busqueda(nombre: str, descripcion: str, categoria: Optional[Categoria]):
+    """
+    Campos de texto indexados para un producto o postre (incluye su categoría).
+    El primero es siempre el nombre, que es lo que se sugiere al autocompletar.
+    """
+    textos = [nombre, descripcion]
+    if categoria:
+        textos += [categoria.nombre, categoria.descripcion]
+    return textos
+
+def indexar(clave, textos):
+    """
+    Indexa un producto o postre en el buscador y en las sugerencias; las categorías
+    ("categoria", id) sólo van a las sugerencias.
+    """
+    if clave[0] != "categoria":
+        indice_busqueda.agregar(clave, textos)
+    indice_sugerencias.agregar(clave, textos[0])
+
+def desindexar(clave):
+    indice_busqueda.eliminar(clave)
+    indice_sugerencias.eliminar(clave)
+
+def indexar_al_confirmar(db: Session, documentos: Iterable[tuple]):
+    """
+    Deja para el commit de `db` los documentos (clave, textos) a indexar; con textos None se
+    quita la clave. _aplicar_cambios_confirmados los aplica antes de avanzar la versión del
+    catálogo, así que /buscar y /sugerir no responden el ETag nuevo con el índice anterior.
+    """
+    db.info.setdefault("indice_catalogo", []).extend(documentos)
+
+def documento_producto(producto: Producto):
+    return ("producto", producto.id), _textos_busqueda(producto.nombre, producto.descripcion, producto.categoria_rel)
+
+def documento_postre(postre: Postre):
+    return ("postre", postre.id), _textos_busqueda(postre.nombre, postre.descripcion, postre.categoria_rel)
+
+def reconstruir_indice_busqueda(db: Session):
+    """
+    Carga desde la base de datos las sugerencias y, con BUSQUEDA_MODO=indice, el índice de búsqueda.
+    """
+    filas_productos = db.query(
+        Producto.id, Producto.nombre, Producto.descripcion, Categoria.nombre, Categoria.descripcion
+    ).outerjoin(Categoria, Producto.categoria_id == Categoria.id).all()
+    filas_postres = db.query(
+        Postre.id, Postre.nombre, Postre.descripcion, Categoria.nombre, Categoria.descripcion
+    ).outerjoin(Categoria, Postre.categoria_id == Categoria.id).all()
+    
+    documentos = [(("producto", fila[0]), fila[1:]) for fila in filas_productos]
+    documentos += [(("postre", fila[0]), fila[1:]) for fila in filas_postres]
+    if BUSQUEDA_MODO == "indice":
+        indice_busqueda.reconstruir(documentos)
+    categorias = [(("categoria", id_), nombre) for id_, nombre in db.query(Categoria.id, Categoria.nombre)]
+    indice_sugerencias.reconstruir([(clave, textos[0]) for clave, textos in documentos] + categorias)
+
+def verificar_esquema():
+    """
+    Comprobación rápida al arrancar: una sola consulta a esquema_version.
+    La creación de tablas y los datos iniciales los aplica `python bootstrap.py`.
+    """
+    try:
+        with engine.connect() as conn:
+            version = conn.execute(select(func.max(EsquemaVersion.version))).scalar() or 0
+    except SQLAlchemyError:
+        version = 0
+    if version < ESQUEMA_VERSION:
+        raise RuntimeError(
+            f"El esquema de la base de datos está en la versión {version} y la API requiere la "
+            f"{ESQUEMA_VERSION}; ejecuta `python bootstrap.py`"
+        )
+
+# Verificar el esquema al iniciar la aplicación
 @app.on_event("startup")
 def startup():
-    init_db()
+    verificar_esquema()
+    
+    db = SessionLocal()
+    try:
+        cargar_estado_local(db)
+    except Exception as e:
+        # Sin índice, /buscar usa la consulta LIKE (y /sugerir no tiene datos)
+        print(f"Error al construir el índice de búsqueda: {str(e)}")
+    finally:
+        db.close()
+    sondeo_cambios.iniciar()
+    escritura_disponibilidad.iniciar()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Antes de cerrar los engines: escribe los cambios de disponibilidad pendientes
+    escritura_disponibilidad.detener()
+    sondeo_cambios.detener()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 # Endpoint raíz
 @app.get("/")
@@ -438,76 +520,811 @@ def read_root():
 
 # Endpoint para servir el buscador HTML
 @app.get("/buscador")
-async def get_buscador():
+async def get_buscador(request: Request):
     """
-    Sirve la página HTML del buscador
+    Sirve la página HTML del buscador (con ETag y Last-Modified; 304 si no cambió)
     """
-    if os.path.exists("buscador.html"):
-        return FileResponse("buscador.html")
-    else:
+    if not os.path.exists("buscador.html"):
         raise HTTPException(status_code=404, detail="Archivo buscador.html no encontrado")
+    
+    estado = os.stat("buscador.html")
+    etag = f'"{estado.st_mtime_ns:x}-{estado.st_size:x}"'
+    cabeceras = {
+        "ETag": etag,
+        "Last-Modified": formatdate(estado.st_mtime, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        no_modificado = etag_coincide(if_none_match, etag)
+    else:
+        # If-Modified-Since sólo se considera si no hay If-None-Match
+        try:
+            desde = parsedate_to_datetime(request.headers.get("if-modified-since", ""))
+            no_modificado = int(estado.st_mtime) <= desde.timestamp()
+        except (TypeError, ValueError):
+            no_modificado = False
+    
+    if no_modificado:
+        return Response(status_code=304, headers=cabeceras)
+    return FileResponse("buscador.html", headers=cabeceras)
+
+# ==================== ADMINISTRACIÓN ====================
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["admin"])
+def metricas():
+    """
+    Métricas por ruta en formato de texto de Prometheus: peticiones por código de estado,
+    histogramas de latencia (con p50/p95/p99 estimados), consultas SQL y tiempo en la base de datos.
+    Son de este proceso; con varios workers, cada uno expone las suyas.
+    """
+    return PlainTextResponse(metricas_http.exportar(), media_type="text/plain; version=0.0.4")
+
+# Registro de consultas lentas (CONSULTA_LENTA_MS negativo lo desactiva)
+registro_consultas_lentas = RegistroConsultasLentas(
+    umbral_ms=float(os.getenv("CONSULTA_LENTA_MS", "200")),
+    explain=os.getenv("CONSULTA_LENTA_EXPLAIN", "true").lower() in ("1", "true", "si", "yes"),
+    archivo=os.getenv("CONSULTA_LENTA_ARCHIVO", "logs/consultas_lentas.log") or None,
+    max_bytes=int(os.getenv("CONSULTA_LENTA_MAX_BYTES", str(5 * 1024 * 1024))),
+    respaldos=int(os.getenv("CONSULTA_LENTA_RESPALDOS", "5"))
+)
+observar_consultas(registro_consultas_lentas)
+
+@app.get("/admin/consultas-lentas", tags=["admin"])
+def consultas_lentas(limit: int = 50):
+    """
+    Últimas consultas que superaron el umbral (más recientes primero), con la ruta que las
+    emitió, sus parámetros y el plan de ejecución (`escaneo_completo` marca los full scans).
+    """
+    return {
+        "umbral_ms": registro_consultas_lentas.umbral_ms,
+        "explain": registro_consultas_lentas.explain,
+        "archivo": registro_consultas_lentas.archivo,
+        "total": registro_consultas_lentas.total,
+        "consultas": registro_consultas_lentas.ultimas(limit),
+    }
+
+@app.get("/admin/perfiles", tags=["admin"])
+def perfiles():
+    """
+    Perfiles guardados por el perfilado bajo demanda (PERFIL_HABILITADO), más recientes primero.
+    """
+    return {"habilitado": PERFIL_HABILITADO, "perfiles": listar_perfiles(PERFIL_DIRECTORIO)}
+
+@app.get("/admin/perfiles/{perfil_id}", tags=["admin"])
+def obtener_perfil(perfil_id: str, formato: str = "texto", orden: str = "cumulative", limit: int = 40):
+    """
+    Descarga un perfil: `texto` (resumen de pstats), `pstats` (para snakeviz o pstats)
+    o `collapsed` (para flamegraph.pl o speedscope).
+    """
+    extensiones = {"texto": ".pstats", "pstats": ".pstats", "collapsed": ".collapsed"}
+    if formato not in extensiones:
+        raise HTTPException(status_code=400, detail="Formato no soportado: use texto, pstats o collapsed")
+    ruta = os.path.join(PERFIL_DIRECTORIO, os.path.basename(perfil_id) + extensiones[formato])
+    if not os.path.isfile(ruta):
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    if formato == "texto":
+        return PlainTextResponse(resumen_pstats(ruta, orden, limit))
+    return FileResponse(ruta, filename=os.path.basename(ruta), media_type="application/octet-stream")
+
+@app.get("/admin/pool", tags=["admin"])
+def estado_pool():
+    """
+    Estado del pool de conexiones: conexiones en uso y libres, esperas y latencia de checkout.
+    """
+    estado = {
+        # Opciones con que se creó cada engine (None con SQLite, que no usa DB_POOL_*)
+        "configuracion": configuracion_pool(opciones_pool_sync),
+        "sync": estadisticas_pool.resumen(engine.pool),
+    }
+    if async_engine is not None:
+        # En modo async las peticiones usan este pool
+        estado["configuracion_async"] = configuracion_pool(opciones_pool_async)
+        estado["async"] = estadisticas_pool_async.resumen(async_engine.pool)
+    return estado
+
+# ==================== CACHÉ DEL CATÁLOGO ====================
+
+# Caché en memoria de categorías, productos/postres por id y listados por categoría
+CACHE_HABILITADO = os.getenv("CACHE_HABILITADO", "true").lower() in ("1", "true", "si", "yes")
+cache_catalogo = CacheCatalogo(
+    max_entradas=int(os.getenv("CACHE_MAX_ENTRADAS", "1024")),
+    ttl=float(os.getenv("CACHE_TTL", "60")),
+    habilitado=CACHE_HABILITADO
+)
+
+# Versión del catálogo aplicada en este proceso; de ella se derivan los ETag
+version_catalogo = VersionCatalogo()
+
+# Lecturas idénticas simultáneas (misma ruta y parámetros) que comparten una sola consulta
+COALESCENCIA_HABILITADA = os.getenv("COALESCENCIA_HABILITADA", "true").lower() in ("1", "true", "si", "yes")
+coalescencia_lecturas = CoalescenciaLecturas(lambda: version_catalogo.aplicada, COALESCENCIA_HABILITADA)
+
+async def validar_etag(request: Request, response: Response):
+    """
+    Dependencia de las lecturas del catálogo: responde 304 si el cliente ya tiene la
+    versión actual, antes de ejecutar la consulta o serializar nada.
+    
+    El ETag se lee antes de la consulta: si una escritura ocurre mientras tanto, la
+    respuesta lleva la versión anterior y el cliente la vuelve a pedir completa.
+    """
+    etag = version_catalogo.etag()
+    if etag is None:
+        # Hay cambios de otro proceso sin aplicar todavía: respuesta completa y sin ETag
+        return
+    cabeceras = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_coincide(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers=cabeceras)
+    response.headers.update(cabeceras)
+
+def aplicar_cambio(tipo: str, ids: Iterable[int] = (), categorias: Iterable[int] = ()):
+    """
+    Invalida la caché de un cambio: productos o postres (tipo) por id y los listados de sus
+    categorías, o las categorías indicadas (los productos y postres incluyen su categoría).
+    """
+    if tipo == "categoria":
+        cache_catalogo.invalidar("categorias", *[("categoria", id_) for id_ in ids])
+    else:
+        cache_catalogo.invalidar(*[(tipo, id_) for id_ in ids], *[(f"{tipo}s_categoria", c) for c in categorias])
+
+@app.get("/admin/cache", tags=["admin"])
+def estado_cache():
+    """
+    Aciertos, fallos, desalojos e invalidaciones de la caché del catálogo.
+    """
+    return cache_catalogo.estadisticas()
+
+@app.delete("/admin/cache", tags=["admin"])
+def limpiar_cache():
+    """
+    Vacía la caché del catálogo.
+    """
+    cache_catalogo.limpiar()
+    return {"message": "Caché vaciada"}
+
+@app.get("/admin/coalescencia", tags=["admin"])
+def estado_coalescencia():
+    """
+    Consultas ejecutadas y peticiones que se unieron a una consulta en curso, por ruta.
+    """
+    return coalescencia_lecturas.estadisticas()
+
+# ==================== COHERENCIA ENTRE PROCESOS ====================
+
+# Segundos entre sondeos de catalogo_cambios (0 desactiva el sondeo, p. ej. con un solo proceso)
+COHERENCIA_INTERVALO = float(os.getenv("COHERENCIA_INTERVALO", "1"))
+# Cambios que se conservan en catalogo_cambios; un proceso más atrasado recarga todo
+CAMBIOS_RETENIDOS = int(os.getenv("CAMBIOS_RETENIDOS", "10000"))
+
+def registrar_cambio(db: Session, tipo: str, ids: Iterable[int] = (), categorias: Iterable[Optional[int]] = (),
+                     accion: str = "actualizado", valores: Optional[dict] = None):
+    """
+    Registra un cambio del catálogo en la misma transacción de la escritura; se llama justo
+    antes del commit. El UPDATE de catalogo_version bloquea la fila hasta el commit, así que
+    la secuencia sigue el orden de los commits y no tiene huecos.
+    
+    `accion` es "creado", "actualizado" o "borrado". Las filas afectadas quedan marcadas con
+    la versión del cambio (version_cambio) o, si se borraron, se anotan en catalogo_borrados;
+    de ahí lee /sync. Los vínculos que cambió sincronizar_relaciones en la transacción se
+    guardan con el cambio para /eventos. Con `valores` (columna -> valor o expresión), el
+    mismo UPDATE que marca las filas también las modifica.
+    
+    Este proceso aplica el cambio al confirmar la transacción (_aplicar_cambios_confirmados);
+    los demás lo leen con sondear_cambios.
+    """
+    db.execute(update(CatalogoVersion).where(CatalogoVersion.id == 1).values(version=CatalogoVersion.version + 1))
+    version = db.execute(select(CatalogoVersion.version).where(CatalogoVersion.id == 1)).scalar_one()
+    ids = sorted(set(ids))
+    categorias = sorted({c for c in categorias if c is not None})
+    vinculos = db.info.pop("vinculos_catalogo", None)
+    if ids and accion == "borrado":
+        db.execute(delete(CatalogoBorrado).where(CatalogoBorrado.tipo == tipo, CatalogoBorrado.id.in_(ids)))
+        db.execute(insert(CatalogoBorrado), [{"tipo": tipo, "id": id_, "version": version} for id_ in ids])
+    elif ids:
+        modelo = MODELOS_CATALOGO[tipo]
+        db.execute(
+            update(modelo).where(modelo.id.in_(ids))
+            .values(version_cambio=version, actualizado_en=func.now(), **(valores or {}))
+            .execution_options(synchronize_session=False)
+        )
+    db.execute(insert(CambioCatalogo).values(
+        version=version, tipo=tipo, ids=json.dumps(ids), categorias=json.dumps(categorias), accion=accion,
+        vinculos=json.dumps(vinculos) if vinculos else None
+    ))
+    db.info.setdefault("cambios_catalogo", []).append({
+        "version": version, "tipo": tipo, "accion": accion, "ids": ids, "categorias": categorias, "vinculos": vinculos
+    })
+
+def _cambio_desde_fila(fila: CambioCatalogo) -> dict:
+    return {
+        "version": fila.version,
+        "tipo": fila.tipo,
+        "accion": fila.accion or "actualizado",
+        "ids": json.loads(fila.ids or "[]"),
+        "categorias": json.loads(fila.categorias or "[]"),
+        "vinculos": json.loads(fila.vinculos) if fila.vinculos else None,
+    }
+
+# Serializa avanzar la versión y publicar su evento, para que /eventos reciba los cambios
+# en el orden de la secuencia aunque se apliquen desde hilos distintos
+_lock_publicacion = threading.Lock()
+# Cambios propios confirmados antes que el anterior de la secuencia (version -> cambio):
+# los hooks after_commit de hilos distintos no corren en el orden de los commits
+_cambios_adelantados: Dict[int, dict] = {}
+
+def avanzar_version(cambio: dict) -> bool:
+    """
+    Marca el cambio como aplicado en este proceso y lo publica en /eventos.
+    Si no es el siguiente de la secuencia queda en espera y se avanza con él (y con los que
+    le sigan) al aplicarse el que falta; si el que falta es de otro proceso, lo trae el sondeo.
+    Devuelve False si el cambio quedó en espera o ya estaba aplicado.
+    """
+    with _lock_publicacion:
+        if cambio["version"] <= version_catalogo.aplicada:
+            return False
+        if not version_catalogo.avanzar(cambio["version"]):
+            _cambios_adelantados[cambio["version"]] = cambio
+            return False
+        eventos = [(cambio["version"], texto_eventos(cambio, version_catalogo.epoca))]
+        while True:
+            siguiente = _cambios_adelantados.pop(version_catalogo.aplicada + 1, None)
+            if siguiente is None or not version_catalogo.avanzar(siguiente["version"]):
+                break
+            eventos.append((siguiente["version"], texto_eventos(siguiente, version_catalogo.epoca)))
+        # Los que quedaron atrás (p. ej. tras recargar el estado local) ya no hacen falta
+        for version in [v for v in _cambios_adelantados if v <= version_catalogo.aplicada]:
+            del _cambios_adelantados[version]
+        canal_eventos.publicar(eventos)
+        return True
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_cambios_confirmados(sesion):
+    # Primero el índice y después la versión, en el mismo orden que sondear_cambios
+    for clave, textos in sesion.info.pop("indice_catalogo", ()):
+        if textos is None:
+            desindexar(clave)
+        else:
+            indexar(clave, textos)
+    for cambio in sesion.info.pop("cambios_catalogo", ()):
+        aplicar_cambio(cambio["tipo"], cambio["ids"], cambio["categorias"])
+        avanzar_version(cambio)
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_cambios(sesion):
+    sesion.info.pop("cambios_catalogo", None)
+    sesion.info.pop("vinculos_catalogo", None)
+    sesion.info.pop("indice_catalogo", None)
+
+def documentos_de_categorias(db: Session, categorias: Dict[int, Categoria]) -> list:
+    """
+    Documentos de búsqueda de los productos y postres de `categorias` (id -> Categoria), que
+    incluyen el texto de su categoría y hay que reindexar cuando ésta cambia. Se usan los
+    objetos recibidos, así que sirve también antes del commit.
+    """
+    if BUSQUEDA_MODO != "indice" or not categorias:
+        # Las sugerencias sólo usan el nombre del producto o postre, que no cambió
+        return []
+    documentos = []
+    for tipo, modelo in (("producto", Producto), ("postre", Postre)):
+        filas = db.query(modelo.id, modelo.nombre, modelo.descripcion, modelo.categoria_id).filter(
+            modelo.categoria_id.in_(list(categorias))
+        )
+        for id_, nombre, descripcion, categoria_id in filas:
+            documentos.append(((tipo, id_), _textos_busqueda(nombre, descripcion, categorias[categoria_id])))
+    return documentos
+
+def reindexar(db: Session, tipo: str, ids: List[int]):
+    """
+    Actualiza en los índices los productos, postres o categorías indicados (quita los borrados).
+    """
+    if tipo == "categoria":
+        categorias = {c.id: c for c in db.query(Categoria).filter(Categoria.id.in_(ids))}
+        for id_, categoria in categorias.items():
+            indexar(("categoria", id_), [categoria.nombre])
+        for clave, textos in documentos_de_categorias(db, categorias):
+            indexar(clave, textos)
+        return
+    modelo = Producto if tipo == "producto" else Postre
+    filas = db.query(
+        modelo.id, modelo.nombre, modelo.descripcion, Categoria.nombre, Categoria.descripcion
+    ).outerjoin(Categoria, modelo.categoria_id == Categoria.id).filter(modelo.id.in_(ids)).all()
+    for fila in filas:
+        indexar((tipo, fila[0]), fila[1:])
+    for id_ in set(ids) - {fila[0] for fila in filas}:
+        desindexar((tipo, id_))
+
+def cargar_estado_local(db: Session):
+    """
+    Toma la versión actual del catálogo y recarga la caché y el índice desde cero.
+    La versión se lee primero: un cambio posterior se vuelve a aplicar en el siguiente sondeo.
+    """
+    fila = db.execute(select(CatalogoVersion.epoca, CatalogoVersion.version).where(CatalogoVersion.id == 1)).first()
+    if fila is not None:
+        version_catalogo.iniciar(fila.epoca, fila.version)
+    cache_catalogo.limpiar()
+    reconstruir_indice_busqueda(db)
+
+def sondear_cambios() -> int:
+    """
+    Aplica en este proceso los cambios de otros procesos y devuelve cuántos aplicó.
+    Sin cambios nuevos es una sola consulta por clave primaria a catalogo_version.
+    """
+    with SessionLocal() as db:
+        fila = db.execute(select(CatalogoVersion.epoca, CatalogoVersion.version).where(CatalogoVersion.id == 1)).first()
+        aplicada = version_catalogo.aplicada
+        if fila is None or (fila.epoca == version_catalogo.epoca and fila.version <= aplicada):
+            return 0
+        version_catalogo.anunciar(fila.version)
+        
+        cambios = db.execute(
+            select(CambioCatalogo)
+            .where(CambioCatalogo.version > aplicada, CambioCatalogo.version <= fila.version)
+            .order_by(CambioCatalogo.version)
+        ).scalars().all()
+        if fila.epoca != version_catalogo.epoca or not cambios or cambios[0].version != aplicada + 1:
+            # Base de datos recreada o cambios intermedios ya podados
+            cargar_estado_local(db)
+            canal_eventos.publicar([(None, formatear_evento("reinicio", {"version": fila.version}))])
+            return fila.version - aplicada
+        
+        for fila_cambio in cambios:
+            # Los cambios propios ya se aplicaron al hacer commit
+            if fila_cambio.version <= version_catalogo.aplicada:
+                continue
+            cambio = _cambio_desde_fila(fila_cambio)
+            aplicar_cambio(cambio["tipo"], cambio["ids"], cambio["categorias"])
+            if cambio["ids"]:
+                reindexar(db, cambio["tipo"], cambio["ids"])
+            avanzar_version(cambio)
+        
+        # Podar el registro cada mil cambios (todos los procesos lo hacen; es idempotente)
+        if fila.version // 1000 != aplicada // 1000:
+            db.execute(delete(CambioCatalogo).where(CambioCatalogo.version <= fila.version - CAMBIOS_RETENIDOS))
+            db.commit()
+        return len(cambios)
+
+sondeo_cambios = SondeoCambios(sondear_cambios, COHERENCIA_INTERVALO)
+
+@app.get("/admin/coherencia", tags=["admin"])
+def estado_coherencia():
+    """
+    Versión del catálogo aplicada por este proceso y estado del sondeo de cambios.
+    """
+    return {
+        "pid": os.getpid(),
+        "epoca": version_catalogo.epoca,
+        "version_aplicada": version_catalogo.aplicada,
+        "version_conocida": version_catalogo.conocida,
+        **sondeo_cambios.estadisticas(),
+    }
+
+# ==================== SERIALIZACIÓN RÁPIDA DE LISTAS ====================
+
+# Modelo y columnas de ProductoResponse / PostreResponse, en el orden de sus campos.
+# Los esquemas siguen siendo el contrato; las listas se arman desde tuplas de columnas.
+COLUMNAS_RESPUESTA = {
+    "producto": (Producto, [c for c in ProductoResponse.model_fields if c != "categoria_rel"]),
+    "postre": (Postre, [c for c in PostreResponse.model_fields if c != "categoria_rel"]),
+}
+COLUMNAS_CATEGORIA = list(CategoriaResponse.model_fields)
+
+def normalizar_fields(fields: Optional[str]) -> Optional[str]:
+    """
+    Forma canónica de `fields` ("precio, id,nombre" -> "id,nombre,precio"), para claves de caché.
+    """
+    if not fields:
+        return None
+    return ",".join(sorted({campo.strip() for campo in fields.split(",") if campo.strip()})) or None
+
+def proyeccion(tipo: str, fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Campos pedidos con `fields` ("id,nombre,precio") en el orden del esquema de respuesta;
+    el id siempre se incluye. Sin `fields` devuelve None (respuesta completa).
+    """
+    fields = normalizar_fields(fields)
+    if fields is None:
+        return None
+    pedidos = set(fields.split(","))
+    validos = COLUMNAS_RESPUESTA[tipo][1] + ["categoria_rel"]
+    desconocidos = sorted(pedidos - set(validos))
+    if desconocidos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos no soportados: {', '.join(desconocidos)}; use {', '.join(validos)}"
+        )
+    return [campo for campo in validos if campo == "id" or campo in pedidos]
+
+def consulta_respuesta(tipo: str, campos: Optional[List[str]] = None):
+    """
+    select() con las columnas del esquema de respuesta y las de la categoría (LEFT JOIN),
+    sin cargar objetos ORM. Con `campos` (ver proyeccion) sólo se leen esas columnas, y la
+    categoría y su JOIN sólo si se pidió categoria_rel.
+    """
+    modelo, todos = COLUMNAS_RESPUESTA[tipo]
+    if campos is None:
+        campos = todos + ["categoria_rel"]
+    columnas = [getattr(modelo, c) for c in campos if c != "categoria_rel"]
+    if "categoria_rel" not in campos:
+        return select(*columnas)
+    return select(
+        *columnas, *[getattr(Categoria, c) for c in COLUMNAS_CATEGORIA]
+    ).outerjoin(Categoria, modelo.categoria_id == Categoria.id)
+
+def filas_a_respuesta(tipo: str, filas, campos: Optional[List[str]] = None) -> List[dict]:
+    """
+    Convierte las filas de consulta_respuesta en dicts con la forma de ProductoResponse / PostreResponse
+    (sólo con `campos`, si se indicaron).
+    """
+    if campos is None:
+        campos = COLUMNAS_RESPUESTA[tipo][1] + ["categoria_rel"]
+    propios = [c for c in campos if c != "categoria_rel"]
+    con_categoria = len(propios) < len(campos)
+    n = len(propios)
+    resultado = []
+    for fila in filas:
+        item = dict(zip(propios, fila[:n]))
+        if con_categoria:
+            categoria = fila[n:]
+            item["categoria_rel"] = dict(zip(COLUMNAS_CATEGORIA, categoria)) if categoria[-1] is not None else None
+        resultado.append(item)
+    return resultado
+
+# ==================== PAGINACIÓN POR CURSOR ====================
+
+def codificar_cursor(ultimo_id: int) -> str:
+    """
+    Cursor opaco con el último id entregado.
+    """
+    contenido = json.dumps({"id": ultimo_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(contenido).decode().rstrip("=")
+
+def decodificar_cursor(cursor: str) -> int:
+    """
+    Devuelve el último id de un cursor; un cursor vacío es la primera página.
+    """
+    if not cursor:
+        return 0
+    try:
+        contenido = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return int(json.loads(contenido)["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def paginar_por_cursor(db: Session, tipo: str, consulta, cursor: str, limit: int, campos: Optional[List[str]] = None):
+    """
+    Paginación keyset por id: WHERE id > último ORDER BY id LIMIT n, sin OFFSET.
+    Se pide una fila de más para saber si hay otra página.
+    """
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit debe ser mayor que 0 con paginación por cursor")
+    modelo = COLUMNAS_RESPUESTA[tipo][0]
+    ultimo_id = decodificar_cursor(cursor)
+    filas = db.execute(consulta.where(modelo.id > ultimo_id).order_by(modelo.id).limit(limit + 1)).all()
+    
+    next_cursor = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        next_cursor = codificar_cursor(filas[-1][0])
+    return {"items": filas_a_respuesta(tipo, filas, campos), "next_cursor": next_cursor}
+
+# ==================== OPERACIONES EN LOTE ====================
+
+# Filas por sentencia INSERT multi-fila
+TAMANO_LOTE_INSERT = 500
+
+# Para cada tipo: (campo de ids relacionados, modelo relacionado, columna propia y columna relacionada en productos_postres)
+RELACIONES = {
+    "producto": ("postres_ids", Postre, "producto_id", "postre_id"),
+    "postre": ("productos_ids", Producto, "postre_id", "producto_id"),
+}
+
+def insertar_en_bloque(db: Session, modelo, filas: List[dict]) -> List[int]:
+    """
+    Inserta las filas con INSERTs multi-fila y devuelve los ids generados, en el mismo orden.
+    """
+    ids = []
+    con_returning = db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order
+    for inicio in range(0, len(filas), TAMANO_LOTE_INSERT):
+        bloque = filas[inicio:inicio + TAMANO_LOTE_INSERT]
+        if con_returning:
+            ids += db.scalars(insert(modelo).returning(modelo.id, sort_by_parameter_order=True), bloque).all()
+        else:
+            # MySQL no tiene RETURNING: en un INSERT simple multi-fila los ids auto-incrementales
+            # son consecutivos a partir de LAST_INSERT_ID() (con paso auto_increment_increment)
+            db.execute(insert(modelo.__table__).values(bloque))
+            primero, paso = db.execute(text("SELECT LAST_INSERT_ID(), @@auto_increment_increment")).one()
+            ids += [primero + k * paso for k in range(len(bloque))]
+    return ids
+
+def categorias_por_id(db: Session, ids: Set[int]) -> Dict[int, Categoria]:
+    """
+    Carga en una sola consulta las categorías con los ids indicados.
+    """
+    if not ids:
+        return {}
+    return {c.id: c for c in db.query(Categoria).filter(Categoria.id.in_(ids)).all()}
+
+def ids_existentes(db: Session, modelo, ids: Set[int]) -> Set[int]:
+    """
+    Devuelve cuáles de los ids existen en la tabla del modelo (una sola consulta IN).
+    """
+    if not ids:
+        return set()
+    return {fila[0] for fila in db.query(modelo.id).filter(modelo.id.in_(ids)).all()}
+
+def relacionados_faltantes(db: Session, tipo: str, ids: List[int]) -> Optional[str]:
+    """
+    Valida con una consulta IN los ids relacionados; devuelve el mensaje de error si falta alguno.
+    """
+    modelo_rel = RELACIONES[tipo][1]
+    faltantes = sorted(set(ids) - ids_existentes(db, modelo_rel, set(ids)))
+    if faltantes:
+        return f"{modelo_rel.__tablename__.capitalize()} no encontrados: {faltantes}"
+    return None
+
+def sincronizar_relaciones(db: Session, tipo: str, nuevas: Dict[int, Set[int]], creados: bool = False):
+    """
+    Aplica en productos_postres sólo la diferencia entre los vínculos actuales y los pedidos:
+    un INSERT (executemany) con los pares nuevos y un DELETE con los pares que sobran.
+    Con `creados` los elementos son nuevos y no se consultan sus vínculos actuales.
+    """
+    if not nuevas:
+        return
+    columna_propia, columna_rel = RELACIONES[tipo][2:]
+    col_propia = productos_postres.c[columna_propia]
+    col_rel = productos_postres.c[columna_rel]
+    
+    actuales = set()
+    if not creados:
+        # Como tuplas: los pares se guardan en JSON con el cambio
+        actuales = set(map(tuple, db.execute(select(col_propia, col_rel).where(col_propia.in_(list(nuevas)))).all()))
+    pedidos = {(propio, rel) for propio, rels in nuevas.items() for rel in rels}
+    
+    quitar = actuales - pedidos
+    if quitar:
+        db.execute(delete(productos_postres).where(tuple_(col_propia, col_rel).in_(sorted(quitar))))
+    agregar = pedidos - actuales
+    if agregar:
+        db.execute(productos_postres.insert(), [{columna_propia: a, columna_rel: b} for a, b in sorted(agregar)])
+    
+    # Los vínculos cambiados van con el siguiente registrar_cambio, como pares (producto_id, postre_id)
+    vinculos = db.info.setdefault("vinculos_catalogo", {"creado": [], "borrado": []})
+    for accion, pares in (("creado", agregar), ("borrado", quitar)):
+        vinculos[accion] += sorted(par if tipo == "producto" else par[::-1] for par in pares)
+
+def _respuesta_lote(resultados: List[ResultadoLote]) -> RespuestaLote:
+    errores = sum(1 for r in resultados if r.error)
+    return RespuestaLote(procesados=len(resultados) - errores, errores=errores, resultados=resultados)
+
+def _ajustar_precio_total(datos: dict):
+    # Misma regla que crear_postre: precio_total = rebanadas * precio_rebanada
+    datos['precio_total'] = datos['rebanadas'] * datos['precio_rebanada']
+
+def crear_en_lote(db: Session, tipo: str, modelo, items: list) -> RespuestaLote:
+    """
+    Crea productos o postres en una sola transacción: categorías y relaciones se validan con
+    una consulta IN cada una y las filas se insertan con INSERTs multi-fila.
+    """
+    campo_ids, modelo_rel = RELACIONES[tipo][:2]
+    categorias = categorias_por_id(db, {item.categoria_id for item in items})
+    relacionados = ids_existentes(db, modelo_rel, {i for item in items for i in (getattr(item, campo_ids) or [])})
+    
+    resultados: List[Optional[ResultadoLote]] = [None] * len(items)
+    filas, indices, ids_rel, textos = [], [], [], []
+    for indice, item in enumerate(items):
+        categoria = categorias.get(item.categoria_id)
+        if categoria is None:
+            resultados[indice] = ResultadoLote(indice=indice, error="Categoría no encontrada")
+            continue
+        
+        datos = item.model_dump()
+        pedidos = set(datos.pop(campo_ids, None) or [])
+        faltantes = sorted(pedidos - relacionados)
+        if faltantes:
+            mensaje = f"{modelo_rel.__tablename__.capitalize()} no encontrados: {faltantes}"
+            resultados[indice] = ResultadoLote(indice=indice, error=mensaje)
+            continue
+        if tipo == "postre":
+            _ajustar_precio_total(datos)
+        
+        filas.append(datos)
+        indices.append(indice)
+        ids_rel.append(pedidos)
+        textos.append(_textos_busqueda(datos['nombre'], datos['descripcion'], categoria))
+    
+    ids = insertar_en_bloque(db, modelo, filas) if filas else []
+    sincronizar_relaciones(db, tipo, {id_: rel for id_, rel in zip(ids, ids_rel) if rel}, creados=True)
+    if ids:
+        registrar_cambio(db, tipo, ids, {fila['categoria_id'] for fila in filas}, accion="creado")
+        indexar_al_confirmar(db, (((tipo, id_), textos_item) for id_, textos_item in zip(ids, textos)))
+    db.commit()
+    
+    for indice, id_ in zip(indices, ids):
+        resultados[indice] = ResultadoLote(indice=indice, id=id_)
+    return _respuesta_lote(resultados)
+
+def actualizar_en_lote(db: Session, tipo: str, modelo, items: list) -> RespuestaLote:
+    """
+    Actualiza productos o postres en una sola transacción. Las filas se cargan con una consulta
+    IN y el flush agrupa los UPDATE con las mismas columnas en un executemany.
+    """
+    campo_ids, modelo_rel = RELACIONES[tipo][:2]
+    existentes = {obj.id: obj for obj in db.query(modelo).filter(modelo.id.in_({item.id for item in items})).all()}
+    categorias = categorias_por_id(
+        db,
+        {item.categoria_id for item in items if item.categoria_id is not None}
+        | {obj.categoria_id for obj in existentes.values()}
+    )
+    relacionados = ids_existentes(db, modelo_rel, {i for item in items for i in (getattr(item, campo_ids) or [])})
+    
+    resultados = []
+    vistos = set()
+    nuevas_relaciones = {}
+    textos = {}
+    categorias_afectadas = set()
+    for indice, item in enumerate(items):
+        update_data = item.model_dump(exclude_unset=True)
+        update_data.pop('id', None)
+        pedidos = update_data.pop(campo_ids, None)
+        db_obj = existentes.get(item.id)
+        
+        if db_obj is None:
+            resultados.append(ResultadoLote(indice=indice, id=item.id, error=f"{tipo.capitalize()} no encontrado"))
+            continue
+        if item.id in vistos:
+            resultados.append(ResultadoLote(indice=indice, id=item.id, error="Id repetido en el lote"))
+            continue
+        if 'categoria_id' in update_data and update_data['categoria_id'] not in categorias:
+            resultados.append(ResultadoLote(indice=indice, id=item.id, error="Categoría no encontrada"))
+            continue
+        faltantes = sorted(set(pedidos or []) - relacionados)
+        if faltantes:
+            mensaje = f"{modelo_rel.__tablename__.capitalize()} no encontrados: {faltantes}"
+            resultados.append(ResultadoLote(indice=indice, id=item.id, error=mensaje))
+            continue
+        vistos.add(item.id)
+        
+        # Misma regla que actualizar_postre para recalcular precio_total
+        if tipo == "postre" and ('rebanadas' in update_data or 'precio_rebanada' in update_data):
+            rebanadas = update_data.get('rebanadas', db_obj.rebanadas)
+            precio_rebanada = update_data.get('precio_rebanada', db_obj.precio_rebanada)
+            update_data['precio_total'] = rebanadas * precio_rebanada
+        
+        categorias_afectadas.add(db_obj.categoria_id)
+        for key, value in update_data.items():
+            setattr(db_obj, key, value)
+        categorias_afectadas.add(db_obj.categoria_id)
+        if pedidos is not None:
+            nuevas_relaciones[item.id] = set(pedidos)
+        
+        textos[item.id] = _textos_busqueda(db_obj.nombre, db_obj.descripcion, categorias.get(db_obj.categoria_id))
+        resultados.append(ResultadoLote(indice=indice, id=item.id))
+    
+    # Aplicar sólo los cambios de vínculos de los elementos que especificaron relaciones
+    sincronizar_relaciones(db, tipo, nuevas_relaciones)
+    if textos:
+        registrar_cambio(db, tipo, textos, categorias_afectadas)
+        indexar_al_confirmar(db, (((tipo, id_), textos_item) for id_, textos_item in textos.items()))
+    db.commit()
+    return _respuesta_lote(resultados)
 
 # ==================== ENDPOINTS PARA CATEGORÍAS ====================
 
-@app.get("/categorias/", response_model=List[CategoriaResponse], tags=["categorias"])
-def listar_categorias(db: Session = Depends(get_db)):
+@app.get("/categorias/", response_model=List[CategoriaResponse], tags=["categorias"], dependencies=[Depends(validar_etag)])
+@cacheado(cache_catalogo, lambda **_: "categorias")
+@con_bd
+def listar_categorias(db: Session = Depends(get_sesion)):
     """
     Obtiene todas las categorías disponibles.
     """
     categorias = db.query(Categoria).all()
-    return categorias
+    return [CategoriaResponse.model_validate(c) for c in categorias]
 
 @app.post("/categorias/", response_model=CategoriaResponse, tags=["categorias"])
-def crear_categoria(categoria: CategoriaCreate, db: Session = Depends(get_db)):
+@con_bd
+def crear_categoria(categoria: CategoriaCreate, db: Session = Depends(get_sesion)):
     """
     Crea una nueva categoría.
     """
-    db_categoria = Categoria(**categoria.dict())
+    db_categoria = Categoria(**categoria.model_dump())
     db.add(db_categoria)
+    db.flush()
+    registrar_cambio(db, "categoria", [db_categoria.id], accion="creado")
+    indexar_al_confirmar(db, [(("categoria", db_categoria.id), [db_categoria.nombre])])
     db.commit()
     db.refresh(db_categoria)
-    return db_categoria
+    return CategoriaResponse.model_validate(db_categoria)
 
 # ==================== ENDPOINTS PARA PRODUCTOS ====================
 
-@app.get("/productos/", response_model=List[ProductoResponse], tags=["productos"])
-def listar_productos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@app.get("/productos/", response_model=Union[List[ProductoResponse], PaginaProductos], tags=["productos"], dependencies=[Depends(validar_etag)])
+@respuesta_rapida
+@con_bd
+def listar_productos(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    categoria_id: Optional[int] = None,
+    disponible: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_sesion)
+):
     """
     Obtiene todos los productos disponibles en la cafetería.
+    
+    Con `cursor` (vacío para la primera página) se usa paginación por cursor ordenada
+    por id y la respuesta es `{"items": [...], "next_cursor": ...}`; sin él se usa skip/limit.
+    Con `fields` (p. ej. `id,nombre,precio`) cada elemento trae sólo esos campos.
     """
-    productos = db.query(Producto).offset(skip).limit(limit).all()
-    return productos
+    campos = proyeccion("producto", fields)
+    consulta = consulta_respuesta("producto", campos)
+    if categoria_id is not None:
+        consulta = consulta.where(Producto.categoria_id == categoria_id)
+    if disponible is not None:
+        consulta = consulta.where(Producto.disponible == disponible)
+    
+    if cursor is not None:
+        return paginar_por_cursor(db, "producto", consulta, cursor, limit, campos)
+    
+    return filas_a_respuesta("producto", db.execute(consulta.offset(skip).limit(limit)).all(), campos)
 
-@app.get("/productos/{producto_id}", response_model=ProductoResponse, tags=["productos"])
-def obtener_producto(producto_id: int, db: Session = Depends(get_db)):
+@app.get("/productos/{producto_id}", response_model=ProductoResponse, tags=["productos"], dependencies=[Depends(validar_etag)])
+@cacheado(
+    cache_catalogo,
+    lambda producto_id, **_: ("producto", producto_id),
+    lambda resultado, **_: [("categoria", resultado.categoria_id)]
+)
+@con_bd
+def obtener_producto(producto_id: int, db: Session = Depends(get_sesion)):
     """
     Obtiene un producto específico por su ID.
     """
-    producto = db.query(Producto).filter(Producto.id == producto_id).first()
+    producto = db.query(Producto).options(joinedload(Producto.categoria_rel)).filter(Producto.id == producto_id).first()
     if producto is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    return producto
+    return ProductoResponse.model_validate(producto)
 
-@app.get("/productos/categoria/{categoria_id}", response_model=List[ProductoResponse], tags=["productos"])
-def obtener_productos_por_categoria(categoria_id: int, db: Session = Depends(get_db)):
+@app.get("/productos/categoria/{categoria_id}", response_model=List[ProductoResponse], tags=["productos"], dependencies=[Depends(validar_etag)])
+@respuesta_rapida
+@cacheado(
+    cache_catalogo,
+    lambda categoria_id, fields, **_: ("productos_categoria", categoria_id, normalizar_fields(fields)),
+    lambda categoria_id, **_: [("categoria", categoria_id), ("productos_categoria", categoria_id)]
+)
+@coalescido(
+    coalescencia_lecturas, "/productos/categoria",
+    lambda categoria_id, fields, **_: (categoria_id, normalizar_fields(fields))
+)
+@con_bd
+def obtener_productos_por_categoria(categoria_id: int, fields: Optional[str] = None, db: Session = Depends(get_sesion)):
     """
-    Obtiene todos los productos de una categoría específica.
+    Obtiene todos los productos de una categoría específica (sólo los campos de `fields`, si se indica).
     """
-    productos = db.query(Producto).filter(Producto.categoria_id == categoria_id).all()
-    return productos
+    campos = proyeccion("producto", fields)
+    consulta = consulta_respuesta("producto", campos).where(Producto.categoria_id == categoria_id)
+    return filas_a_respuesta("producto", db.execute(consulta).all(), campos)
 
-@app.get("/productos/{producto_id}/postres", response_model=List[PostreResponse], tags=["productos"])
-def obtener_postres_relacionados(producto_id: int, db: Session = Depends(get_db)):
+@app.get("/productos/{producto_id}/postres", response_model=List[PostreResponse], tags=["productos"], dependencies=[Depends(validar_etag)])
+@respuesta_rapida
+@con_bd
+def obtener_postres_relacionados(producto_id: int, fields: Optional[str] = None, db: Session = Depends(get_sesion)):
     """
-    Obtiene todos los postres relacionados con un producto.
+    Obtiene todos los postres relacionados con un producto (sólo los campos de `fields`, si se indica).
     """
-    producto = db.query(Producto).filter(Producto.id == producto_id).first()
-    if producto is None:
+    campos = proyeccion("postre", fields)
+    if db.query(Producto.id).filter(Producto.id == producto_id).first() is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    return producto.postres_relacionados
+    
+    # Una sola consulta con la tabla intermedia y la categoría de cada postre
+    consulta = consulta_respuesta("postre", campos).join(
+        productos_postres, productos_postres.c.postre_id == Postre.id
+    ).where(productos_postres.c.producto_id == producto_id)
+    return filas_a_respuesta("postre", db.execute(consulta).all(), campos)
 
 @app.post("/productos/", response_model=ProductoResponse, tags=["productos"])
-def crear_producto(producto: ProductoCreate, db: Session = Depends(get_db)):
+@con_bd
+def crear_producto(producto: ProductoCreate, db: Session = Depends(get_sesion)):
     """
     Crea un nuevo producto en la base de datos.
     """
@@ -517,26 +1334,47 @@ def crear_producto(producto: ProductoCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
     
     # Crear el producto sin las relaciones
-    producto_data = producto.dict()
-    postres_ids = producto_data.pop('postres_ids', [])
+    producto_data = producto.model_dump()
+    postres_ids = producto_data.pop('postres_ids', None) or []
+    
+    # Verificar con una sola consulta que los postres existen
+    error = relacionados_faltantes(db, "producto", postres_ids)
+    if error:
+        raise HTTPException(status_code=404, detail=error)
     
     db_producto = Producto(**producto_data)
     db.add(db_producto)
-    db.commit()
+    db.flush()
     
     # Agregar relaciones con postres si se especificaron
     if postres_ids:
-        for postre_id in postres_ids:
-            postre = db.query(Postre).filter(Postre.id == postre_id).first()
-            if postre:
-                db_producto.postres_relacionados.append(postre)
-        db.commit()
+        sincronizar_relaciones(db, "producto", {db_producto.id: set(postres_ids)}, creados=True)
+    registrar_cambio(db, "producto", [db_producto.id], [producto.categoria_id], accion="creado")
+    indexar_al_confirmar(db, [documento_producto(db_producto)])
+    db.commit()
     
     db.refresh(db_producto)
-    return db_producto
+    return ProductoResponse.model_validate(db_producto)
+
+@app.post("/productos/bulk", response_model=RespuestaLote, tags=["productos"])
+@con_bd
+def crear_productos_en_lote(productos: List[ProductoCreate], db: Session = Depends(get_sesion)):
+    """
+    Crea varios productos en una sola transacción y devuelve el resultado de cada uno.
+    """
+    return crear_en_lote(db, "producto", Producto, productos)
+
+@app.put("/productos/bulk", response_model=RespuestaLote, tags=["productos"])
+@con_bd
+def actualizar_productos_en_lote(productos: List[ProductoLoteUpdate], db: Session = Depends(get_sesion)):
+    """
+    Actualiza varios productos (cada elemento lleva su id) en una sola transacción.
+    """
+    return actualizar_en_lote(db, "producto", Producto, productos)
 
 @app.put("/productos/{producto_id}", response_model=ProductoResponse, tags=["productos"])
-def actualizar_producto(producto_id: int, producto: ProductoUpdate, db: Session = Depends(get_db)):
+@con_bd
+def actualizar_producto(producto_id: int, producto: ProductoUpdate, db: Session = Depends(get_sesion)):
     """
     Actualiza un producto existente.
     """
@@ -544,7 +1382,7 @@ def actualizar_producto(producto_id: int, producto: ProductoUpdate, db: Session
     if db_producto is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
-    update_data = producto.dict(exclude_unset=True)
+    update_data = producto.model_dump(exclude_unset=True)
     postres_ids = update_data.pop('postres_ids', None)
     
     # Verificar categoría si se está actualizando
@@ -553,23 +1391,32 @@ def actualizar_producto(producto_id: int, producto: ProductoUpdate, db: Session
         if not categoria:
             raise HTTPException(status_code=404, detail="Categoría no encontrada")
     
+    if postres_ids:
+        error = relacionados_faltantes(db, "producto", postres_ids)
+        if error:
+            raise HTTPException(status_code=404, detail=error)
+    
+    categoria_anterior = db_producto.categoria_id
     for key, value in update_data.items():
         setattr(db_producto, key, value)
     
-    # Actualizar relaciones con postres si se especificaron
+    # Actualizar relaciones con postres si se especificaron (sólo los vínculos que cambian)
     if postres_ids is not None:
-        db_producto.postres_relacionados.clear()
-        for postre_id in postres_ids:
-            postre = db.query(Postre).filter(Postre.id == postre_id).first()
-            if postre:
-                db_producto.postres_relacionados.append(postre)
+        sincronizar_relaciones(db, "producto", {producto_id: set(postres_ids)})
     
+    categoria_nueva = db_producto.categoria_id
+    registrar_cambio(db, "producto", [producto_id], [categoria_anterior, categoria_nueva])
+    # Con la categoría nueva ya escrita, categoria_rel se vuelve a cargar al indexar
+    db.flush()
+    db.expire(db_producto, ["categoria_rel"])
+    indexar_al_confirmar(db, [documento_producto(db_producto)])
     db.commit()
     db.refresh(db_producto)
-    return db_producto
+    return ProductoResponse.model_validate(db_producto)
 
 @app.delete("/productos/{producto_id}", tags=["productos"])
-def eliminar_producto(producto_id: int, db: Session = Depends(get_db)):
+@con_bd
+def eliminar_producto(producto_id: int, db: Session = Depends(get_sesion)):
     """
     Elimina un producto de la base de datos.
     """
@@ -577,50 +1424,104 @@ def eliminar_producto(producto_id: int, db: Session = Depends(get_db)):
     if db_producto is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
+    categoria_id = db_producto.categoria_id
+    # Quitar los vínculos aquí (y no por la cascada del borrado) para publicarlos como relacion.borrado
+    sincronizar_relaciones(db, "producto", {producto_id: set()})
     db.delete(db_producto)
+    registrar_cambio(db, "producto", [producto_id], [categoria_id], accion="borrado")
+    indexar_al_confirmar(db, [(("producto", producto_id), None)])
     db.commit()
     return {"message": f"Producto {db_producto.nombre} eliminado correctamente"}
 
 # ==================== ENDPOINTS PARA POSTRES ====================
 
-@app.get("/postres/", response_model=List[PostreResponse], tags=["postres"])
-def listar_postres(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@app.get("/postres/", response_model=Union[List[PostreResponse], PaginaPostres], tags=["postres"], dependencies=[Depends(validar_etag)])
+@respuesta_rapida
+@con_bd
+def listar_postres(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    categoria_id: Optional[int] = None,
+    disponible: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_sesion)
+):
     """
     Obtiene todos los postres disponibles en la cafetería.
+    
+    Con `cursor` (vacío para la primera página) se usa paginación por cursor ordenada
+    por id y la respuesta es `{"items": [...], "next_cursor": ...}`; sin él se usa skip/limit.
+    Con `fields` (p. ej. `id,nombre,precio`) cada elemento trae sólo esos campos.
     """
-    postres = db.query(Postre).offset(skip).limit(limit).all()
-    return postres
+    campos = proyeccion("postre", fields)
+    consulta = consulta_respuesta("postre", campos)
+    if categoria_id is not None:
+        consulta = consulta.where(Postre.categoria_id == categoria_id)
+    if disponible is not None:
+        consulta = consulta.where(Postre.disponible == disponible)
+    
+    if cursor is not None:
+        return paginar_por_cursor(db, "postre", consulta, cursor, limit, campos)
+    
+    return filas_a_respuesta("postre", db.execute(consulta.offset(skip).limit(limit)).all(), campos)
 
-@app.get("/postres/{postre_id}", response_model=PostreResponse, tags=["postres"])
-def obtener_postre(postre_id: int, db: Session = Depends(get_db)):
+@app.get("/postres/{postre_id}", response_model=PostreResponse, tags=["postres"], dependencies=[Depends(validar_etag)])
+@cacheado(
+    cache_catalogo,
+    lambda postre_id, **_: ("postre", postre_id),
+    lambda resultado, **_: [("categoria", resultado.categoria_id)]
+)
+@con_bd
+def obtener_postre(postre_id: int, db: Session = Depends(get_sesion)):
     """
     Obtiene un postre específico por su ID.
     """
-    postre = db.query(Postre).filter(Postre.id == postre_id).first()
+    postre = db.query(Postre).options(joinedload(Postre.categoria_rel)).filter(Postre.id == postre_id).first()
     if postre is None:
         raise HTTPException(status_code=404, detail="Postre no encontrado")
-    return postre
+    return PostreResponse.model_validate(postre)
 
-@app.get("/postres/categoria/{categoria_id}", response_model=List[PostreResponse], tags=["postres"])
-def obtener_postres_por_categoria(categoria_id: int, db: Session = Depends(get_db)):
+@app.get("/postres/categoria/{categoria_id}", response_model=List[PostreResponse], tags=["postres"], dependencies=[Depends(validar_etag)])
+@respuesta_rapida
+@cacheado(
+    cache_catalogo,
+    lambda categoria_id, fields, **_: ("postres_categoria", categoria_id, normalizar_fields(fields)),
+    lambda categoria_id, **_: [("categoria", categoria_id), ("postres_categoria", categoria_id)]
+)
+@coalescido(
+    coalescencia_lecturas, "/postres/categoria",
+    lambda categoria_id, fields, **_: (categoria_id, normalizar_fields(fields))
+)
+@con_bd
+def obtener_postres_por_categoria(categoria_id: int, fields: Optional[str] = None, db: Session = Depends(get_sesion)):
     """
-    Obtiene todos los postres de una categoría específica.
+    Obtiene todos los postres de una categoría específica (sólo los campos de `fields`, si se indica).
     """
-    postres = db.query(Postre).filter(Postre.categoria_id == categoria_id).all()
-    return postres
+    campos = proyeccion("postre", fields)
+    consulta = consulta_respuesta("postre", campos).where(Postre.categoria_id == categoria_id)
+    return filas_a_respuesta("postre", db.execute(consulta).all(), campos)
 
-@app.get("/postres/{postre_id}/productos", response_model=List[ProductoResponse], tags=["postres"])
-def obtener_productos_relacionados(postre_id: int, db: Session = Depends(get_db)):
+@app.get("/postres/{postre_id}/productos", response_model=List[ProductoResponse], tags=["postres"], dependencies=[Depends(validar_etag)])
+@respuesta_rapida
+@con_bd
+def obtener_productos_relacionados(postre_id: int, fields: Optional[str] = None, db: Session = Depends(get_sesion)):
     """
-    Obtiene todos los productos relacionados con un postre.
+    Obtiene todos los productos relacionados con un postre (sólo los campos de `fields`, si se indica).
     """
-    postre = db.query(Postre).filter(Postre.id == postre_id).first()
-    if postre is None:
+    campos = proyeccion("producto", fields)
+    if db.query(Postre.id).filter(Postre.id == postre_id).first() is None:
         raise HTTPException(status_code=404, detail="Postre no encontrado")
-    return postre.productos_relacionados
+    
+    # Una sola consulta con la tabla intermedia y la categoría de cada producto
+    consulta = consulta_respuesta("producto", campos).join(
+        productos_postres, productos_postres.c.producto_id == Producto.id
+    ).where(productos_postres.c.postre_id == postre_id)
+    return filas_a_respuesta("producto", db.execute(consulta).all(), campos)
 
 @app.post("/postres/", response_model=PostreResponse, tags=["postres"])
-def crear_postre(postre: PostreCreate, db: Session = Depends(get_db)):
+@con_bd
+def crear_postre(postre: PostreCreate, db: Session = Depends(get_sesion)):
     """
     Crea un nuevo postre en la base de datos.
     """
@@ -630,8 +1531,13 @@ def crear_postre(postre: PostreCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
     
     # Crear el postre sin las relaciones
-    postre_data = postre.dict()
-    productos_ids = postre_data.pop('productos_ids', [])
+    postre_data = postre.model_dump()
+    productos_ids = postre_data.pop('productos_ids', None) or []
+    
+    # Verificar con una sola consulta que los productos existen
+    error = relacionados_faltantes(db, "postre", productos_ids)
+    if error:
+        raise HTTPException(status_code=404, detail=error)
     
     # Validar que el precio total sea coherente con precio por rebanada
     if postre_data['precio_total'] != (postre_data['rebanadas'] * postre_data['precio_rebanada']):
@@ -639,21 +1545,37 @@ def crear_postre(postre: PostreCreate, db: Session = Depends(get_db)):
     
     db_postre = Postre(**postre_data)
     db.add(db_postre)
-    db.commit()
+    db.flush()
     
     # Agregar relaciones con productos si se especificaron
     if productos_ids:
-        for producto_id in productos_ids:
-            producto = db.query(Producto).filter(Producto.id == producto_id).first()
-            if producto:
-                db_postre.productos_relacionados.append(producto)
-        db.commit()
+        sincronizar_relaciones(db, "postre", {db_postre.id: set(productos_ids)}, creados=True)
+    registrar_cambio(db, "postre", [db_postre.id], [postre.categoria_id], accion="creado")
+    indexar_al_confirmar(db, [documento_postre(db_postre)])
+    db.commit()
     
     db.refresh(db_postre)
-    return db_postre
+    return PostreResponse.model_validate(db_postre)
+
+@app.post("/postres/bulk", response_model=RespuestaLote, tags=["postres"])
+@con_bd
+def crear_postres_en_lote(postres: List[PostreCreate], db: Session = Depends(get_sesion)):
+    """
+    Crea varios postres en una sola transacción; precio_total = rebanadas * precio_rebanada.
+    """
+    return crear_en_lote(db, "postre", Postre, postres)
+
+@app.put("/postres/bulk", response_model=RespuestaLote, tags=["postres"])
+@con_bd
+def actualizar_postres_en_lote(postres: List[PostreLoteUpdate], db: Session = Depends(get_sesion)):
+    """
+    Actualiza varios postres (cada elemento lleva su id) en una sola transacción.
+    """
+    return actualizar_en_lote(db, "postre", Postre, postres)
 
 @app.put("/postres/{postre_id}", response_model=PostreResponse, tags=["postres"])
-def actualizar_postre(postre_id: int, postre: PostreUpdate, db: Session = Depends(get_db)):
+@con_bd
+def actualizar_postre(postre_id: int, postre: PostreUpdate, db: Session = Depends(get_sesion)):
     """
     Actualiza un postre existente.
     """
@@ -661,7 +1583,7 @@ def actualizar_postre(postre_id: int, postre: PostreUpdate, db: Session = Depend
     if db_postre is None:
         raise HTTPException(status_code=404, detail="Postre no encontrado")
     
-    update_data = postre.dict(exclude_unset=True)
+    update_data = postre.model_dump(exclude_unset=True)
     productos_ids = update_data.pop('productos_ids', None)
     
     # Verificar categoría si se está actualizando
@@ -670,29 +1592,38 @@ def actualizar_postre(postre_id: int, postre: PostreUpdate, db: Session = Depend
         if not categoria:
             raise HTTPException(status_code=404, detail="Categoría no encontrada")
     
+    if productos_ids:
+        error = relacionados_faltantes(db, "postre", productos_ids)
+        if error:
+            raise HTTPException(status_code=404, detail=error)
+    
     # Si se actualizan rebanadas o precio_rebanada, recalcular precio_total
     if 'rebanadas' in update_data or 'precio_rebanada' in update_data:
         rebanadas = update_data.get('rebanadas', db_postre.rebanadas)
         precio_rebanada = update_data.get('precio_rebanada', db_postre.precio_rebanada)
         update_data['precio_total'] = rebanadas * precio_rebanada
     
+    categoria_anterior = db_postre.categoria_id
     for key, value in update_data.items():
         setattr(db_postre, key, value)
     
-    # Actualizar relaciones con productos si se especificaron
+    # Actualizar relaciones con productos si se especificaron (sólo los vínculos que cambian)
     if productos_ids is not None:
-        db_postre.productos_relacionados.clear()
-        for producto_id in productos_ids:
-            producto = db.query(Producto).filter(Producto.id == producto_id).first()
-            if producto:
-                db_postre.productos_relacionados.append(producto)
+        sincronizar_relaciones(db, "postre", {postre_id: set(productos_ids)})
     
+    categoria_nueva = db_postre.categoria_id
+    registrar_cambio(db, "postre", [postre_id], [categoria_anterior, categoria_nueva])
+    # Con la categoría nueva ya escrita, categoria_rel se vuelve a cargar al indexar
+    db.flush()
+    db.expire(db_postre, ["categoria_rel"])
+    indexar_al_confirmar(db, [documento_postre(db_postre)])
     db.commit()
     db.refresh(db_postre)
-    return db_postre
+    return PostreResponse.model_validate(db_postre)
 
 @app.delete("/postres/{postre_id}", tags=["postres"])
-def eliminar_postre(postre_id: int, db: Session = Depends(get_db)):
+@con_bd
+def eliminar_postre(postre_id: int, db: Session = Depends(get_sesion)):
     """
     Elimina un postre de la base de datos.
     """
@@ -700,75 +1631,806 @@ def eliminar_postre(postre_id: int, db: Session = Depends(get_db)):
     if db_postre is None:
         raise HTTPException(status_code=404, detail="Postre no encontrado")
     
+    categoria_id = db_postre.categoria_id
+    # Quitar los vínculos aquí (y no por la cascada del borrado) para publicarlos como relacion.borrado
+    sincronizar_relaciones(db, "postre", {postre_id: set()})
     db.delete(db_postre)
+    registrar_cambio(db, "postre", [postre_id], [categoria_id], accion="borrado")
+    indexar_al_confirmar(db, [(("postre", postre_id), None)])
     db.commit()
     return {"message": f"Postre {db_postre.nombre} eliminado correctamente"}
 
+# ==================== DISPONIBILIDAD ====================
+
+# Milisegundos que se acumulan los cambios de /disponibilidad antes de escribirlos (0: se escriben en la petición)
+DISPONIBILIDAD_VENTANA_MS = float(os.getenv("DISPONIBILIDAD_VENTANA_MS", "0"))
+
+MODELOS_DISPONIBILIDAD = {"producto": Producto, "postre": Postre}
+
+def aplicar_disponibilidad(db: Session, cambios: Dict[Tuple[str, int], int]) -> Set[Tuple[str, int]]:
+    """
+    Aplica cambios {(tipo, id): disponible} con un SELECT y un UPDATE (CASE por id) por tabla,
+    sólo para las filas cuyo valor cambia, y los registra como cambios del catálogo.
+    No hace commit. Devuelve las claves que existen.
+    """
+    # Tomar antes de leer el bloqueo de catalogo_version que registrar_cambio tomaría al final:
+    # otra escritura concurrente espera a este commit y compara contra lo que quede escrito,
+    # en vez de saltarse una fila que sólo parecía sin cambios (el UPDATE sin efecto bloquea la
+    # fila en InnoDB y toma el bloqueo de escritura en SQLite)
+    db.execute(update(CatalogoVersion).where(CatalogoVersion.id == 1).values(version=CatalogoVersion.version))
+    existentes = set()
+    for tipo, modelo in MODELOS_DISPONIBILIDAD.items():
+        valores = {id_: disponible for (tipo_cambio, id_), disponible in cambios.items() if tipo_cambio == tipo}
+        if not valores:
+            continue
+        filas = db.execute(
+            select(modelo.id, modelo.categoria_id, modelo.disponible).where(modelo.id.in_(valores))
+        ).all()
+        existentes.update((tipo, fila.id) for fila in filas)
+        cambiadas = [fila for fila in filas if fila.disponible != valores[fila.id]]
+        if cambiadas:
+            registrar_cambio(
+                db, tipo, [fila.id for fila in cambiadas], {fila.categoria_id for fila in cambiadas},
+                valores={"disponible": case({fila.id: valores[fila.id] for fila in cambiadas}, value=modelo.id)}
+            )
+    return existentes
+
+def _escribir_disponibilidad(cambios: Dict[Tuple[str, int], int]):
+    # Escritura del modo diferido, desde el hilo de EscrituraDiferida
+    with SessionLocal() as db:
+        aplicar_disponibilidad(db, cambios)
+        db.commit()
+
+escritura_disponibilidad = EscrituraDiferida(_escribir_disponibilidad, DISPONIBILIDAD_VENTANA_MS / 1000)
+
+@con_bd
+def _disponibilidad_en_bd(cambios: Dict[Tuple[str, int], int], db: Session):
+    existentes = aplicar_disponibilidad(db, cambios)
+    db.commit()
+    return existentes
+
+@app.patch("/disponibilidad", response_model=RespuestaLote, tags=["disponibilidad"])
+async def actualizar_disponibilidad(cambios: List[CambioDisponibilidad], response: Response,
+                                    db: Session = Depends(get_sesion)):
+    """
+    Cambia `disponible` (0 o 1) de varios productos y postres: `[{"tipo": "producto", "id": 3,
+    "disponible": 0}, ...]`. Se escribe con un UPDATE por tabla en una transacción; si un
+    elemento se repite, gana el último.
+    
+    Con DISPONIBILIDAD_VENTANA_MS > 0 responde 202 en cuanto valida el formato y los cambios
+    se escriben en segundo plano, fusionando los que lleguen dentro de la ventana; en ese modo
+    los ids inexistentes se ignoran al escribir y no se informan.
+    """
+    resultados: List[Optional[ResultadoLote]] = [None] * len(cambios)
+    validos: Dict[Tuple[str, int], int] = {}
+    for indice, cambio in enumerate(cambios):
+        if cambio.tipo not in MODELOS_DISPONIBILIDAD:
+            resultados[indice] = ResultadoLote(indice=indice, id=cambio.id, error="Tipo no soportado: use producto o postre")
+        elif cambio.disponible not in (0, 1):
+            resultados[indice] = ResultadoLote(indice=indice, id=cambio.id, error="disponible debe ser 0 o 1")
+        else:
+            validos[(cambio.tipo, cambio.id)] = cambio.disponible
+    
+    if escritura_disponibilidad.activa:
+        escritura_disponibilidad.agregar(validos)
+        response.status_code = 202
+        existentes = validos
+    elif validos:
+        existentes = await _disponibilidad_en_bd(cambios=validos, db=db)
+    else:
+        existentes = set()
+    
+    for indice, cambio in enumerate(cambios):
+        if resultados[indice] is None:
+            error = None if (cambio.tipo, cambio.id) in existentes else f"{cambio.tipo.capitalize()} no encontrado"
+            resultados[indice] = ResultadoLote(indice=indice, id=cambio.id, error=error)
+    return _respuesta_lote(resultados)
+
+@app.get("/admin/disponibilidad", tags=["admin"])
+def estado_disponibilidad():
+    """
+    Estado de la escritura diferida de /disponibilidad: cambios pendientes, fusionados y escritos.
+    """
+    return escritura_disponibilidad.estadisticas()
+
 # ==================== ENDPOINTS DE BÚSQUEDA ====================
 
-@app.get("/buscar/{termino}", tags=["busqueda"])
-def buscar_global(termino: str, db: Session = Depends(get_db)):
+def _formatear_producto_busqueda(p: Producto):
+    return {
+        "tipo": "Producto",
+        "id": p.id,
+        "nombre": p.nombre,
+        "descripcion": p.descripcion,
+        "categoria": p.categoria_rel.nombre if p.categoria_rel else "Sin categoría",
+        "categoria_id": p.categoria_id,
+        "precio": f"${p.precio:.2f}",
+        "precio_valor": p.precio,
+        "disponible": "Sí" if p.disponible else "No",
+        "disponible_valor": p.disponible
+    }
+
+def _formatear_postre_busqueda(p: Postre):
+    return {
+        "tipo": "Postre",
+        "id": p.id,
+        "nombre": p.nombre,
+        "descripcion": p.descripcion,
+        "categoria": p.categoria_rel.nombre if p.categoria_rel else "Sin categoría",
+        "categoria_id": p.categoria_id,
+        "precio_rebanada": f"${p.precio_rebanada:.2f}",
+        "precio_rebanada_valor": p.precio_rebanada,
+        "precio_total": f"${p.precio_total:.2f}",
+        "precio_total_valor": p.precio_total,
+        "rebanadas": p.rebanadas,
+        "disponible": "Sí" if p.disponible else "No",
+        "disponible_valor": p.disponible
+    }
+
+# Límites de los rangos de precio de las facetas; el último rango no tiene tope
+RANGOS_PRECIO = [float(v) for v in os.getenv("BUSQUEDA_RANGOS_PRECIO", "25,50,100,200").split(",")]
+ORDENES_BUSQUEDA = ("id", "nombre", "precio")
+MODELOS_BUSQUEDA = {"producto": Producto, "postre": Postre}
+
+def _precio_busqueda(modelo):
+    # Los productos se filtran por precio y los postres por precio de rebanada
+    return modelo.precio if modelo is Producto else modelo.precio_rebanada
+
+def _condiciones_texto(termino: str) -> dict:
     """
-    Busca un término en productos y postres (nombre, descripción y categoría).
-    La búsqueda es case-insensitive.
+    Condición SQL de coincidencia con el término para productos y postres (None si no hay
+    ninguna). Con el índice es un IN con los ids encontrados; sin él, LIKE sobre nombre,
+    descripción y categoría (recorre las tablas completas).
     """
+    if BUSQUEDA_MODO == "indice" and indice_busqueda.listo:
+        claves = indice_busqueda.buscar(termino)
+        condiciones = {}
+        for tipo, modelo in MODELOS_BUSQUEDA.items():
+            ids = sorted(id_ for tipo_clave, id_ in claves if tipo_clave == tipo)
+            condiciones[tipo] = modelo.id.in_(ids) if ids else None
+        return condiciones
+    
     # Convertir el término a minúsculas para búsqueda case-insensitive
     termino_lower = f"%{termino.lower()}%"
-    
-    # Buscar en productos
-    productos = db.query(Producto).join(Categoria).filter(
-        or_(
-            func.lower(Producto.nombre).like(termino_lower),
-            func.lower(Producto.descripcion).like(termino_lower),
+    return {
+        tipo: or_(
+            func.lower(modelo.nombre).like(termino_lower),
+            func.lower(modelo.descripcion).like(termino_lower),
             func.lower(Categoria.nombre).like(termino_lower),
             func.lower(Categoria.descripcion).like(termino_lower)
         )
+        for tipo, modelo in MODELOS_BUSQUEDA.items()
+    }
+
+def _facetas_busqueda(db: Session, modelo, condicion, filtros_precio: list):
+    """
+    Conteos agregados de las coincidencias por (categoría, rango de precio, disponible):
+    una consulta GROUP BY cuyo resultado tiene a lo sumo categorías x rangos x 2 filas.
+    """
+    precio = _precio_busqueda(modelo)
+    rango = case(
+        *[(precio < limite, indice) for indice, limite in enumerate(RANGOS_PRECIO)], else_=len(RANGOS_PRECIO)
+    ).label("rango")
+    return db.execute(
+        select(modelo.categoria_id, Categoria.nombre, rango, modelo.disponible, func.count())
+        .select_from(modelo).outerjoin(Categoria, modelo.categoria_id == Categoria.id)
+        .where(condicion, *filtros_precio)
+        # Agrupar por el alias evita repetir el CASE (y sus parámetros) en el GROUP BY
+        .group_by(modelo.categoria_id, Categoria.nombre, literal_column("rango"), modelo.disponible)
     ).all()
+
+def _resumir_facetas(grupos: list, categoria_id: Optional[int], disponible: Optional[int]) -> dict:
+    """
+    Suma los grupos de _facetas_busqueda. Cada faceta se cuenta sin su propio filtro (la de
+    categorías ignora categoria_id, la de disponibilidad ignora disponible), así el cliente ve
+    cuántos resultados tendría al cambiarlo; el filtro de precio se aplica en SQL a todas.
+    """
+    categorias, rangos = {}, [0] * (len(RANGOS_PRECIO) + 1)
+    disponibles = {"si": 0, "no": 0}
+    for id_categoria, nombre_categoria, rango, disponible_grupo, total in grupos:
+        en_categoria = categoria_id is None or id_categoria == categoria_id
+        en_disponible = disponible is None or disponible_grupo == disponible
+        if en_disponible:
+            entrada = categorias.setdefault(
+                id_categoria, {"id": id_categoria, "nombre": nombre_categoria or "Sin categoría", "total": 0}
+            )
+            entrada["total"] += total
+        if en_categoria:
+            disponibles["si" if disponible_grupo else "no"] += total
+        if en_categoria and en_disponible:
+            rangos[rango] += total
+    limites = [0.0] + RANGOS_PRECIO
+    return {
+        "categorias": sorted(categorias.values(), key=lambda c: (-c["total"], c["nombre"])),
+        "precios": [
+            {"desde": limites[i], "hasta": RANGOS_PRECIO[i] if i < len(RANGOS_PRECIO) else None, "total": rangos[i]}
+            for i in range(len(rangos))
+        ],
+        "disponible": disponibles,
+    }
+
+@app.get("/buscar/{termino}", tags=["busqueda"], dependencies=[Depends(validar_etag)])
+@coalescido(
+    coalescencia_lecturas, "/buscar",
+    lambda termino, categoria_id, precio_min, precio_max, disponible, orden, limit, **_:
+        (termino, categoria_id, precio_min, precio_max, disponible, orden, limit)
+)
+@con_bd
+def buscar_global(
+    termino: str,
+    categoria_id: Optional[int] = None,
+    precio_min: Optional[float] = None,
+    precio_max: Optional[float] = None,
+    disponible: Optional[int] = None,
+    orden: str = "id",
+    limit: Optional[int] = None,
+    db: Session = Depends(get_sesion)
+):
+    """
+    Busca un término en productos y postres (nombre, descripción y categoría).
+    La búsqueda es case-insensitive y, con el índice, también ignora acentos ("cafe" encuentra "Café").
     
-    # Buscar en postres
-    postres = db.query(Postre).join(Categoria).filter(
-        or_(
-            func.lower(Postre.nombre).like(termino_lower),
-            func.lower(Postre.descripcion).like(termino_lower),
-            func.lower(Categoria.nombre).like(termino_lower),
-            func.lower(Categoria.descripcion).like(termino_lower)
-        )
-    ).all()
+    Filtros opcionales: `categoria_id`, `precio_min`/`precio_max` (precio de los productos y
+    precio por rebanada de los postres) y `disponible`. `orden` acepta id, nombre o precio
+    (con "-" delante para orden descendente) y `limit` limita cada lista. `total_resultados`
+    y las `facetas` (por categoría, rango de precio y disponibilidad) cuentan todas las
+    coincidencias, no sólo las devueltas. Son a lo sumo cuatro consultas.
+    """
+    campo_orden = orden.lstrip("-")
+    if campo_orden not in ORDENES_BUSQUEDA:
+        raise HTTPException(status_code=400, detail=f"Orden no soportado: use {', '.join(ORDENES_BUSQUEDA)} (con - para descendente)")
+    
+    condiciones = _condiciones_texto(termino)
+    listas, grupos = {}, []
+    for tipo, modelo in MODELOS_BUSQUEDA.items():
+        listas[tipo] = []
+        if condiciones[tipo] is None:
+            continue
+        precio = _precio_busqueda(modelo)
+        filtros_precio = [precio >= precio_min] if precio_min is not None else []
+        filtros_precio += [precio <= precio_max] if precio_max is not None else []
+        grupos_tipo = _facetas_busqueda(db, modelo, condiciones[tipo], filtros_precio)
+        grupos += grupos_tipo
+        
+        # Sin coincidencias con todos los filtros no hace falta la consulta de la página
+        if limit == 0 or not any(
+            (categoria_id is None or fila[0] == categoria_id) and (disponible is None or fila[3] == disponible)
+            for fila in grupos_tipo
+        ):
+            continue
+        consulta = db.query(modelo).outerjoin(Categoria, modelo.categoria_id == Categoria.id).options(
+            contains_eager(modelo.categoria_rel)
+        ).filter(condiciones[tipo], *filtros_precio)
+        if categoria_id is not None:
+            consulta = consulta.filter(modelo.categoria_id == categoria_id)
+        if disponible is not None:
+            consulta = consulta.filter(modelo.disponible == disponible)
+        columna = {"id": modelo.id, "nombre": modelo.nombre, "precio": precio}[campo_orden]
+        consulta = consulta.order_by(columna.desc() if orden.startswith("-") else columna, modelo.id)
+        if limit is not None:
+            consulta = consulta.limit(max(limit, 0))
+        listas[tipo] = consulta.all()
     
+    facetas = _resumir_facetas(grupos, categoria_id, disponible)
     # Formatear resultados
     resultados = {
         "termino_busqueda": termino,
-        "productos": [
-            {
-                "tipo": "Producto",
-                "id": p.id,
-                "nombre": p.nombre,
-                "descripcion": p.descripcion,
-                "categoria": p.categoria_rel.nombre if p.categoria_rel else "Sin categoría",
-                "precio": f"${p.precio:.2f}",
-                "disponible": "Sí" if p.disponible else "No"
-            }
-            for p in productos
-        ],
-        "postres": [
-            {
-                "tipo": "Postre",
-                "id": p.id,
-                "nombre": p.nombre,
-                "descripcion": p.descripcion,
-                "categoria": p.categoria_rel.nombre if p.categoria_rel else "Sin categoría",
-                "precio_rebanada": f"${p.precio_rebanada:.2f}",
-                "precio_total": f"${p.precio_total:.2f}",
-                "rebanadas": p.rebanadas,
-                "disponible": "Sí" if p.disponible else "No"
-            }
-            for p in postres
-        ],
-        "total_resultados": len(productos) + len(postres)
+        "productos": [_formatear_producto_busqueda(p) for p in listas["producto"]],
+        "postres": [_formatear_postre_busqueda(p) for p in listas["postre"]],
+        "total_resultados": sum(r["total"] for r in facetas["precios"]),
+        "facetas": facetas
     }
     
     return resultados
 
+# Máximo de sugerencias por petición
+SUGERENCIAS_MAX = 50
+
+@app.get("/sugerir", tags=["busqueda"], dependencies=[Depends(validar_etag)])
+async def sugerir(q: str = "", limit: int = 10):
+    """
+    Autocompletado: nombres de productos, postres y categorías que empiezan con `q` (o con una
+    palabra que empieza con `q`), sin distinguir mayúsculas ni acentos. Se responde desde el
+    índice de prefijos en memoria, sin consultar la base de datos.
+    """
+    return {"q": q, "sugerencias": indice_sugerencias.sugerir(q, max(1, min(limit, SUGERENCIAS_MAX)))}
+
+# ==================== SINCRONIZACIÓN INCREMENTAL ====================
+
+# Nombre de cada tipo en la respuesta de /sync
+TABLAS_SYNC = {"categoria": "categorias", "producto": "productos", "postre": "postres"}
+
+def _leer_token_sync(token: str):
+    """
+    Devuelve (epoca, version) de un token de /sync ("<epoca>-<version>").
+    """
+    epoca, _, version = token.rpartition("-")
+    if not epoca or not version.isdigit():
+        raise HTTPException(status_code=400, detail="Token de sincronización inválido")
+    return epoca, int(version)
+
+def _filas_sync(db: Session, modelo, desde: int, hasta: int) -> List[dict]:
+    filas = db.execute(
+        select(modelo.__table__)
+        .where(modelo.version_cambio > desde, modelo.version_cambio <= hasta)
+        .order_by(modelo.id)
+    ).mappings().all()
+    return [dict(fila) for fila in filas]
+
+@app.get("/sync", tags=["sincronizacion"])
+@respuesta_rapida
+@con_bd
+def sincronizar(since: Optional[str] = None, db: Session = Depends(get_sesion)):
+    """
+    Cambios del catálogo desde el token `since`: filas de categorías, productos y postres
+    creadas o modificadas, ids borrados y los vínculos producto-postre de las filas que
+    cambiaron, más el token para la siguiente llamada. Sin `since` (o con un token de otra
+    base de datos) devuelve el catálogo completo con `completo: true`.
+    
+    El cliente aplica primero `borrados`, luego las filas (upsert por id) y por último
+    reemplaza los vínculos de cada producto y postre recibido por los de `relaciones`.
+    Cada lista se lee con el índice de version_cambio, así que el costo depende de cuántas
+    filas cambiaron y no del tamaño del catálogo.
+    """
+    # La versión se lee primero: todo lo confirmado hasta ella ya está marcado en las filas, y
+    # lo que se confirme después (versión mayor) llega en la siguiente llamada
+    actual = db.execute(select(CatalogoVersion.epoca, CatalogoVersion.version).where(CatalogoVersion.id == 1)).one()
+    hasta = actual.version
+    desde = -1
+    if since:
+        epoca, version = _leer_token_sync(since)
+        if epoca == actual.epoca and version <= hasta:
+            desde = version
+    
+    respuesta = {"token": f"{actual.epoca}-{hasta}", "completo": desde < 0}
+    for tipo, modelo in MODELOS_CATALOGO.items():
+        respuesta[TABLAS_SYNC[tipo]] = _filas_sync(db, modelo, desde, hasta)
+    
+    borrados = {nombre: [] for nombre in TABLAS_SYNC.values()}
+    if desde >= 0:
+        for tipo, id_ in db.execute(
+            select(CatalogoBorrado.tipo, CatalogoBorrado.id)
+            .where(CatalogoBorrado.version > desde, CatalogoBorrado.version <= hasta)
+            .order_by(CatalogoBorrado.tipo, CatalogoBorrado.id)
+        ):
+            borrados[TABLAS_SYNC[tipo]].append(id_)
+    respuesta["borrados"] = borrados
+    
+    # Vínculos actuales de los productos y postres que cambiaron (por JOIN, sin listas IN)
+    vinculos = set()
+    for modelo, columna in ((Producto, productos_postres.c.producto_id), (Postre, productos_postres.c.postre_id)):
+        vinculos.update(db.execute(
+            select(productos_postres.c.producto_id, productos_postres.c.postre_id)
+            .join(modelo, modelo.id == columna)
+            .where(modelo.version_cambio > desde, modelo.version_cambio <= hasta)
+        ).all())
+    respuesta["relaciones"] = [{"producto_id": producto, "postre_id": postre} for producto, postre in sorted(vinculos)]
+    return respuesta
+
+# ==================== EVENTOS DEL CATÁLOGO ====================
+
+# Cambios que se guardan por cliente de /eventos antes de descartarlo por lento
+EVENTOS_COLA = int(os.getenv("EVENTOS_COLA", "100"))
+# Segundos sin eventos tras los que se envía un comentario para mantener la conexión abierta
+EVENTOS_PING = float(os.getenv("EVENTOS_PING", "15"))
+# Milisegundos que espera el navegador antes de reconectarse (campo retry de SSE)
+EVENTOS_REINTENTO_MS = int(os.getenv("EVENTOS_REINTENTO_MS", "3000"))
+
+canal_eventos = CanalEventos(EVENTOS_COLA)
+
+def texto_eventos(cambio: dict, epoca: str) -> str:
+    """
+    Eventos SSE de un cambio: "relacion.creado" / "relacion.borrado" con los vínculos que
+    cambió y al final "<tipo>.<accion>", el único con id ("<epoca>-<version>", el mismo
+    formato que el token de /sync), que el navegador reenvía como Last-Event-ID.
+    """
+    version = cambio["version"]
+    texto = ""
+    for accion, pares in (cambio["vinculos"] or {}).items():
+        if pares:
+            texto += formatear_evento(f"relacion.{accion}", {
+                "version": version,
+                "relaciones": [{"producto_id": producto, "postre_id": postre} for producto, postre in pares],
+            })
+    return texto + formatear_evento(f"{cambio['tipo']}.{cambio['accion']}", {
+        "version": version, "ids": cambio["ids"], "categorias": cambio["categorias"]
+    }, f"{epoca}-{version}")
+
+def _cambios_pendientes(ultimo: Optional[str]) -> Tuple[str, int, Optional[List[dict]]]:
+    """
+    Cambios de catalogo_cambios posteriores al id `ultimo`. Devuelve (epoca, version actual,
+    cambios); los cambios son None si no se pueden recuperar (id de otra base de datos,
+    inválido o de cambios ya podados) y el cliente debe recargar con /sync.
+    """
+    with SessionLocal() as db:
+        actual = db.execute(select(CatalogoVersion.epoca, CatalogoVersion.version).where(CatalogoVersion.id == 1)).one()
+        if not ultimo:
+            return actual.epoca, actual.version, []
+        epoca, _, version = ultimo.rpartition("-")
+        if epoca != actual.epoca or not version.isdigit() or int(version) > actual.version:
+            return actual.epoca, actual.version, None
+        filas = db.execute(
+            select(CambioCatalogo)
+            .where(CambioCatalogo.version > int(version), CambioCatalogo.version <= actual.version)
+            .order_by(CambioCatalogo.version)
+        ).scalars().all()
+        if len(filas) != actual.version - int(version):
+            return actual.epoca, actual.version, None
+        return actual.epoca, actual.version, [_cambio_desde_fila(fila) for fila in filas]
+
+@app.get("/eventos", tags=["eventos"])
+async def eventos_catalogo(request: Request, desde: Optional[str] = None):
+    """
+    Stream de Server-Sent Events con los cambios del catálogo: "<tipo>.<accion>" (p. ej.
+    "producto.actualizado", "postre.borrado") con los ids y categorías afectados, y
+    "relacion.creado" / "relacion.borrado" con los vínculos producto-postre.
+    
+    Al reconectarse, el navegador envía Last-Event-ID y recibe los cambios que se perdió,
+    leídos de catalogo_cambios; `desde` hace lo mismo con un token de /sync en la primera
+    conexión. Si ya no se pueden recuperar llega "reinicio" y el cliente recarga con /sync.
+    Un cliente que no lee a tiempo recibe "descartado" y se cierra su stream.
+    """
+    ultimo = request.headers.get("last-event-id") or desde
+    # Suscribirse antes de leer el registro: lo que se confirme mientras tanto llega por la
+    # cola, y lo repetido se salta por versión
+    suscripcion = canal_eventos.suscribir()
+    try:
+        epoca, version, pendientes = await run_in_threadpool(_cambios_pendientes, ultimo)
+    except BaseException:
+        canal_eventos.cancelar(suscripcion)
+        raise
+    
+    async def generar():
+        try:
+            yield f"retry: {EVENTOS_REINTENTO_MS}\n\n"
+            if pendientes is None:
+                yield formatear_evento("reinicio", {"version": version})
+            else:
+                for cambio in pendientes:
+                    yield texto_eventos(cambio, epoca)
+            enviada = version
+            while True:
+                try:
+                    elemento = await asyncio.wait_for(suscripcion.cola.get(), EVENTOS_PING)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if elemento is None:
+                    yield formatear_evento("descartado", {"version": enviada})
+                    return
+                version_evento, texto = elemento
+                if version_evento is None:
+                    # Reinicio: la secuencia vuelve a empezar desde la versión que trae
+                    enviada = 0
+                elif version_evento <= enviada:
+                    continue
+                else:
+                    enviada = version_evento
+                yield texto
+        finally:
+            canal_eventos.cancelar(suscripcion)
+    
+    return StreamingResponse(
+        generar(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/admin/eventos", tags=["admin"])
+def estado_eventos():
+    """
+    Suscriptores de /eventos, eventos publicados y clientes descartados por lentos.
+    """
+    return canal_eventos.estadisticas()
+
+# ==================== EXPORTACIÓN ====================
+
+# Filas que se leen del cursor del servidor y se envían por cada bloque
+EXPORT_LOTE = int(os.getenv("EXPORT_LOTE", "1000"))
+
+FORMATOS_EXPORT = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+def _consulta_export(recurso: str):
+    """
+    SELECT de Core (sin ORM) con el nombre de la categoría resuelto por JOIN.
+    """
+    if recurso == "productos":
+        return select(
+            Producto.id, Producto.nombre, Producto.categoria_id, Categoria.nombre.label("categoria"),
+            Producto.descripcion, Producto.precio, Producto.disponible
+        ).outerjoin(Categoria, Producto.categoria_id == Categoria.id).order_by(Producto.id)
+    if recurso == "postres":
+        return select(
+            Postre.id, Postre.nombre, Postre.categoria_id, Categoria.nombre.label("categoria"),
+            Postre.descripcion, Postre.rebanadas, Postre.precio_rebanada, Postre.precio_total, Postre.disponible
+        ).outerjoin(Categoria, Postre.categoria_id == Categoria.id).order_by(Postre.id)
+    return select(
+        productos_postres.c.producto_id, Producto.nombre.label("producto"),
+        productos_postres.c.postre_id, Postre.nombre.label("postre")
+    ).join(Producto, Producto.id == productos_postres.c.producto_id).join(
+        Postre, Postre.id == productos_postres.c.postre_id
+    ).order_by(productos_postres.c.producto_id, productos_postres.c.postre_id)
+
+def _formatear_lote(columnas: List[str], filas, formato: str) -> str:
+    if formato == "csv":
+        salida = io.StringIO()
+        csv.writer(salida).writerows(filas)
+        return salida.getvalue()
+    return "".join(json.dumps(dict(zip(columnas, fila)), ensure_ascii=False) + "\n" for fila in filas)
+
+def _cabecera_csv(columnas: List[str]) -> str:
+    salida = io.StringIO()
+    csv.writer(salida).writerow(columnas)
+    return salida.getvalue()
+
+def _exportar_sync(recurso: str, formato: str):
+    """
+    Lee con un cursor del servidor (stream_results) y envía bloques de EXPORT_LOTE filas,
+    así la memoria no depende del tamaño de la tabla.
+    """
+    with engine.connect() as conn:
+        resultado = conn.execution_options(stream_results=True, yield_per=EXPORT_LOTE).execute(_consulta_export(recurso))
+        columnas = list(resultado.keys())
+        if formato == "csv":
+            yield _cabecera_csv(columnas)
+        for filas in resultado.partitions():
+            yield _formatear_lote(columnas, filas, formato)
+
+async def _exportar_async(recurso: str, formato: str):
+    async with async_engine.connect() as conn:
+        resultado = await conn.stream(_consulta_export(recurso))
+        columnas = list(resultado.keys())
+        if formato == "csv":
+            yield _cabecera_csv(columnas)
+        async for filas in resultado.partitions(EXPORT_LOTE):
+            yield _formatear_lote(columnas, filas, formato)
+
+def _respuesta_export(recurso: str, formato: str) -> StreamingResponse:
+    if formato not in FORMATOS_EXPORT:
+        raise HTTPException(status_code=400, detail="Formato no soportado (usa ndjson o csv)")
+    
+    if async_engine is not None:
+        contenido = _exportar_async(recurso, formato)
+    else:
+        contenido = _exportar_sync(recurso, formato)
+    return StreamingResponse(
+        contenido,
+        media_type=FORMATOS_EXPORT[formato],
+        headers={"Content-Disposition": f'attachment; filename="{recurso}.{formato}"'}
+    )
+
+@app.get("/export/productos", tags=["exportacion"])
+def exportar_productos(formato: str = "ndjson"):
+    """
+    Exporta todos los productos (con el nombre de su categoría) como NDJSON o CSV.
+    """
+    return _respuesta_export("productos", formato)
+
+@app.get("/export/postres", tags=["exportacion"])
+def exportar_postres(formato: str = "ndjson"):
+    """
+    Exporta todos los postres (con el nombre de su categoría) como NDJSON o CSV.
+    """
+    return _respuesta_export("postres", formato)
+
+@app.get("/export/relaciones", tags=["exportacion"])
+def exportar_relaciones(formato: str = "ndjson"):
+    """
+    Exporta los vínculos producto-postre de la tabla productos_postres como NDJSON o CSV.
+    """
+    return _respuesta_export("relaciones", formato)
+
+# ==================== IMPORTACIÓN ====================
+
+# Registros por transacción al importar
+IMPORT_LOTE = int(os.getenv("IMPORT_LOTE", "500"))
+
+# tipo -> (esquema de cada fila, modelo, clave para el índice de búsqueda)
+TIPOS_IMPORT = {
+    "categorias": (CategoriaImport, Categoria, None),
+    "productos": (ProductoImport, Producto, "producto"),
+    "postres": (PostreImport, Postre, "postre"),
+}
+
+def _leer_registros(archivo, formato: str, esquema):
+    """
+    Recorre el archivo subido línea a línea y produce (línea, datos validados, error).
+    """
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    if formato == "csv":
+        lector = csv.DictReader(texto)
+        filas = ((lector.line_num, fila) for fila in lector)
+    else:
+        filas = ((numero, linea) for numero, linea in enumerate(texto, start=1) if linea.strip())
+    
+    for linea, fila in filas:
+        try:
+            if formato != "csv":
+                fila = json.loads(fila)
+            # Las celdas vacías cuentan como campos ausentes
+            datos = {k: v for k, v in fila.items() if k is not None and v not in ("", None)}
+            yield linea, esquema(**datos).model_dump(), None
+        except ValidationError as e:
+            detalle = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            yield linea, None, detalle
+        except (ValueError, AttributeError):
+            yield linea, None, "Registro mal formado"
+
+def _importar_categorias(db: Session, registros: list, errores: list, documentos: list) -> Dict[str, int]:
+    # Upsert por nombre (columna única)
+    validos = {}
+    for linea, datos in registros:
+        validos[datos['nombre']] = datos
+    existentes = {c.nombre: c for c in db.query(Categoria).filter(Categoria.nombre.in_(list(validos))).all()}
+    
+    nuevas = []
+    cambiadas = {}
+    for nombre, datos in validos.items():
+        if nombre in existentes:
+            categoria = existentes[nombre]
+            if categoria.descripcion != datos['descripcion']:
+                categoria.descripcion = datos['descripcion']
+                cambiadas[categoria.id] = categoria
+        else:
+            nuevas.append(datos)
+    # Las que no cambiaron no se registran: /sync las reenviaría y se invalidaría la caché
+    if cambiadas:
+        registrar_cambio(db, "categoria", cambiadas.keys())
+    if nuevas:
+        ids_nuevas = insertar_en_bloque(db, Categoria, nuevas)
+        registrar_cambio(db, "categoria", ids_nuevas, accion="creado")
+        # El nombre no cambia al actualizar, así que sólo las nuevas van a las sugerencias
+        documentos.extend((("categoria", id_), [datos['nombre']]) for datos, id_ in zip(nuevas, ids_nuevas))
+    # Los productos y postres indexan el texto de su categoría
+    documentos.extend(documentos_de_categorias(db, cambiadas))
+    return {"insertados": len(nuevas), "actualizados": len(cambiadas)}
+
+def _importar_catalogo(db: Session, tipo: str, registros: list, errores: list, documentos: list) -> Dict[str, int]:
+    # Upsert por id de productos o postres; la categoría se resuelve por nombre o por id
+    modelo, clave = TIPOS_IMPORT[tipo][1:]
+    nombres = {d['categoria'] for _, d in registros if d['categoria']}
+    ids_cat = {d['categoria_id'] for _, d in registros if d['categoria_id'] is not None}
+    categorias = db.query(Categoria).filter(or_(Categoria.nombre.in_(nombres), Categoria.id.in_(ids_cat))).all()
+    por_nombre = {c.nombre: c for c in categorias}
+    por_id = {c.id: c for c in categorias}
+    ids = {d['id'] for _, d in registros if d['id'] is not None}
+    # id -> categoría actual, para invalidar también el listado de la categoría anterior
+    existentes = dict(db.query(modelo.id, modelo.categoria_id).filter(modelo.id.in_(ids)).all()) if ids else {}
+    
+    textos = {}
+    actualizar, insertar_con_id, insertar_sin_id = [], [], []
+    vistos = set()
+    for linea, datos in registros:
+        categoria = por_nombre.get(datos.pop('categoria')) or por_id.get(datos['categoria_id'])
+        if categoria is None:
+            errores.append({"linea": linea, "error": "Categoría no encontrada"})
+            continue
+        if datos['id'] is not None:
+            if datos['id'] in vistos:
+                errores.append({"linea": linea, "error": "Id repetido en el lote"})
+                continue
+            vistos.add(datos['id'])
+        
+        datos['categoria_id'] = categoria.id
+        if tipo == "postres":
+            _ajustar_precio_total(datos)
+        
+        if datos['id'] in existentes:
+            actualizar.append(datos)
+        elif datos['id'] is not None:
+            insertar_con_id.append(datos)
+        else:
+            datos.pop('id')
+            insertar_sin_id.append(datos)
+        textos[id(datos)] = _textos_busqueda(datos['nombre'], datos['descripcion'], categoria)
+    
+    if actualizar:
+        # UPDATE por clave primaria con executemany
+        db.execute(update(modelo), actualizar)
+    if insertar_con_id:
+        db.execute(insert(modelo.__table__), insertar_con_id)
+    if insertar_sin_id:
+        for datos, id_ in zip(insertar_sin_id, insertar_en_bloque(db, modelo, insertar_sin_id)):
+            datos['id'] = id_
+    
+    if actualizar:
+        categorias_afectadas = {datos['categoria_id'] for datos in actualizar} | {existentes[d['id']] for d in actualizar}
+        registrar_cambio(db, clave, [datos['id'] for datos in actualizar], categorias_afectadas)
+    insertados = insertar_con_id + insertar_sin_id
+    if insertados:
+        registrar_cambio(db, clave, [datos['id'] for datos in insertados], {datos['categoria_id'] for datos in insertados}, accion="creado")
+    escritos = actualizar + insertados
+    documentos.extend(((clave, datos['id']), textos[id(datos)]) for datos in escritos)
+    return {"insertados": len(insertar_con_id) + len(insertar_sin_id), "actualizados": len(actualizar)}
+
+def _importar_lote(db: Session, tipo: str, bloque: list) -> dict:
+    """
+    Aplica un lote de registros en una transacción; si falla, se revierte sólo ese lote.
+    """
+    errores = [{"linea": linea, "error": error} for linea, _, error in bloque if error]
+    registros = [(linea, datos) for linea, datos, error in bloque if not error]
+    # Documentos que se indexan al confirmar el lote
+    documentos = []
+    conteo = {"insertados": 0, "actualizados": 0}
+    
+    if registros:
+        try:
+            if tipo == "categorias":
+                conteo = _importar_categorias(db, registros, errores, documentos)
+            else:
+                conteo = _importar_catalogo(db, tipo, registros, errores, documentos)
+            indexar_al_confirmar(db, documentos)
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            mensaje = f"Error de base de datos en el lote: {str(e.__cause__ or e)[:200]}"
+            errores = [{"linea": linea, "error": mensaje} for linea, _, _ in bloque]
+            conteo = {"insertados": 0, "actualizados": 0}
+    
+    errores.sort(key=lambda e: e["linea"])
+    return {"lineas": len(bloque), **conteo, "errores": errores}
+
+def _importar_lote_sync(tipo: str, bloque: list) -> dict:
+    db = SessionLocal()
+    try:
+        return _importar_lote(db, tipo, bloque)
+    finally:
+        db.close()
+
+async def _importar(tipo: str, formato: str, archivo: UploadFile, lote: int):
+    """
+    Lee el archivo por bloques de `lote` registros y emite una línea NDJSON de progreso por bloque
+    y un resumen final. Sólo un bloque está en memoria a la vez.
+    """
+    registros = _leer_registros(archivo.file, formato, TIPOS_IMPORT[tipo][0])
+    totales = {"lineas": 0, "insertados": 0, "actualizados": 0, "errores": 0}
+    inicio = time.perf_counter()
+    
+    for numero in itertools.count(1):
+        bloque = await run_in_threadpool(lambda: list(itertools.islice(registros, lote)))
+        if not bloque:
+            break
+        if AsyncSessionLocal is not None:
+            async with AsyncSessionLocal() as db:
+                resultado = await db.run_sync(_importar_lote, tipo, bloque)
+        else:
+            resultado = await run_in_threadpool(_importar_lote_sync, tipo, bloque)
+        
+        for campo in ("lineas", "insertados", "actualizados"):
+            totales[campo] += resultado[campo]
+        totales["errores"] += len(resultado["errores"])
+        yield json.dumps({"lote": numero, **resultado}, ensure_ascii=False) + "\n"
+    
+    segundos = time.perf_counter() - inicio
+    totales["segundos"] = round(segundos, 3)
+    totales["filas_por_segundo"] = round(totales["lineas"] / segundos, 1) if segundos > 0 else 0.0
+    yield json.dumps({"resumen": totales}, ensure_ascii=False) + "\n"
+
+@app.post("/import", tags=["importacion"])
+def importar(
+    tipo: str,
+    archivo: UploadFile = File(...),
+    formato: Optional[str] = None,
+    lote: int = IMPORT_LOTE
+):
+    """
+    Importa categorías, productos o postres desde un archivo CSV o NDJSON (mismas columnas que /export).
+    
+    - categorias: upsert por `nombre`.
+    - productos/postres: upsert por `id` (sin id se insertan); la categoría se indica con `categoria` (nombre) o `categoria_id`.
+    
+    La respuesta es un stream NDJSON con una línea por lote (insertados, actualizados y errores por línea)
+    y un resumen final con filas por segundo. Cada lote es una transacción.
+    """
+    if tipo not in TIPOS_IMPORT:
+        raise HTTPException(status_code=400, detail="Tipo no soportado (usa categorias, productos o postres)")
+    if formato is None:
+        formato = "csv" if (archivo.filename or "").lower().endswith(".csv") else "ndjson"
+    if formato not in FORMATOS_EXPORT:
+        raise HTTPException(status_code=400, detail="Formato no soportado (usa ndjson o csv)")
+    if lote < 1:
+        raise HTTPException(status_code=400, detail="El lote debe ser mayor que cero")
+    
+    return StreamingResponse(_importar(tipo, formato, archivo, lote), media_type=FORMATOS_EXPORT["ndjson"])
+
 # Punto de entrada para ejecutar la aplicación con uvicorn
 if __name__ == "__main__":
     import uvicorn
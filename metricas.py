@@ -0,0 +1,372 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+# Cabecera de respuesta con el número de consultas SQL ejecutadas por la petición
+CABECERA_CONSULTAS = "X-Query-Count"
+
+
+class ContadorConsultas:
+    """
+    Consultas SQL ejecutadas durante una petición y tiempo total en la base de datos.
+    """
+
+    __slots__ = ("consultas", "segundos_bd", "scope")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.consultas = 0
+        self.segundos_bd = 0.0
+        # Scope ASGI de la petición (para saber la ruta que emitió cada consulta)
+        self.scope = scope
+
+    def ruta(self) -> Optional[str]:
+        """
+        "MÉTODO /plantilla/de/ruta" de la petición, si ya se resolvió la ruta.
+        """
+        if self.scope is None:
+            return None
+        ruta = self.scope.get("route")
+        return f"{self.scope.get('method')} {getattr(ruta, 'path', self.scope.get('path'))}"
+
+
+# Contador de la petición en curso (None fuera de una petición HTTP)
+_contador_actual: ContextVar[Optional[ContadorConsultas]] = ContextVar("contador_consultas", default=None)
+
+
+def contador_actual() -> Optional[ContadorConsultas]:
+    return _contador_actual.get()
+
+
+# Funciones que reciben cada sentencia ejecutada con su duración (ver observar_consultas)
+_observadores: List[Callable] = []
+
+
+def observar_consultas(observador: Callable):
+    """
+    Registra observador(conn, cursor, statement, parameters, context, executemany, segundos),
+    que se llama después de cada sentencia en cualquier engine.
+    """
+    _observadores.append(observador)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _contar_consulta(conn, cursor, statement, parameters, context, executemany):
+    contador = _contador_actual.get()
+    if contador is not None:
+        contador.consultas += 1
+    # Pila por conexión (receta de SQLAlchemy); también mide las consultas fuera de una petición
+    conn.info.setdefault("inicio_consultas", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _medir_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("inicio_consultas")
+    if not inicios:
+        return
+    segundos = time.perf_counter() - inicios.pop()
+    contador = _contador_actual.get()
+    if contador is not None:
+        contador.segundos_bd += segundos
+    for observador in _observadores:
+        observador(conn, cursor, statement, parameters, context, executemany, segundos)
+
+
+@event.listens_for(Engine, "handle_error")
+def _descartar_inicio(contexto):
+    # Una sentencia que falla no llega a after_cursor_execute
+    if contexto.connection is not None and contexto.cursor is not None:
+        inicios = contexto.connection.info.get("inicio_consultas")
+        if inicios:
+            inicios.pop()
+
+
+# Límites de los buckets (en segundos y en número de consultas)
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Cuantiles que se calculan a partir de los buckets de latencia
+CUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histograma:
+    """
+    Histograma acumulable al estilo de Prometheus (buckets fijos, suma y conteo).
+    """
+
+    __slots__ = ("limites", "conteos", "suma", "total")
+
+    def __init__(self, limites: Sequence[float]):
+        self.limites = limites
+        # Un bucket por límite más el de +Inf
+        self.conteos = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.conteos[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def acumulados(self) -> List[int]:
+        resultado, acumulado = [], 0
+        for conteo in self.conteos:
+            acumulado += conteo
+            resultado.append(acumulado)
+        return resultado
+
+    def cuantil(self, q: float) -> float:
+        """
+        Estima el cuantil interpolando dentro del bucket (como histogram_quantile de Prometheus).
+        """
+        if not self.total:
+            return 0.0
+        objetivo = q * self.total
+        anterior_limite, anterior_acumulado = 0.0, 0
+        for limite, acumulado in zip(self.limites, self.acumulados()):
+            if acumulado >= objetivo:
+                en_bucket = acumulado - anterior_acumulado
+                return anterior_limite + (limite - anterior_limite) * (objetivo - anterior_acumulado) / en_bucket
+            anterior_limite, anterior_acumulado = limite, acumulado
+        # Por encima del último límite sólo se sabe que supera ese valor
+        return self.limites[-1]
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(**valores) -> str:
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in valores.items()) + "}"
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class MetricasHTTP:
+    """
+    Métricas por ruta (plantilla de FastAPI, p. ej. "/productos/{producto_id}") y método:
+    latencia, consultas SQL y tiempo en la base de datos por petición, y conteo por código
+    de estado. Se exportan en formato de texto de Prometheus con exportar().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencia: Dict[Tuple[str, str], Histograma] = {}
+        self._consultas: Dict[Tuple[str, str], Histograma] = {}
+        self._tiempo_bd: Dict[Tuple[str, str], Histograma] = {}
+        self._peticiones: Dict[Tuple[str, str, int], int] = {}
+
+    def registrar(self, metodo: str, ruta: str, estado: int, segundos: float, contador: ContadorConsultas):
+        clave = (metodo, ruta)
+        with self._lock:
+            latencia = self._latencia.get(clave)
+            if latencia is None:
+                latencia = self._latencia[clave] = Histograma(BUCKETS_LATENCIA)
+                self._consultas[clave] = Histograma(BUCKETS_CONSULTAS)
+                self._tiempo_bd[clave] = Histograma(BUCKETS_LATENCIA)
+            latencia.observar(segundos)
+            self._consultas[clave].observar(contador.consultas)
+            self._tiempo_bd[clave].observar(contador.segundos_bd)
+            clave_estado = (metodo, ruta, estado)
+            self._peticiones[clave_estado] = self._peticiones.get(clave_estado, 0) + 1
+
+    def _exportar_histograma(self, lineas: List[str], nombre: str, ayuda: str, histogramas: dict):
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} histogram")
+        for (metodo, ruta), histograma in sorted(histogramas.items()):
+            limites = [_numero(l) for l in histograma.limites] + ["+Inf"]
+            for limite, acumulado in zip(limites, histograma.acumulados()):
+                lineas.append(f"{nombre}_bucket{_etiquetas(method=metodo, route=ruta, le=limite)} {acumulado}")
+            lineas.append(f"{nombre}_sum{_etiquetas(method=metodo, route=ruta)} {_numero(histograma.suma)}")
+            lineas.append(f"{nombre}_count{_etiquetas(method=metodo, route=ruta)} {histograma.total}")
+
+    def exportar(self) -> str:
+        with self._lock:
+            lineas = ["# HELP http_requests_total Peticiones HTTP atendidas por ruta, método y código de estado",
+                      "# TYPE http_requests_total counter"]
+            for (metodo, ruta, estado), total in sorted(self._peticiones.items()):
+                lineas.append(f"http_requests_total{_etiquetas(method=metodo, route=ruta, status=estado)} {total}")
+
+            self._exportar_histograma(lineas, "http_request_duration_seconds",
+                                      "Duración de las peticiones HTTP", self._latencia)
+
+            lineas.append("# HELP http_request_duration_quantile_seconds "
+                          "p50/p95/p99 de la duración, estimados a partir de los buckets")
+            lineas.append("# TYPE http_request_duration_quantile_seconds gauge")
+            for (metodo, ruta), histograma in sorted(self._latencia.items()):
+                for q in CUANTILES:
+                    valor = _numero(round(histograma.cuantil(q), 6))
+                    lineas.append(
+                        f"http_request_duration_quantile_seconds{_etiquetas(method=metodo, route=ruta, quantile=q)} {valor}"
+                    )
+
+            self._exportar_histograma(lineas, "http_request_db_queries",
+                                      "Consultas SQL ejecutadas por petición", self._consultas)
+            self._exportar_histograma(lineas, "http_request_db_seconds",
+                                      "Tiempo en la base de datos por petición", self._tiempo_bd)
+        return "\n".join(lineas) + "\n"
+
+
+class ContadorConsultasMiddleware:
+    """
+    Middleware ASGI que cuenta las consultas SQL de cada petición y las
+    devuelve en la cabecera X-Query-Count.
+
+    El contador es un objeto mutable guardado en un ContextVar, así que también
+    lo ven los endpoints síncronos que FastAPI ejecuta en el threadpool.
+
+    Con `metricas`, registra además la latencia, el código de estado, las consultas
+    y el tiempo en la base de datos de cada petición por ruta.
+    """
+
+    def __init__(self, app, metricas: Optional[MetricasHTTP] = None):
+        self.app = app
+        self.metricas = metricas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        contador = ContadorConsultas(scope)
+        token = _contador_actual.set(contador)
+        inicio = time.perf_counter()
+        estado = 500
+
+        async def enviar(message):
+            nonlocal estado
+            if message["type"] == "http.response.start":
+                estado = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers[CABECERA_CONSULTAS] = str(contador.consultas)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _contador_actual.reset(token)
+            if self.metricas is not None:
+                # FastAPI deja la ruta encontrada en el scope; las rutas inexistentes se agrupan
+                ruta = scope.get("route")
+                self.metricas.registrar(
+                    scope["method"], getattr(ruta, "path", "sin_ruta"), estado,
+                    time.perf_counter() - inicio, contador
+                )
+
+
+class EstadisticasPool:
+    """
+    Contadores del pool de conexiones de un engine.
+
+    Los conteos de checkout/checkin/conexiones/invalidaciones vienen de los eventos
+    del pool; la latencia de checkout y las esperas los mide la clase de pool
+    creada con pool_con_metricas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.conexiones_creadas = 0
+        self.invalidaciones = 0
+        self.esperas = 0
+        self.tiempos_agotados = 0
+        self.checkout_segundos_total = 0.0
+        self.checkout_segundos_max = 0.0
+        self.checkouts_medidos = 0
+
+    def registrar_checkout(self, segundos: float, espero: bool):
+        with self._lock:
+            self.checkouts_medidos += 1
+            self.checkout_segundos_total += segundos
+            if segundos > self.checkout_segundos_max:
+                self.checkout_segundos_max = segundos
+            if espero:
+                self.esperas += 1
+
+    def registrar_agotado(self):
+        with self._lock:
+            self.tiempos_agotados += 1
+            self.esperas += 1
+
+    def instalar_eventos(self, engine):
+        """
+        Escucha los eventos de pool del engine (sobreviven a engine.dispose()).
+        """
+        def al_conectar(dbapi_connection, connection_record):
+            self.conexiones_creadas += 1
+
+        def al_checkout(dbapi_connection, connection_record, connection_proxy):
+            self.checkouts += 1
+
+        def al_checkin(dbapi_connection, connection_record):
+            self.checkins += 1
+
+        def al_invalidar(dbapi_connection, connection_record, exception):
+            self.invalidaciones += 1
+
+        event.listen(engine, "connect", al_conectar)
+        event.listen(engine, "checkout", al_checkout)
+        event.listen(engine, "checkin", al_checkin)
+        event.listen(engine, "invalidate", al_invalidar)
+
+    def resumen(self, pool) -> dict:
+        datos = {
+            "clase": type(pool).__name__,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "conexiones_creadas": self.conexiones_creadas,
+            "invalidaciones": self.invalidaciones,
+            "esperas": self.esperas,
+            "tiempos_agotados": self.tiempos_agotados,
+            "checkout_ms_promedio": round(1000 * self.checkout_segundos_total / self.checkouts_medidos, 3)
+            if self.checkouts_medidos else 0.0,
+            "checkout_ms_max": round(1000 * self.checkout_segundos_max, 3),
+        }
+        # QueuePool expone el estado actual del pool
+        if hasattr(pool, "checkedout"):
+            datos.update({
+                "tamano": pool.size(),
+                "en_uso": pool.checkedout(),
+                "libres": pool.checkedin(),
+                "overflow": pool.overflow(),
+            })
+        return datos
+
+
+def configuracion_pool(opciones: dict) -> Optional[dict]:
+    """
+    Parámetros del pool que se pasaron a create_engine (las opciones de opciones_pool, sin la
+    clase). None si el engine usa el pool por defecto de SQLAlchemy, como con SQLite.
+    """
+    return {nombre: valor for nombre, valor in opciones.items() if nombre != "poolclass"} or None
+
+
+def pool_con_metricas(clase_pool, estadisticas: EstadisticasPool, max_overflow: int):
+    """
+    Crea una subclase del pool que mide cuánto tarda cada checkout y si tuvo que esperar
+    (sin conexiones libres y sin margen de overflow). recreate() usa la misma clase,
+    así que las estadísticas se conservan tras engine.dispose().
+    """
+
+    class PoolConMetricas(clase_pool):
+        def connect(self):
+            espero = self.checkedin() == 0 and self.overflow() >= max_overflow
+            inicio = time.perf_counter()
+            try:
+                conexion = super().connect()
+            except exc.TimeoutError:
+                estadisticas.registrar_agotado()
+                raise
+            estadisticas.registrar_checkout(time.perf_counter() - inicio, espero)
+            return conexion
+
+    PoolConMetricas.__name__ = f"{clase_pool.__name__}ConMetricas"
+    return PoolConMetricas
@@ -0,0 +1,245 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+
+# Cabecera que pide perfilar la petición y cabecera de respuesta con el id del perfil
+CABECERA_PERFIL = "X-Perfil"
+CABECERA_PERFIL_ID = "X-Perfil-Id"
+
+# Archivos que se guardan por perfil
+EXTENSIONES = (".json", ".pstats", ".collapsed")
+
+
+class PerfilPeticion:
+    """
+    Perfil de una sola petición: cProfile (para pstats) en cada hilo por el que pasa
+    y un muestreador de pilas (para el archivo "collapsed" de los flamegraphs).
+
+    El hilo del event loop se perfila desde el middleware; los endpoints síncronos que
+    corren en el threadpool entran con `ejecutar` (ver main.con_bd).
+    """
+
+    def __init__(self, id_perfil: str, ruta: str, intervalo: float = 0.001):
+        self.id = id_perfil
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._perfiles: List[cProfile.Profile] = []
+        # Hilos que se están muestreando (id del hilo -> profundidad de anidamiento)
+        self._hilos: Dict[int, int] = {}
+        self._pilas: Counter = Counter()
+        self._activo = threading.Event()
+        self._muestreador: Optional[threading.Thread] = None
+        self.inicio = time.time()
+        self.segundos = 0.0
+
+    def _muestrear(self):
+        propio = threading.get_ident()
+        while not self._activo.wait(self.intervalo):
+            frames = sys._current_frames()
+            with self._lock:
+                hilos = list(self._hilos)
+            for hilo in hilos:
+                frame = frames.get(hilo)
+                if frame is None or hilo == propio:
+                    continue
+                pila = []
+                while frame is not None:
+                    codigo = frame.f_code
+                    pila.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                    frame = frame.f_back
+                self._pilas[";".join(reversed(pila))] += 1
+
+    def iniciar(self):
+        self._muestreador = threading.Thread(target=self._muestrear, name=f"perfil-{self.id}", daemon=True)
+        self._muestreador.start()
+
+    def entrar(self) -> Optional[cProfile.Profile]:
+        """
+        Empieza a perfilar el hilo actual. Devuelve None si el intérprete no admite otro
+        perfilador (desde Python 3.12 cProfile ya cubre todos los hilos).
+        """
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            perfil = None
+        with self._lock:
+            if perfil is not None:
+                self._perfiles.append(perfil)
+            hilo = threading.get_ident()
+            self._hilos[hilo] = self._hilos.get(hilo, 0) + 1
+        return perfil
+
+    def salir(self, perfil: Optional[cProfile.Profile]):
+        if perfil is not None:
+            perfil.disable()
+        with self._lock:
+            hilo = threading.get_ident()
+            self._hilos[hilo] -= 1
+            if not self._hilos[hilo]:
+                del self._hilos[hilo]
+
+    def ejecutar(self, funcion, *args, **kwargs):
+        """
+        Ejecuta una función síncrona perfilando el hilo en el que corre.
+        """
+        perfil = self.entrar()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            self.salir(perfil)
+
+    def detener(self):
+        self._activo.set()
+        if self._muestreador is not None:
+            self._muestreador.join()
+        self.segundos = time.time() - self.inicio
+
+    def guardar(self, directorio: str, estado: int):
+        """
+        Escribe <id>.pstats (cProfile), <id>.collapsed ("pila;de;llamadas muestras" por línea)
+        y <id>.json con la ruta, el código de estado y la duración.
+        """
+        os.makedirs(directorio, exist_ok=True)
+        base = os.path.join(directorio, self.id)
+        with open(base + ".json", "w", encoding="utf-8") as archivo:
+            json.dump({
+                "id": self.id,
+                "ruta": self.ruta,
+                "estado": estado,
+                "inicio": datetime.fromtimestamp(self.inicio).isoformat(timespec="seconds"),
+                "milisegundos": round(self.segundos * 1000, 3),
+                "muestras": sum(self._pilas.values()),
+            }, archivo, ensure_ascii=False)
+        if self._perfiles:
+            estadisticas = pstats.Stats(self._perfiles[0])
+            for perfil in self._perfiles[1:]:
+                estadisticas.add(perfil)
+            estadisticas.dump_stats(base + ".pstats")
+        with open(base + ".collapsed", "w", encoding="utf-8") as archivo:
+            for pila, muestras in self._pilas.most_common():
+                archivo.write(f"{pila} {muestras}\n")
+
+
+# Perfil de la petición en curso (None si no se está perfilando)
+_perfil_actual: ContextVar[Optional[PerfilPeticion]] = ContextVar("perfil_actual", default=None)
+
+
+def perfil_actual() -> Optional[PerfilPeticion]:
+    return _perfil_actual.get()
+
+
+class PerfiladorMiddleware:
+    """
+    Middleware ASGI que perfila las peticiones que traen la cabecera X-Perfil (con el valor
+    de `token`, si se configuró) o que salen elegidas con probabilidad `muestreo`.
+
+    El perfil se guarda en `directorio` al terminar la respuesta y su id se devuelve en
+    X-Perfil-Id. Se perfila una petición a la vez por proceso: si ya hay una en curso, las
+    demás se atienden sin perfilar. Las peticiones no perfiladas sólo pagan la revisión
+    de la cabecera.
+
+    Limitación: en el hilo del event loop, cProfile y el muestreador registran todo lo que
+    corre mientras la petición está en curso, también las corrutinas de otras peticiones
+    concurrentes, así que el .pstats y el .collapsed las mezclan. Lo que corre en el
+    threadpool con `ejecutar` (los endpoints de con_bd en modo sync) sí es sólo de esta
+    petición. Para un perfil limpio del event loop, perfilar con el proceso sin otra carga.
+    """
+
+    def __init__(self, app, directorio: str, token: str = "", muestreo: float = 0.0,
+                 intervalo: float = 0.001, max_perfiles: int = 100):
+        self.app = app
+        self.directorio = directorio
+        self.token = token.encode()
+        self.muestreo = muestreo
+        self.intervalo = intervalo
+        self.max_perfiles = max_perfiles
+        self._en_curso = threading.Lock()
+
+    def _solicitado(self, scope) -> bool:
+        nombre = CABECERA_PERFIL.lower().encode()
+        for clave, valor in scope["headers"]:
+            if clave == nombre:
+                return valor == self.token if self.token else valor not in (b"", b"0", b"false")
+        return self.muestreo > 0 and random.random() < self.muestreo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._solicitado(scope) or not self._en_curso.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        id_perfil = datetime.now().strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+        perfil = PerfilPeticion(id_perfil, f"{scope['method']} {scope['path']}", self.intervalo)
+
+        estado = 500
+
+        async def enviar(message):
+            nonlocal estado
+            if message["type"] == "http.response.start":
+                estado = message["status"]
+                MutableHeaders(scope=message)[CABECERA_PERFIL_ID] = id_perfil
+            await send(message)
+
+        token = _perfil_actual.set(perfil)
+        perfil.iniciar()
+        perfil_loop = perfil.entrar()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            perfil.salir(perfil_loop)
+            perfil.detener()
+            _perfil_actual.reset(token)
+            try:
+                # La respuesta ya se envió; escribir los archivos fuera del event loop
+                await run_in_threadpool(self._guardar, perfil, estado)
+            finally:
+                self._en_curso.release()
+
+    def _guardar(self, perfil: PerfilPeticion, estado: int):
+        perfil.guardar(self.directorio, estado)
+        # Conserva sólo los `max_perfiles` más recientes (los ids empiezan con la fecha)
+        ids = sorted({os.path.splitext(nombre)[0] for nombre in os.listdir(self.directorio)})
+        for viejo in ids[:max(0, len(ids) - self.max_perfiles)]:
+            for extension in EXTENSIONES:
+                ruta = os.path.join(self.directorio, viejo + extension)
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+
+
+def listar_perfiles(directorio: str) -> List[dict]:
+    """
+    Resumen de los perfiles guardados en `directorio`, del más reciente al más antiguo.
+    """
+    if not os.path.isdir(directorio):
+        return []
+    perfiles = []
+    for nombre in sorted(os.listdir(directorio), reverse=True):
+        if nombre.endswith(".json"):
+            with open(os.path.join(directorio, nombre), encoding="utf-8") as archivo:
+                perfiles.append(json.load(archivo))
+    return perfiles
+
+
+def resumen_pstats(ruta: str, orden: str = "cumulative", limite: int = 40) -> str:
+    """
+    Tabla de texto de pstats con las `limite` funciones principales según `orden`.
+    """
+    salida = io.StringIO()
+    estadisticas = pstats.Stats(ruta, stream=salida)
+    estadisticas.strip_dirs().sort_stats(orden).print_stats(limite)
+    return salida.getvalue()
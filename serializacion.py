@@ -0,0 +1,28 @@
+import functools
+import inspect
+
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+
+def respuesta_rapida(endpoint):
+    """
+    Decorador para endpoints de listas que ya devuelven dicts con la forma del esquema de
+    respuesta: los codifica con orjson y devuelve la respuesta directamente, sin validar cada
+    fila con response_model ni pasar por jsonable_encoder. El response_model de la ruta sigue
+    documentando el contrato en /docs.
+
+    Las cabeceras que agregan las dependencias (p. ej. el ETag) se copian a la respuesta.
+    """
+    @functools.wraps(endpoint)
+    async def envoltura(*, response: Response, **kwargs):
+        contenido = await endpoint(**kwargs)
+        return ORJSONResponse(contenido, headers=dict(response.headers))
+
+    # FastAPI lee la firma para inyectar dependencias: se agrega el parámetro `response`
+    firma = inspect.signature(endpoint)
+    envoltura.__signature__ = firma.replace(parameters=[
+        *firma.parameters.values(),
+        inspect.Parameter("response", inspect.Parameter.KEYWORD_ONLY, annotation=Response),
+    ])
+    return envoltura
@@ -0,0 +1,40 @@
+"""
+Las pruebas usan una base SQLite temporal con los datos de ejemplo de bootstrap.py.
+
+    pip install -r requirements-dev.txt
+    python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+DIRECTORIO_PRUEBAS = tempfile.mkdtemp(prefix="cafeteria-pruebas-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DIRECTORIO_PRUEBAS, 'cafeteria.db')}"
+# test_modo_async.py vuelve a correr algunos módulos con DB_MODO=async
+os.environ.setdefault("DB_MODO", "sync")
+# Un solo proceso: los cambios se aplican al hacer commit, sin sondeo
+os.environ["COHERENCIA_INTERVALO"] = "0"
+os.environ["CONSULTA_LENTA_ARCHIVO"] = ""
+os.environ["PERFIL_HABILITADO"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bootstrap  # noqa: E402
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+bootstrap.ejecutar_bootstrap()
+
+
+@pytest.fixture(scope="session")
+def cliente():
+    with TestClient(main.app) as cliente:
+        yield cliente
+
+
+@pytest.fixture
+def sin_cache(monkeypatch):
+    # Para medir las consultas de cada petición y no los aciertos de la caché
+    monkeypatch.setattr(main.cache_catalogo, "habilitado", False)
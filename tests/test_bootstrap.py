@@ -0,0 +1,43 @@
+"""
+bootstrap.py: versiones del esquema y bloqueo entre ejecuciones concurrentes.
+"""
+import pytest
+from sqlalchemy import create_engine, event
+
+import bootstrap
+
+
+def motor_con_bloqueo(ruta, resultado_bloqueo: int, llamadas: list):
+    """
+    Engine SQLite que se hace pasar por MySQL y define GET_LOCK / RELEASE_LOCK, anotando en
+    `llamadas` la conexión en la que se ejecuta cada una.
+    """
+    motor = create_engine(f"sqlite:///{ruta}")
+
+    @event.listens_for(motor, "connect")
+    def definir_funciones(conexion, _registro):
+        conexion.create_function("GET_LOCK", 2, lambda *_: llamadas.append(("GET_LOCK", id(conexion))) or resultado_bloqueo)
+        conexion.create_function("RELEASE_LOCK", 1, lambda *_: llamadas.append(("RELEASE_LOCK", id(conexion))) or 1)
+
+    motor.dialect.name = "mysql"
+    return motor
+
+
+def test_migra_con_el_bloqueo_en_una_sola_conexion(tmp_path):
+    llamadas = []
+    motor = motor_con_bloqueo(tmp_path / "bloqueo.db", 1, llamadas)
+    assert bootstrap.ejecutar_bootstrap(con_datos=False, motor=motor) == bootstrap.ESQUEMA_VERSION
+    assert [nombre for nombre, _ in llamadas] == ["GET_LOCK", "RELEASE_LOCK"]
+    assert llamadas[0][1] == llamadas[1][1]
+    # Idempotente: una segunda ejecución no aplica nada
+    assert bootstrap.ejecutar_bootstrap(con_datos=False, motor=motor) == bootstrap.ESQUEMA_VERSION
+
+
+def test_sin_bloqueo_no_migra(tmp_path):
+    llamadas = []
+    motor = motor_con_bloqueo(tmp_path / "bloqueo.db", 0, llamadas)
+    with pytest.raises(RuntimeError):
+        bootstrap.ejecutar_bootstrap(con_datos=False, motor=motor)
+    assert [nombre for nombre, _ in llamadas] == ["GET_LOCK"]
+    with motor.connect() as conexion:
+        assert not motor.dialect.has_table(conexion, "esquema_version")
@@ -0,0 +1,61 @@
+"""
+Índice de búsqueda: los productos y postres se encuentran también por el texto de su categoría.
+"""
+import json
+
+from sqlalchemy import update
+
+import main
+
+
+def ids_encontrados(cliente, termino: str):
+    datos = cliente.get(f"/buscar/{termino}").json()
+    return {("producto", p["id"]) for p in datos["productos"]} | {("postre", p["id"]) for p in datos["postres"]}
+
+
+def ids_de_categoria(cliente, categoria_id: int):
+    return {("producto", p["id"]) for p in cliente.get(f"/productos/categoria/{categoria_id}").json()} | \
+        {("postre", p["id"]) for p in cliente.get(f"/postres/categoria/{categoria_id}").json()}
+
+
+def test_importar_categoria_reindexa_sus_productos(cliente):
+    nombre = cliente.get("/categorias/").json()[0]
+    registro = json.dumps({"nombre": nombre["nombre"], "descripcion": "Especialidad xochimilca"})
+    respuesta = cliente.post(
+        "/import", params={"tipo": "categorias", "formato": "ndjson"},
+        files={"archivo": ("categorias.ndjson", registro + "\n", "application/x-ndjson")},
+    )
+    assert respuesta.status_code == 200
+    miembros = ids_de_categoria(cliente, nombre["id"])
+    assert miembros
+    assert ids_encontrados(cliente, "xochimilca") == miembros
+
+
+def test_reindexar_categoria_desde_otro_proceso(cliente):
+    # El sondeo de otro proceso llama a reindexar("categoria", ids) tras un cambio de categoría
+    categoria_id = 8
+    with main.SessionLocal() as db:
+        db.execute(update(main.Categoria).where(main.Categoria.id == categoria_id).values(descripcion="Repostería tlaxcalteca"))
+        db.commit()
+        assert not ids_encontrados(cliente, "tlaxcalteca")
+        main.reindexar(db, "categoria", [categoria_id])
+    miembros = ids_de_categoria(cliente, categoria_id)
+    assert miembros
+    assert ids_encontrados(cliente, "tlaxcalteca") == miembros
+
+
+def test_indice_se_actualiza_antes_que_la_version(cliente, monkeypatch):
+    # Una búsqueda que ya ve la versión nueva (y su ETag) tiene que ver también el índice nuevo
+    vistos = []
+    avanzar_version = main.avanzar_version
+
+    def avanzar_y_registrar(cambio):
+        vistos.append((cambio["accion"], main.indice_busqueda.buscar("quintanarroense")))
+        return avanzar_version(cambio)
+
+    monkeypatch.setattr(main, "avanzar_version", avanzar_y_registrar)
+    creado = cliente.post("/productos/", json={
+        "nombre": "Marquesita quintanarroense", "descripcion": "De la costa", "categoria_id": 1, "precio": 30.0,
+    }).json()
+    cliente.delete(f"/productos/{creado['id']}")
+    assert vistos == [("creado", {("producto", creado["id"])}), ("borrado", set())]
@@ -0,0 +1,35 @@
+"""
+Caché del catálogo: una escritura invalida sólo las entradas con sus etiquetas.
+"""
+from metricas import CABECERA_CONSULTAS
+
+
+def leer(cliente, ruta: str):
+    respuesta = cliente.get(ruta)
+    assert respuesta.status_code == 200
+    return respuesta.json(), int(respuesta.headers[CABECERA_CONSULTAS])
+
+
+def test_escritura_invalida_sus_etiquetas(cliente):
+    productos = cliente.get("/productos/?limit=1000").json()
+    producto = productos[0]
+    otro = next(p for p in productos if p["categoria_id"] != producto["categoria_id"])
+    rutas = [
+        f"/productos/{producto['id']}", f"/productos/categoria/{producto['categoria_id']}",
+        f"/productos/{otro['id']}", f"/productos/categoria/{otro['categoria_id']}", "/categorias/",
+    ]
+    for ruta in rutas:
+        leer(cliente, ruta)
+    # Segunda lectura: todas desde la caché, sin consultas
+    assert [leer(cliente, ruta)[1] for ruta in rutas] == [0] * len(rutas)
+
+    nuevo_precio = producto["precio"] + 1
+    assert cliente.put(f"/productos/{producto['id']}", json={"precio": nuevo_precio}).status_code == 200
+
+    detalle, consultas_detalle = leer(cliente, rutas[0])
+    listado, consultas_listado = leer(cliente, rutas[1])
+    assert consultas_detalle > 0 and consultas_listado > 0
+    assert detalle["precio"] == nuevo_precio
+    assert next(p for p in listado if p["id"] == producto["id"])["precio"] == nuevo_precio
+    # Lo que no comparte etiquetas con el producto sigue en la caché
+    assert [leer(cliente, ruta)[1] for ruta in rutas[2:]] == [0, 0, 0]
@@ -0,0 +1,50 @@
+"""
+Proyección con fields=: sólo los campos pedidos (más el id) y 400 con campos desconocidos.
+"""
+import pytest
+
+RUTAS = [
+    ("/productos/?limit=5", "producto"),
+    ("/productos/?cursor=&limit=5", "producto"),
+    ("/postres/?limit=5", "postre"),
+    ("/productos/categoria/1", "producto"),
+    ("/postres/categoria/8", "postre"),
+    ("/productos/{}/postres", "postre"),
+    ("/postres/1/productos", "producto"),
+]
+CAMPOS = {"producto": "precio, nombre", "postre": "precio_rebanada,nombre"}
+
+
+def resolver(cliente, ruta: str) -> str:
+    # Un producto con postres vinculados
+    return ruta.format(cliente.get("/postres/1/productos").json()[0]["id"]) if "{}" in ruta else ruta
+
+
+def items(datos):
+    return datos["items"] if isinstance(datos, dict) else datos
+
+
+@pytest.mark.parametrize("ruta,tipo", RUTAS)
+def test_solo_los_campos_pedidos(cliente, ruta, tipo):
+    ruta = resolver(cliente, ruta)
+    completos = items(cliente.get(ruta).json())
+    respuesta = cliente.get(ruta, params={"fields": CAMPOS[tipo]})
+    assert respuesta.status_code == 200
+    proyectados = items(respuesta.json())
+    assert proyectados
+    esperados = {"id"} | {campo.strip() for campo in CAMPOS[tipo].split(",")}
+    assert all(set(item) == esperados for item in proyectados)
+    assert proyectados == [{campo: item[campo] for campo in esperados} for item in completos]
+
+
+def test_categoria_anidada(cliente):
+    item = cliente.get("/productos/?limit=1", params={"fields": "categoria_rel"}).json()[0]
+    assert set(item) == {"id", "categoria_rel"}
+    assert set(item["categoria_rel"]) == {"id", "nombre", "descripcion"}
+
+
+@pytest.mark.parametrize("ruta,tipo", RUTAS)
+def test_campos_desconocidos(cliente, ruta, tipo):
+    respuesta = cliente.get(resolver(cliente, ruta), params={"fields": "nombre,costo_secreto"})
+    assert respuesta.status_code == 400
+    assert "costo_secreto" in respuesta.json()["detail"]
@@ -0,0 +1,99 @@
+"""
+Coalescencia de lecturas ("single flight"): las peticiones idénticas simultáneas comparten una ejecución.
+"""
+import asyncio
+
+import httpx
+
+import main
+from coalescencia import CoalescenciaLecturas
+
+
+def test_una_ejecucion_para_peticiones_identicas():
+    async def probar():
+        coalescencia = CoalescenciaLecturas()
+        llamadas = []
+
+        async def consulta(valor):
+            llamadas.append(valor)
+            await asyncio.sleep(0.05)
+            return {"valor": valor}
+
+        resultados = await asyncio.gather(*[coalescencia.ejecutar("g", "a", consulta, valor=1) for _ in range(5)])
+        return coalescencia, llamadas, resultados
+
+    coalescencia, llamadas, resultados = asyncio.run(probar())
+    assert llamadas == [1]
+    assert resultados == [{"valor": 1}] * 5
+    assert coalescencia.estadisticas()["grupos"]["g"] == {"ejecutadas": 1, "coalescidas": 4}
+    assert coalescencia.estadisticas()["en_curso"] == 0
+
+
+def test_claves_y_versiones_distintas_no_se_agrupan():
+    async def probar():
+        version = [1]
+        coalescencia = CoalescenciaLecturas(lambda: version[0])
+        llamadas = []
+
+        async def consulta(valor):
+            llamadas.append(valor)
+            await asyncio.sleep(0.05)
+            return valor
+
+        primera = asyncio.ensure_future(coalescencia.ejecutar("g", "a", consulta, valor="a"))
+        otra_clave = asyncio.ensure_future(coalescencia.ejecutar("g", "b", consulta, valor="b"))
+        await asyncio.sleep(0)
+        # Tras un cambio del catálogo, una petición nueva no se une a la consulta anterior
+        version[0] = 2
+        nueva_version = asyncio.ensure_future(coalescencia.ejecutar("g", "a", consulta, valor="a2"))
+        return await asyncio.gather(primera, otra_clave, nueva_version), llamadas
+
+    resultados, llamadas = asyncio.run(probar())
+    assert resultados == ["a", "b", "a2"]
+    assert sorted(llamadas) == ["a", "a2", "b"]
+
+
+def test_error_compartido_y_cancelacion_del_lider():
+    async def probar():
+        coalescencia = CoalescenciaLecturas()
+        llamadas = []
+
+        async def falla():
+            llamadas.append("falla")
+            await asyncio.sleep(0.05)
+            raise ValueError("consulta fallida")
+
+        errores = await asyncio.gather(*[coalescencia.ejecutar("g", "x", falla) for _ in range(3)], return_exceptions=True)
+
+        async def lenta():
+            llamadas.append("lenta")
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        lider = asyncio.ensure_future(coalescencia.ejecutar("g", "y", lenta))
+        await asyncio.sleep(0)
+        seguidor = asyncio.ensure_future(coalescencia.ejecutar("g", "y", lenta))
+        await asyncio.sleep(0)
+        lider.cancel()
+        # El seguidor toma el lugar del líder cancelado y ejecuta la consulta
+        return errores, await seguidor, llamadas
+
+    errores, resultado, llamadas = asyncio.run(probar())
+    assert [type(e) for e in errores] == [ValueError] * 3
+    assert resultado == "ok"
+    assert llamadas == ["falla", "lenta", "lenta"]
+
+
+def test_endpoint_agrupa_lecturas_simultaneas(cliente, sin_cache):
+    async def pedir(cantidad):
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://pruebas") as cliente_async:
+            return await asyncio.gather(*[cliente_async.get("/buscar/pastel?limit=7") for _ in range(cantidad)])
+
+    antes = main.coalescencia_lecturas.estadisticas()["grupos"].get("/buscar", {"ejecutadas": 0, "coalescidas": 0})
+    respuestas = cliente.portal.call(pedir, 6)
+    despues = main.coalescencia_lecturas.estadisticas()["grupos"]["/buscar"]
+    assert {r.status_code for r in respuestas} == {200}
+    assert len({r.content for r in respuestas}) == 1
+    assert despues["ejecutadas"] - antes["ejecutadas"] == 1
+    assert despues["coalescidas"] - antes["coalescidas"] == 5
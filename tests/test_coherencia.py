@@ -0,0 +1,119 @@
+"""
+Secuencia de versiones del catálogo: dentro de un proceso (hooks after_commit de varios
+hilos) y entre varios workers que comparten la base de datos.
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+import main
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def version_en_bd() -> int:
+    with main.SessionLocal() as db:
+        return db.execute(select(main.CatalogoVersion.version).where(main.CatalogoVersion.id == 1)).scalar_one()
+
+
+def test_cambio_adelantado_espera_al_anterior(cliente):
+    aplicada = main.version_catalogo.aplicada
+    base = {"tipo": "producto", "accion": "actualizado", "ids": [], "categorias": [], "vinculos": None}
+    # El hook del cambio siguiente corre antes que el del anterior
+    assert not main.avanzar_version({**base, "version": aplicada + 2})
+    assert main.version_catalogo.aplicada == aplicada
+    assert main.version_catalogo.etag() is None
+    assert main.avanzar_version({**base, "version": aplicada + 1})
+    assert main.version_catalogo.aplicada == main.version_catalogo.conocida == aplicada + 2
+    assert not main._cambios_adelantados
+    # Devolver la base de datos a la misma versión que el proceso
+    with main.SessionLocal() as db:
+        db.execute(main.update(main.CatalogoVersion).where(main.CatalogoVersion.id == 1)
+                   .values(version=aplicada + 2))
+        db.commit()
+
+
+def test_escrituras_concurrentes_convergen(cliente):
+    ids = [item["id"] for item in cliente.get("/productos/?limit=8").json()]
+
+    def escribir(id_):
+        for i in range(10):
+            respuesta = cliente.put(f"/productos/{id_}", json={"precio": 10 + i})
+            assert respuesta.status_code == 200
+
+    with ThreadPoolExecutor(len(ids)) as hilos:
+        list(hilos.map(escribir, ids))
+
+    version = version_en_bd()
+    assert main.version_catalogo.aplicada == main.version_catalogo.conocida == version
+    assert not main._cambios_adelantados
+    respuesta = cliente.get("/productos/")
+    assert respuesta.headers["ETag"].endswith(f'-{version}"')
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar(condicion, segundos=15):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        try:
+            if condicion():
+                return True
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    return False
+
+
+@pytest.fixture
+def workers(tmp_path):
+    entorno = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'cafeteria.db'}",
+        "COHERENCIA_INTERVALO": "0.2",
+    }
+    subprocess.run([sys.executable, "bootstrap.py"], cwd=RAIZ, env=entorno, check=True, capture_output=True)
+    urls, procesos = [], []
+    for _ in range(2):
+        puerto = puerto_libre()
+        procesos.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto), "--log-level", "warning"],
+            cwd=RAIZ, env=entorno,
+        ))
+        urls.append(f"http://127.0.0.1:{puerto}")
+    try:
+        for url in urls:
+            assert esperar(lambda: httpx.get(f"{url}/").status_code == 200)
+        yield urls
+    finally:
+        for proceso in procesos:
+            proceso.terminate()
+            proceso.wait(timeout=10)
+
+
+def test_workers_convergen(workers):
+    escritor, lector = workers
+    producto = httpx.get(f"{lector}/productos/1").json()
+    for i in range(5):
+        respuesta = httpx.put(f"{escritor}/productos/1", json={"nombre": f"{producto['nombre']} {i}"})
+        assert respuesta.status_code == 200
+    etag = httpx.get(f"{escritor}/productos/1").headers["ETag"]
+
+    def convergio():
+        respuesta = httpx.get(f"{lector}/productos/1")
+        return respuesta.json()["nombre"] == f"{producto['nombre']} 4" and respuesta.headers.get("ETag") == etag
+
+    assert esperar(convergio)
+    coherencia = httpx.get(f"{lector}/admin/coherencia").json()
+    assert coherencia["version_aplicada"] == coherencia["version_conocida"]
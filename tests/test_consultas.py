@@ -0,0 +1,63 @@
+"""
+Regresiones N+1: el número de consultas SQL por petición (cabecera X-Query-Count) no
+depende de cuántas filas devuelve.
+"""
+from metricas import CABECERA_CONSULTAS
+
+RUTAS = [
+    "/productos/?limit=500",
+    "/productos/?cursor=&limit=500",
+    "/postres/?limit=500",
+    "/productos/categoria/1",
+    "/postres/categoria/8",
+    "/productos/1",
+    "/postres/1",
+    "/productos/1/postres",
+    "/postres/1/productos",
+    "/buscar/torta",
+    "/buscar/pastel?orden=-precio&limit=100",
+]
+
+
+def consultas(cliente, ruta: str) -> int:
+    respuesta = cliente.get(ruta)
+    assert respuesta.status_code == 200, respuesta.text
+    return int(respuesta.headers[CABECERA_CONSULTAS])
+
+
+def filas(cliente, ruta: str) -> int:
+    datos = cliente.get(ruta).json()
+    if isinstance(datos, dict):
+        datos = datos.get("items") or datos.get("productos", []) + datos.get("postres", [])
+    return len(datos)
+
+
+def test_consultas_no_dependen_de_las_filas(cliente, sin_cache):
+    antes = {ruta: consultas(cliente, ruta) for ruta in RUTAS}
+    filas_antes = {ruta: filas(cliente, ruta) for ruta in RUTAS}
+
+    postres = cliente.post("/postres/bulk", json=[
+        {"nombre": f"Pastel de prueba {i}", "descripcion": "Pastel para las pruebas", "categoria_id": 8,
+         "rebanadas": 8, "precio_rebanada": 30.0, "precio_total": 240.0, "productos_ids": [1]}
+        for i in range(20)
+    ]).json()
+    ids_postres = [resultado["id"] for resultado in postres["resultados"]]
+    assert postres["errores"] == 0
+    productos = cliente.post("/productos/bulk", json=[
+        {"nombre": f"Torta de prueba {i}", "categoria_id": 1, "descripcion": "Torta para las pruebas",
+         "precio": 50.0, "postres_ids": ids_postres + [1]}
+        for i in range(20)
+    ]).json()
+    assert productos["errores"] == 0
+
+    despues = {ruta: consultas(cliente, ruta) for ruta in RUTAS}
+    for ruta in RUTAS:
+        if ruta not in ("/productos/1", "/postres/1"):
+            assert filas(cliente, ruta) > filas_antes[ruta], ruta
+    assert despues == antes
+
+
+def test_cabecera_en_cada_respuesta(cliente):
+    respuesta = cliente.get("/productos/999999")
+    assert respuesta.status_code == 404
+    assert int(respuesta.headers[CABECERA_CONSULTAS]) >= 1
@@ -0,0 +1,50 @@
+"""
+Altas, lecturas, cambios y bajas de categorías, productos y postres.
+"""
+
+
+def test_crud_producto(cliente):
+    creado = cliente.post("/productos/", json={
+        "nombre": "Tamal de prueba", "descripcion": "Tamal para las pruebas", "categoria_id": 1, "precio": 25.0,
+        "postres_ids": [1],
+    })
+    assert creado.status_code == 200, creado.text
+    producto = creado.json()
+    assert producto["categoria_rel"]["id"] == 1
+    assert cliente.get(f"/productos/{producto['id']}").json()["nombre"] == "Tamal de prueba"
+    assert producto["id"] in {p["id"] for p in cliente.get("/postres/1/productos").json()}
+
+    actualizado = cliente.put(f"/productos/{producto['id']}", json={"precio": 27.5, "postres_ids": []}).json()
+    assert actualizado["precio"] == 27.5
+    assert producto["id"] not in {p["id"] for p in cliente.get("/postres/1/productos").json()}
+
+    assert cliente.delete(f"/productos/{producto['id']}").status_code == 200
+    assert cliente.get(f"/productos/{producto['id']}").status_code == 404
+    assert cliente.delete(f"/productos/{producto['id']}").status_code == 404
+
+
+def test_crud_postre(cliente):
+    postre = cliente.post("/postres/", json={
+        "nombre": "Flan de prueba", "descripcion": "Flan para las pruebas", "categoria_id": 8,
+        "rebanadas": 8, "precio_rebanada": 20.0, "precio_total": 1.0, "productos_ids": [1],
+    }).json()
+    # precio_total se recalcula con las rebanadas
+    assert postre["precio_total"] == 160.0
+    actualizado = cliente.put(f"/postres/{postre['id']}", json={"rebanadas": 10}).json()
+    assert actualizado["precio_total"] == 200.0
+    assert cliente.get(f"/postres/{postre['id']}").json()["rebanadas"] == 10
+    assert cliente.delete(f"/postres/{postre['id']}").status_code == 200
+    assert cliente.get(f"/postres/{postre['id']}").status_code == 404
+
+
+def test_validaciones(cliente):
+    assert cliente.post("/productos/", json={
+        "nombre": "Sin categoría", "descripcion": "", "categoria_id": 9999, "precio": 1.0,
+    }).status_code == 404
+    assert cliente.put("/productos/9999", json={"precio": 1.0}).status_code == 404
+    assert cliente.put("/postres/1", json={"productos_ids": [9999]}).status_code == 404
+
+
+def test_crear_categoria(cliente):
+    categoria = cliente.post("/categorias/", json={"nombre": "Categoría de prueba", "descripcion": "Pruebas"}).json()
+    assert categoria["id"] in {c["id"] for c in cliente.get("/categorias/").json()}
@@ -0,0 +1,135 @@
+"""
+Escritura de /disponibilidad: la diferida (EscrituraDiferida) y la concurrencia entre escrituras.
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy import select
+
+import main
+from escritura_diferida import EscrituraDiferida
+
+
+class Destino:
+    """
+    `aplicar` de prueba: guarda cada escritura y falla mientras `fallar` esté activo.
+    """
+
+    def __init__(self):
+        self.escrituras = []
+        self.fallar = False
+        self.escrito = threading.Event()
+
+    def __call__(self, cambios):
+        if self.fallar:
+            raise RuntimeError("base de datos no disponible")
+        self.escrituras.append(dict(cambios))
+        self.escrito.set()
+
+
+def test_escribe_al_cumplirse_la_ventana():
+    destino = Destino()
+    escritura = EscrituraDiferida(destino, ventana=0.1)
+    escritura.iniciar()
+    try:
+        inicio = time.monotonic()
+        escritura.agregar({("producto", 1): 0})
+        assert destino.escrito.wait(5)
+        assert time.monotonic() - inicio >= 0.1
+        assert destino.escrituras == [{("producto", 1): 0}]
+        assert escritura.estadisticas()["pendientes"] == 0
+    finally:
+        escritura.detener()
+
+
+def test_fusiona_cambios_de_la_ventana():
+    destino = Destino()
+    escritura = EscrituraDiferida(destino, ventana=0.2)
+    escritura.iniciar()
+    try:
+        for disponible in (0, 1, 0, 1):
+            escritura.agregar({("producto", 1): disponible, ("postre", 2): 1 - disponible})
+        assert destino.escrito.wait(5)
+        assert destino.escrituras == [{("producto", 1): 1, ("postre", 2): 0}]
+        estadisticas = escritura.estadisticas()
+        assert estadisticas["recibidas"] == 8
+        assert estadisticas["fusionadas"] == 6
+        assert estadisticas["escritas"] == 2
+    finally:
+        escritura.detener()
+
+
+def test_error_devuelve_los_cambios_sin_pisar_los_nuevos():
+    destino = Destino()
+    escritura = EscrituraDiferida(destino, ventana=0)
+    escritura.agregar({("producto", 1): 0, ("producto", 2): 0})
+    destino.fallar = True
+    with pytest.raises(RuntimeError):
+        escritura.vaciar()
+    # Llega un valor más nuevo para una de las claves mientras la base no responde
+    escritura.agregar({("producto", 1): 1})
+    destino.fallar = False
+    assert escritura.vaciar() == 2
+    assert destino.escrituras == [{("producto", 1): 1, ("producto", 2): 0}]
+    assert escritura.estadisticas()["errores"] == 1
+
+
+def test_reintenta_tras_un_error():
+    destino = Destino()
+    destino.fallar = True
+    escritura = EscrituraDiferida(destino, ventana=0.05, reintento=0.05)
+    escritura.iniciar()
+    try:
+        escritura.agregar({("producto", 1): 0})
+        time.sleep(0.2)
+        assert escritura.estadisticas()["errores"] >= 1
+        destino.fallar = False
+        assert destino.escrito.wait(5)
+        assert destino.escrituras == [{("producto", 1): 0}]
+    finally:
+        escritura.detener()
+
+
+def test_apagado_escribe_lo_pendiente():
+    destino = Destino()
+    escritura = EscrituraDiferida(destino, ventana=60)
+    escritura.iniciar()
+    escritura.agregar({("postre", 3): 0})
+    escritura.detener()
+    assert destino.escrituras == [{("postre", 3): 0}]
+    assert not escritura.activa
+
+
+def disponible_en_bd(id_: int) -> int:
+    with main.SessionLocal() as db:
+        return db.execute(select(main.Producto.disponible).where(main.Producto.id == id_)).scalar_one()
+
+
+def test_escrituras_concurrentes_no_pierden_cambios(cliente):
+    id_ = cliente.get("/productos/?limit=1").json()[0]["id"]
+    with main.SessionLocal() as db:
+        main.aplicar_disponibilidad(db, {("producto", id_): 1})
+        db.commit()
+
+    # A pone 0 y aún no confirma; B pone 1 y debe esperar a A en vez de ver la fila sin cambios
+    primera = main.SessionLocal()
+    main.aplicar_disponibilidad(primera, {("producto", id_): 0})
+    segunda_termino = threading.Event()
+
+    def segunda():
+        with main.SessionLocal() as db:
+            main.aplicar_disponibilidad(db, {("producto", id_): 1})
+            db.commit()
+        segunda_termino.set()
+
+    hilo = threading.Thread(target=segunda)
+    hilo.start()
+    try:
+        assert not segunda_termino.wait(0.5)
+        primera.commit()
+    finally:
+        primera.close()
+        hilo.join(10)
+    assert segunda_termino.is_set()
+    assert disponible_en_bd(id_) == 1
@@ -0,0 +1,31 @@
+"""
+ETag de las lecturas del catálogo: 304 con If-None-Match y un ETag nuevo tras cada escritura.
+"""
+import pytest
+
+
+@pytest.mark.parametrize("ruta", ["/productos/1", "/productos/?limit=10", "/categorias/", "/buscar/torta", "/sugerir?q=to"])
+def test_if_none_match_responde_304(cliente, ruta):
+    respuesta = cliente.get(ruta)
+    etag = respuesta.headers["ETag"]
+    no_modificado = cliente.get(ruta, headers={"If-None-Match": etag})
+    assert no_modificado.status_code == 304
+    assert no_modificado.content == b""
+    assert no_modificado.headers["ETag"] == etag
+    # Comparación débil y listas de ETags
+    assert cliente.get(ruta, headers={"If-None-Match": f'"otro", W/{etag}'}).status_code == 304
+    assert cliente.get(ruta, headers={"If-None-Match": '"otro"'}).status_code == 200
+
+
+def test_escritura_cambia_el_etag(cliente):
+    etag = cliente.get("/productos/1").headers["ETag"]
+    precio = cliente.get("/productos/1").json()["precio"]
+    assert cliente.put("/productos/1", json={"precio": precio + 1}).status_code == 200
+    respuesta = cliente.get("/productos/1", headers={"If-None-Match": etag})
+    assert respuesta.status_code == 200
+    assert respuesta.headers["ETag"] != etag
+    assert respuesta.json()["precio"] == precio + 1
+
+
+def test_escrituras_sin_etag(cliente):
+    assert "ETag" not in cliente.put("/productos/1", json={"disponible": 1}).headers
@@ -0,0 +1,90 @@
+"""
+/eventos: reenvío desde Last-Event-ID y eventos de los vínculos producto-postre.
+"""
+import asyncio
+import json
+
+import main
+
+
+async def _leer_eventos(ruta: str, cabeceras: dict, cantidad: int) -> list:
+    # El stream no termina: se lee directo de la aplicación ASGI hasta tener `cantidad` eventos
+    path, _, query = ruta.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "client": ("127.0.0.1", 0), "server": ("pruebas", 80),
+        "headers": [(b"host", b"pruebas")] + [(k.lower().encode(), v.encode()) for k, v in cabeceras.items()],
+    }
+    cuerpo = bytearray()
+    listo = asyncio.Event()
+
+    async def receive():
+        await listo.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(mensaje):
+        if mensaje["type"] == "http.response.body":
+            cuerpo.extend(mensaje.get("body", b""))
+            if cuerpo.count(b"\nevent: ") + cuerpo.startswith(b"event: ") >= cantidad:
+                listo.set()
+
+    tarea = asyncio.ensure_future(main.app(scope, receive, send))
+    try:
+        await asyncio.wait_for(listo.wait(), 5)
+    finally:
+        tarea.cancel()
+    eventos = []
+    for bloque in cuerpo.decode().split("\n\n"):
+        campos = dict(linea.split(": ", 1) for linea in bloque.splitlines() if ": " in linea)
+        if "event" in campos:
+            eventos.append({"event": campos["event"], "id": campos.get("id"), "data": json.loads(campos["data"])})
+    return eventos
+
+
+def leer_eventos(cliente, ultimo: str, cantidad: int) -> list:
+    return cliente.portal.call(_leer_eventos, "/eventos", {"Last-Event-ID": ultimo}, cantidad)
+
+
+def token_actual() -> str:
+    return f"{main.version_catalogo.epoca}-{main.version_catalogo.aplicada}"
+
+
+def test_reenvia_desde_last_event_id(cliente):
+    ultimo = token_actual()
+    cliente.put("/postres/2", json={"rebanadas": 12})
+    cliente.put("/productos/2", json={"precio": 41.5})
+    eventos = leer_eventos(cliente, ultimo, 2)
+    assert [(e["event"], e["data"]["ids"]) for e in eventos] == [("postre.actualizado", [2]), ("producto.actualizado", [2])]
+    assert eventos[-1]["id"] == token_actual()
+
+
+def test_borrar_publica_los_vinculos_quitados(cliente):
+    producto = cliente.post("/productos/", json={
+        "nombre": "Torta de vínculos", "descripcion": "Para borrar", "categoria_id": 1, "precio": 35.0,
+        "postres_ids": [1, 2],
+    }).json()
+    ultimo = token_actual()
+    assert cliente.delete(f"/productos/{producto['id']}").status_code == 200
+    relacion, borrado = leer_eventos(cliente, ultimo, 2)
+    assert relacion["event"] == "relacion.borrado"
+    assert relacion["data"]["relaciones"] == [
+        {"producto_id": producto["id"], "postre_id": 1}, {"producto_id": producto["id"], "postre_id": 2}
+    ]
+    assert (borrado["event"], borrado["data"]["ids"]) == ("producto.borrado", [producto["id"]])
+    assert producto["id"] not in {p["id"] for p in cliente.get("/postres/1/productos").json()}
+
+
+def test_actualizar_publica_los_vinculos_quitados(cliente):
+    producto = cliente.post("/productos/", json={
+        "nombre": "Torta de vínculos", "descripcion": "Para actualizar", "categoria_id": 1, "precio": 35.0,
+        "postres_ids": [1, 2],
+    }).json()
+    ultimo = token_actual()
+    assert cliente.put(f"/productos/{producto['id']}", json={"postres_ids": [2, 3]}).status_code == 200
+    eventos = leer_eventos(cliente, ultimo, 3)
+    assert [(e["event"], e["data"].get("relaciones")) for e in eventos] == [
+        ("relacion.creado", [{"producto_id": producto["id"], "postre_id": 3}]),
+        ("relacion.borrado", [{"producto_id": producto["id"], "postre_id": 1}]),
+        ("producto.actualizado", None),
+    ]
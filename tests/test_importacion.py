@@ -0,0 +1,31 @@
+"""
+Importación de categorías: sólo las filas que cambian cuentan como actualizadas y como cambio del catálogo.
+"""
+import json
+
+import main
+
+
+def importar_categorias(cliente, registros: list) -> dict:
+    contenido = "".join(json.dumps(registro, ensure_ascii=False) + "\n" for registro in registros)
+    respuesta = cliente.post(
+        "/import", params={"tipo": "categorias", "formato": "ndjson"},
+        files={"archivo": ("categorias.ndjson", contenido, "application/x-ndjson")},
+    )
+    assert respuesta.status_code == 200
+    return json.loads(respuesta.text.splitlines()[-1])["resumen"]
+
+
+def test_reimportar_sin_cambios_no_registra_nada(cliente):
+    categorias = cliente.get("/categorias/").json()[:3]
+    registros = [{"nombre": c["nombre"], "descripcion": c["descripcion"]} for c in categorias]
+    version = main.version_catalogo.aplicada
+    assert importar_categorias(cliente, registros)["actualizados"] == 0
+    assert main.version_catalogo.aplicada == version
+
+    registros[0]["descripcion"] += " (temporada)"
+    resumen = importar_categorias(cliente, registros)
+    assert (resumen["insertados"], resumen["actualizados"]) == (0, 1)
+    assert main.version_catalogo.aplicada == version + 1
+    cambio = cliente.get("/sync", params={"since": f"{main.version_catalogo.epoca}-{version}"}).json()
+    assert [c["id"] for c in cambio["categorias"]] == [categorias[0]["id"]]
@@ -0,0 +1,21 @@
+"""
+Con DB_MODO=async los endpoints corren con AsyncSession.run_sync: los mismos módulos de
+pruebas se vuelven a ejecutar en ese modo, en otro proceso (el modo se elige al importar main).
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.mark.parametrize("modulo", ["test_crud.py", "test_consultas.py", "test_paginacion.py", "test_pool.py"])
+def test_modo_async(modulo):
+    resultado = subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", os.path.join(DIRECTORIO, modulo)],
+        cwd=os.path.dirname(DIRECTORIO), env={**os.environ, "DB_MODO": "async"},
+        capture_output=True, text=True, timeout=300,
+    )
+    assert resultado.returncode == 0, resultado.stdout[-3000:] + resultado.stderr[-3000:]
@@ -0,0 +1,25 @@
+"""
+Paginación por cursor de /productos/ y /postres/.
+"""
+import pytest
+
+
+@pytest.mark.parametrize("recurso", ["productos", "postres"])
+def test_recorrido_completo(cliente, recurso):
+    completos = [item["id"] for item in cliente.get(f"/{recurso}/?limit=10000").json()]
+    vistos, cursor = [], ""
+    while cursor is not None:
+        pagina = cliente.get(f"/{recurso}/", params={"cursor": cursor, "limit": 3}).json()
+        assert len(pagina["items"]) <= 3
+        vistos += [item["id"] for item in pagina["items"]]
+        cursor = pagina["next_cursor"]
+    assert vistos == sorted(completos)
+
+
+@pytest.mark.parametrize("ruta", [
+    "/productos/?cursor=&limit=0",
+    "/postres/?cursor=&limit=-1",
+    "/productos/?cursor=no-es-un-cursor",
+])
+def test_parametros_invalidos(cliente, ruta):
+    assert cliente.get(ruta).status_code == 400
@@ -0,0 +1,28 @@
+"""
+Estado del pool de conexiones (/admin/pool).
+"""
+from sqlalchemy.pool import QueuePool
+
+import main
+from metricas import EstadisticasPool, configuracion_pool
+
+
+def test_configuracion_de_las_opciones_del_engine():
+    opciones = main.opciones_pool("mysql+pymysql://u:p@localhost/db", QueuePool, EstadisticasPool())
+    assert configuracion_pool(opciones) == {
+        "pool_size": main.DB_POOL_SIZE, "max_overflow": main.DB_MAX_OVERFLOW, "pool_timeout": main.DB_POOL_TIMEOUT,
+        "pool_recycle": main.DB_POOL_RECYCLE, "pool_pre_ping": main.DB_POOL_PRE_PING,
+    }
+    # SQLite usa el pool por defecto: no hay configuración que mostrar
+    assert configuracion_pool(main.opciones_pool("sqlite:///x.db", QueuePool, EstadisticasPool())) is None
+
+
+def test_admin_pool_refleja_cada_engine(cliente):
+    estado = cliente.get("/admin/pool").json()
+    assert estado["configuracion"] == configuracion_pool(main.opciones_pool_sync)
+    assert estado["sync"]["clase"] == type(main.engine.pool).__name__
+    if main.async_engine is None:
+        assert "async" not in estado and "configuracion_async" not in estado
+    else:
+        assert estado["configuracion_async"] == configuracion_pool(main.opciones_pool_async)
+        assert estado["async"]["clase"] == type(main.async_engine.pool).__name__
@@ -0,0 +1,46 @@
+"""
+/sync: catálogo completo sin token y, con token, sólo las filas cambiadas y los borrados.
+"""
+
+
+def test_sin_token_devuelve_todo(cliente):
+    datos = cliente.get("/sync").json()
+    assert datos["completo"] is True
+    assert len(datos["productos"]) == len(cliente.get("/productos/?limit=100000").json())
+    assert all(not ids for ids in datos["borrados"].values())
+
+
+def test_delta_con_borrados(cliente):
+    token = cliente.get("/sync").json()["token"]
+    vacio = cliente.get("/sync", params={"since": token}).json()
+    assert vacio["completo"] is False
+    assert vacio["token"] == token
+    assert (vacio["productos"], vacio["postres"], vacio["categorias"], vacio["relaciones"]) == ([], [], [], [])
+
+    creado = cliente.post("/productos/", json={
+        "nombre": "Pambazo de sync", "descripcion": "Para /sync", "categoria_id": 1, "precio": 22.0, "postres_ids": [3],
+    }).json()
+    borrar = cliente.post("/postres/", json={
+        "nombre": "Gelatina de sync", "descripcion": "Para borrar", "categoria_id": 8,
+        "rebanadas": 8, "precio_rebanada": 10.0, "precio_total": 80.0,
+    }).json()
+    assert cliente.put("/postres/4", json={"rebanadas": 6}).status_code == 200
+    assert cliente.delete(f"/postres/{borrar['id']}").status_code == 200
+
+    delta = cliente.get("/sync", params={"since": token}).json()
+    assert delta["token"] != token
+    assert [p["id"] for p in delta["productos"]] == [creado["id"]]
+    # El postre creado y borrado dentro del intervalo sólo aparece como borrado
+    assert [p["id"] for p in delta["postres"]] == [4]
+    assert delta["postres"][0]["rebanadas"] == 6
+    assert delta["borrados"] == {"categorias": [], "productos": [], "postres": [borrar["id"]]}
+    assert {"producto_id": creado["id"], "postre_id": 3} in delta["relaciones"]
+
+    # Con el token nuevo no queda nada pendiente
+    siguiente = cliente.get("/sync", params={"since": delta["token"]}).json()
+    assert (siguiente["productos"], siguiente["postres"], siguiente["borrados"]["postres"]) == ([], [], [])
+
+
+def test_token_de_otra_base_devuelve_todo(cliente):
+    assert cliente.get("/sync", params={"since": "otra-epoca-3"}).json()["completo"] is True
+    assert cliente.get("/sync", params={"since": "sin-version"}).status_code == 400